@@ -0,0 +1,252 @@
+"""
+Roll product_analytics daily rows up into product_analytics_rollups.
+
+Keeps weekly (Monday-based) and monthly totals per variant, template and
+category. Each run reads only the daily rows needed to recompute the periods
+touched by days after the stored watermark, minus a late-data window
+(LATE_DAYS) for counters that are still updated after the day ends. Touched
+periods are recomputed whole from their daily rows, so re-running is
+idempotent. Aggregation is vectorized with numpy (one bincount per metric
+and grouping).
+
+Variant -> template -> category comes from a local snapshot
+(.cache/catalog/analytics_snapshot.sqlite3); a variant moved to another
+template only changes history with --full.
+
+Usage:
+    python scripts/analytics_rollups.py [--full] [--dry-run] [--late-days N]
+
+Requires numpy.
+"""
+
+import json
+import os
+from datetime import date, timedelta
+
+from catalog_snapshot import CACHE_DIR, CatalogSnapshot
+
+STATE_FILE = os.path.join(CACHE_DIR, "analytics_rollups.json")
+SNAPSHOT_FILE = os.path.join(CACHE_DIR, "analytics_snapshot.sqlite3")
+
+PAGE_SIZE = 1000
+UPSERT_BATCH_SIZE = 500
+LATE_DAYS = 3
+
+ANALYTICS_TABLES = {
+    "product_templates": ["id", "category_id", "updated_at"],
+    "product_variants": ["id", "product_template_id", "updated_at"],
+}
+METRICS = [
+    "page_views",
+    "unique_visitors",
+    "add_to_cart_count",
+    "purchases_count",
+    "revenue",
+]
+PERIOD_TYPES = ["week", "month"]
+SCOPES = ["variant", "template", "category"]
+
+
+def load_state(full: bool = False) -> dict:
+    if full or not os.path.exists(STATE_FILE):
+        return {"watermark": None}
+    with open(STATE_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state: dict):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp_file = STATE_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_file, STATE_FILE)
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def read_window(watermark: str | None, late_days: int) -> tuple:
+    """(first changed day, first day to read) or (None, None) for everything.
+
+    Changed periods are recomputed whole, so reading starts at the earliest
+    week or month start containing the first changed day.
+    """
+    if watermark is None:
+        return None, None
+    changed = date.fromisoformat(watermark) + timedelta(days=1 - late_days)
+    return changed, min(week_start(changed), changed.replace(day=1))
+
+
+def fetch_daily(supabase, since: date | None) -> dict:
+    """Daily rows from `since` on, as numpy columns (keyset pagination on id)."""
+    import numpy as np
+
+    columns = {name: [] for name in ["product_variant_id", "date"] + METRICS}
+    last_id = 0
+    while True:
+        query = (
+            supabase.table("product_analytics")
+            .select("id, product_variant_id, date, " + ", ".join(METRICS))
+            .gt("id", last_id)
+        )
+        if since:
+            query = query.gte("date", since.isoformat())
+        page = query.order("id").limit(PAGE_SIZE).execute().data
+        for r in page:
+            for name, values in columns.items():
+                values.append(r[name] or 0)
+        if len(page) < PAGE_SIZE:
+            break
+        last_id = page[-1]["id"]
+
+    return {
+        "product_variant_id": np.array(columns.pop("product_variant_id"), dtype=np.int64),
+        "date": np.array(columns.pop("date"), dtype="datetime64[D]"),
+        **{name: np.array(values, dtype=np.float64) for name, values in columns.items()},
+    }
+
+
+def lookup(keys, mapping: dict):
+    """Map an int array through a dict; missing keys become -1."""
+    import numpy as np
+
+    if not mapping:
+        return np.full(len(keys), -1, dtype=np.int64)
+    source = np.fromiter(mapping.keys(), dtype=np.int64, count=len(mapping))
+    target = np.fromiter(
+        (-1 if v is None else v for v in mapping.values()),
+        dtype=np.int64,
+        count=len(mapping),
+    )
+    order = np.argsort(source)
+    source, target = source[order], target[order]
+    pos = np.clip(np.searchsorted(source, keys), 0, len(source) - 1)
+    return np.where(source[pos] == keys, target[pos], -1)
+
+
+def period_starts(dates) -> dict:
+    """{"week": Monday of each date, "month": first day of each date}"""
+    days = dates.astype("datetime64[D]").astype("int64")
+    # 1970-01-01 was a Thursday: (days + 3) % 7 is 0 on Mondays
+    weeks = (days - (days + 3) % 7).astype("datetime64[D]")
+    months = dates.astype("datetime64[M]").astype("datetime64[D]")
+    return {"week": weeks, "month": months}
+
+
+def aggregate(daily: dict, template_of: dict, category_of: dict, changed: date | None) -> list:
+    """Rollup rows for every period starting on/after the changed day's period."""
+    import numpy as np
+
+    variant = daily["product_variant_id"]
+    template = lookup(variant, template_of)
+    scope_ids = {
+        "variant": variant,
+        "template": template,
+        "category": lookup(template, category_of),
+    }
+    starts = period_starts(daily["date"])
+
+    rows = []
+    for period_type in PERIOD_TYPES:
+        period = starts[period_type]
+        keep = np.ones(len(period), dtype=bool)
+        if changed is not None:
+            first = week_start(changed) if period_type == "week" else changed.replace(day=1)
+            keep = period >= np.datetime64(first)
+        for scope in SCOPES:
+            ids = scope_ids[scope]
+            mask = keep & (ids >= 0)
+            if not mask.any():
+                continue
+            keys = np.stack([period[mask].astype("int64"), ids[mask]], axis=1)
+            groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+            inverse = inverse.ravel()
+            totals = {
+                name: np.bincount(inverse, weights=daily[name][mask], minlength=len(groups))
+                for name in METRICS
+            }
+            for g, (start_day, scope_id) in enumerate(groups):
+                row = {
+                    "period_type": period_type,
+                    "period_start": str(np.datetime64(int(start_day), "D")),
+                    "scope": scope,
+                    "scope_id": int(scope_id),
+                }
+                for name in METRICS:
+                    value = totals[name][g]
+                    row[name] = round(float(value), 2) if name == "revenue" else int(round(value))
+                rows.append(row)
+    return rows
+
+
+def publish(supabase, rows: list):
+    for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+        supabase.table("product_analytics_rollups").upsert(
+            rows[i : i + UPSERT_BATCH_SIZE],
+            on_conflict="period_type,scope,scope_id,period_start",
+        ).execute()
+
+
+def load_hierarchy(supabase, full: bool = False) -> tuple:
+    """({variant_id: template_id}, {template_id: category_id})"""
+    snapshot = CatalogSnapshot(SNAPSHOT_FILE, tables=ANALYTICS_TABLES)
+    try:
+        snapshot.refresh(supabase, full=full)
+        variants = snapshot.rows("product_variants")
+        templates = snapshot.rows("product_templates")
+    finally:
+        snapshot.close()
+    return (
+        {v["id"]: v["product_template_id"] for v in variants},
+        {t["id"]: t["category_id"] for t in templates},
+    )
+
+
+def main(full: bool = False, dry_run: bool = False, late_days: int = LATE_DAYS):
+    from catalog_client import get_client
+
+    supabase = get_client()
+    state = load_state(full)
+    changed, since = read_window(state["watermark"], late_days)
+    print(
+        f"Watermark: {state['watermark'] or 'none (full rebuild)'}"
+        + (f", recomputing periods from {changed} (reading from {since})" if since else "")
+    )
+
+    template_of, category_of = load_hierarchy(supabase, full=full)
+    daily = fetch_daily(supabase, since)
+    days = len(daily["date"])
+    if not days:
+        print("No analytics rows to roll up")
+        return
+
+    rows = aggregate(daily, template_of, category_of, changed)
+    newest = str(daily["date"].max())
+    if not dry_run:
+        publish(supabase, rows)
+        state["watermark"] = max(newest, state["watermark"] or newest)
+        save_state(state)
+
+    counts = {}
+    for row in rows:
+        key = f"{row['period_type']}/{row['scope']}"
+        counts[key] = counts.get(key, 0) + 1
+
+    print(f"\n=== SUMMARY ===")
+    print(f"Daily rows read: {days}")
+    unmapped = int((lookup(daily["product_variant_id"], template_of) < 0).sum())
+    print(f"Rows of variants not in the snapshot (variant rollups only): {unmapped}")
+    for key in sorted(counts):
+        print(f"  {key}: {counts[key]}")
+    print(f"{'Would upsert' if dry_run else 'Upserted'} rollup rows: {len(rows)}")
+    print(f"Watermark: {state['watermark']}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    late_days = LATE_DAYS
+    if "--late-days" in sys.argv:
+        late_days = int(sys.argv[sys.argv.index("--late-days") + 1])
+    main(full="--full" in sys.argv, dry_run="--dry-run" in sys.argv, late_days=late_days)
@@ -0,0 +1,295 @@
+"""
+Micro-benchmarks for the catalog hot functions.
+
+Times slugify, parse_price, get_size_format_id, find_local_image
+(import_products), extract_specifications, infer_format (enrich_products),
+round_to_nice and generate_tiers_for_variant (generate_price_tiers) on
+synthetic Portuguese product names, notes and price strings at several
+input sizes. Inputs come from a fixed seed, so runs are comparable.
+
+Each function is run REPEATS times per size and the best time is kept, as
+nanoseconds per call. Results are compared with a stored baseline and the
+script exits with status 1 if any function got slower than the baseline
+by more than the threshold.
+
+Usage:
+    python scripts/benchmark_catalog.py                   # compare with baseline
+    python scripts/benchmark_catalog.py --save-baseline   # record a new baseline
+    python scripts/benchmark_catalog.py --scales 10000 --threshold 0.5
+
+Baselines are machine specific; record one on the machine that runs the
+comparison (default file: .cache/catalog/benchmark_baseline.json).
+"""
+
+import json
+import os
+import platform
+import random
+import time
+
+BASELINE_FILE = os.path.join(".cache", "catalog", "benchmark_baseline.json")
+SCALES = [10_000, 100_000, 1_000_000]
+REPEATS = 3
+REGRESSION_THRESHOLD = 0.25  # Fail when more than 25% slower than baseline
+SEED = 42
+# Distinct product names; larger inputs repeat them, as variants of the
+# same product do, so cached lookups (find_local_image) see real hit rates
+NAME_POOL_SIZE = 5_000
+
+PRODUCTS = [
+    "Porta Folhetos Parede",
+    "Porta Folhetos Balcão",
+    "Expositor Vernizes",
+    "Bolsa Porta-Folha Modelo T",
+    "Bolsa L Vertical C/ Porta-Cartões",
+    "Caixa Acrílico com Tampa",
+    "Tômbola Acrílico Giratória",
+    "Moldura Íman Dupla Face",
+    "Suporte Menu Mesa",
+    "Placa Identificação Porta",
+    "Vitrine For LEGO® Técnica",
+    "Urna de Votação",
+]
+QUALIFIERS = [
+    "Vertical",
+    "Horizontal",
+    "3 Níveis",
+    "Cristal",
+    "Preto",
+    "c/ Base Branca",
+    "Resistente à Água",
+    "Dupla Face",
+    "",
+]
+SIZES = [
+    "A4 (21x30cm)",
+    "A5 (21x15cm)",
+    "A6 (10x15cm)",
+    "DL (21x10cm)",
+    "1/3 A4",
+    "30x30x30cm - Base Preta",
+    "Standard",
+]
+NOTE_FORMATS = [(210, 297), (148, 210), (105, 148), (99, 210), (99, 297), (320, 450)]
+
+
+def make_names(n: int, rng: random.Random) -> list:
+    pool = []
+    for i in range(NAME_POOL_SIZE):
+        parts = [rng.choice(PRODUCTS), rng.choice(QUALIFIERS), rng.choice(SIZES[:5])]
+        pool.append(" ".join(p for p in parts if p) + f" Modelo {i}")
+    return [pool[rng.randrange(NAME_POOL_SIZE)] for _ in range(n)]
+
+
+def make_prices(n: int, rng: random.Random) -> list:
+    prices = []
+    for _ in range(n):
+        roll = rng.random()
+        if roll < 0.02:
+            prices.append("")
+        elif roll < 0.05:
+            prices.append("0,00\xa0€")
+        else:
+            prices.append(f"{rng.randint(50, 250_000) / 100:.2f} €".replace(".", ","))
+    return prices
+
+
+def make_note(rng: random.Random) -> str:
+    w, h = rng.choice(NOTE_FORMATS)
+    depth = rng.choice([20, 40, 60, 100])
+    return (
+        "Expositor em acrílico cristal para balcão ou parede. "
+        "Ideal para lojas, receções e salas de espera.\n\n"
+        f"Formato: Uma cara\nOrientação: Vertical\n\n"
+        f"Produto:\nLargura: {w + 5}mm\nAltura: {h + 7}mm\n"
+        f"Profundidade: {depth}mm\n\n"
+        f"Área Gráfica\nLargura: {w}mm\nAltura: {h}mm\n\n"
+        "Material: Acrílico"
+    )
+
+
+def make_inputs(n: int) -> dict:
+    rng = random.Random(SEED)
+    notes_pool = [make_note(rng) for _ in range(min(n, NAME_POOL_SIZE))]
+    return {
+        "names": make_names(n, rng),
+        "prices": make_prices(n, rng),
+        "variations": [rng.choice(SIZES) for _ in range(n)],
+        "notes": [rng.choice(notes_pool) for _ in range(n)],
+        "dimensions": [
+            (rng.randint(80, 330), rng.randint(80, 460)) for _ in range(n)
+        ],
+        "quantities": [rng.randint(1, 5_000) for _ in range(n)],
+        "base_prices": [rng.randint(50, 250_000) / 100 for _ in range(n)],
+    }
+
+
+def build_benchmarks(inputs: dict) -> dict:
+    """name -> (function over the inputs, setup run before each repeat)"""
+    from enrich_products import extract_specifications, infer_format
+    from generate_price_tiers import generate_tiers_for_variant, round_to_nice
+    from image_manifest import get_image_manifest
+    from import_products import (
+        find_local_image,
+        get_size_format_id,
+        parse_price,
+        slugify,
+    )
+
+    # Scan and hash the image directory outside the timed runs
+    manifest = get_image_manifest()
+
+    def reset_image_matches():
+        # Time matching, not a warm cache left by the previous repeat
+        manifest.matches.clear()
+
+    names = inputs["names"]
+    prices = inputs["prices"]
+    variations = inputs["variations"]
+    notes = inputs["notes"]
+    dimensions = inputs["dimensions"]
+    quantities = inputs["quantities"]
+    base_prices = inputs["base_prices"]
+
+    return {
+        "slugify": (lambda: [slugify(n) for n in names], None),
+        "parse_price": (lambda: [parse_price(p) for p in prices], None),
+        "get_size_format_id": (
+            lambda: [get_size_format_id(v) for v in variations],
+            None,
+        ),
+        "find_local_image": (
+            lambda: [find_local_image(n) for n in names],
+            reset_image_matches,
+        ),
+        "extract_specifications": (
+            lambda: [extract_specifications(n) for n in notes],
+            None,
+        ),
+        "infer_format": (lambda: [infer_format(w, h) for w, h in dimensions], None),
+        "round_to_nice": (lambda: [round_to_nice(q) for q in quantities], None),
+        "generate_tiers_for_variant": (
+            lambda: [
+                generate_tiers_for_variant(i, p) for i, p in enumerate(base_prices)
+            ],
+            None,
+        ),
+    }
+
+
+def time_function(func, setup, n: int, repeats: int = REPEATS) -> float:
+    """Best of repeats, in nanoseconds per call."""
+    best = None
+    for _ in range(repeats):
+        if setup:
+            setup()
+        start = time.perf_counter_ns()
+        func()
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / n
+
+
+def run(scales: list = SCALES, repeats: int = REPEATS) -> dict:
+    results = {}
+    for n in scales:
+        print(f"\n--- {n:,} inputs ---")
+        benchmarks = build_benchmarks(make_inputs(n))
+        for name, (func, setup) in benchmarks.items():
+            ns_per_call = time_function(func, setup, n, repeats)
+            results.setdefault(name, {})[str(n)] = round(ns_per_call, 1)
+            print(f"  {name:<28} {ns_per_call:>12,.1f} ns/call")
+    return results
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "node": platform.node(),
+    }
+
+
+def load_baseline(path: str) -> dict | None:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, results: dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "environment": environment(),
+                "results": results,
+            },
+            f,
+            indent=2,
+            sort_keys=True,
+        )
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """(function, scale, baseline ns, current ns) for every regression."""
+    regressions = []
+    for name, by_scale in results.items():
+        for scale, current in by_scale.items():
+            previous = baseline["results"].get(name, {}).get(scale)
+            if previous and current > previous * (1 + threshold):
+                regressions.append((name, scale, previous, current))
+    return regressions
+
+
+def main(argv: list | None = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--scales",
+        type=lambda s: [int(x) for x in s.split(",")],
+        default=SCALES,
+        help="Comma-separated input sizes (default: 10000,100000,1000000)",
+    )
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="Store results as the baseline"
+    )
+    args = parser.parse_args(argv)
+
+    results = run(args.scales, args.repeats)
+
+    print(f"\n=== SUMMARY ===")
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"Baseline saved: {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"No baseline at {args.baseline}; run with --save-baseline first")
+        return 0
+    if baseline.get("environment") != environment():
+        print(f"Warning: baseline was recorded on {baseline.get('environment')}")
+
+    regressions = compare(results, baseline, args.threshold)
+    print(f"Compared with baseline from {baseline.get('created_at')}")
+    print(f"Threshold: +{args.threshold:.0%}")
+    print(f"Regressions: {len(regressions)}")
+    for name, scale, previous, current in regressions:
+        print(
+            f"  - {name} @ {int(scale):,}: {previous:,.1f} -> {current:,.1f} ns/call "
+            f"(+{current / previous - 1:.0%})"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(main())
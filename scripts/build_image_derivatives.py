@@ -0,0 +1,302 @@
+"""
+Build responsive image derivatives for public/imagens_produto
+
+Resizes every product image to several widths in WebP (and AVIF when the
+installed Pillow supports it) using a process pool, writing the results to
+public/imagens_derivadas as {source file name}-{width}w.{format} (the
+source extension is kept, so foo.jpg and foo.png do not overwrite each
+other). A content-hash manifest makes reruns skip files that did not change.
+
+With --sync, the derivatives of images referenced by product_template_images
+are upserted into product_template_image_variants (width/height/URL per
+format), and rows for widths/formats no longer produced are deleted, so the
+storefront can serve srcset markup with no per-request image processing.
+
+Usage:
+    python scripts/build_image_derivatives.py [--sync] [--force]
+
+Requires Pillow (pip install Pillow; pillow-avif-plugin for AVIF on older
+Pillow versions).
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+SOURCE_DIR = "public/imagens_produto"
+SOURCE_URL_PREFIX = "/imagens_produto/"
+OUTPUT_DIR = "public/imagens_derivadas"
+OUTPUT_URL_PREFIX = "/imagens_derivadas/"
+MANIFEST_FILE = os.path.join(OUTPUT_DIR, "manifest.json")
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+WIDTHS = [320, 640, 1024, 1600]
+FORMATS = {
+    "webp": {"quality": 80, "method": 6},
+    "avif": {"quality": 55},
+}
+SYNC_BATCH_SIZE = 500
+PAGE_SIZE = 1000
+ID_BATCH_SIZE = 200
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def supported_formats() -> list:
+    """Output formats the installed Pillow can encode."""
+    from PIL import Image
+
+    try:
+        import pillow_avif  # noqa: F401  (registers the AVIF codec)
+    except ImportError:
+        pass
+
+    extensions = Image.registered_extensions()
+    return [fmt for fmt in FORMATS if extensions.get(f".{fmt}") in Image.SAVE]
+
+
+def target_widths(original_width: int) -> list:
+    """Widths to generate: never upscale, but always produce at least one."""
+    widths = [w for w in WIDTHS if w < original_width]
+    return widths or [original_width]
+
+
+def output_name(filename: str, width: int, fmt: str) -> str:
+    return f"{filename}-{width}w.{fmt}"
+
+
+def build_derivatives(filename: str, content_hash: str, formats: list) -> dict:
+    """Resize one source image to every width/format. Runs in a worker."""
+    from PIL import Image, ImageOps
+
+    with Image.open(os.path.join(SOURCE_DIR, filename)) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+        original_width, original_height = img.size
+
+        variants = []
+        for width in target_widths(original_width):
+            height = max(1, round(original_height * width / original_width))
+            resized = (
+                img
+                if width == original_width
+                else img.resize((width, height), Image.LANCZOS)
+            )
+            for fmt in formats:
+                out_name = output_name(filename, width, fmt)
+                resized.save(os.path.join(OUTPUT_DIR, out_name), **FORMATS[fmt])
+                variants.append(
+                    {
+                        "format": fmt,
+                        "width": width,
+                        "height": height,
+                        "url": f"{OUTPUT_URL_PREFIX}{out_name}",
+                    }
+                )
+
+    return {
+        "hash": content_hash,
+        "width": original_width,
+        "height": original_height,
+        "variants": variants,
+    }
+
+
+def load_manifest() -> dict:
+    if os.path.exists(MANIFEST_FILE):
+        with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(manifest: dict):
+    tmp_file = MANIFEST_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_file, MANIFEST_FILE)
+
+
+def remove_outputs(entry: dict):
+    for variant in entry.get("variants", []):
+        path = os.path.join(OUTPUT_DIR, variant["url"][len(OUTPUT_URL_PREFIX) :])
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def is_current(entry: dict | None, name: str, content_hash: str, formats: list) -> bool:
+    """True if the manifest entry matches the file and all outputs exist."""
+    if not entry or entry.get("hash") != content_hash:
+        return False
+    if {v["format"] for v in entry["variants"]} != set(formats):
+        return False
+    # Outputs named by an older naming scheme are rebuilt
+    if any(
+        v["url"] != OUTPUT_URL_PREFIX + output_name(name, v["width"], v["format"])
+        for v in entry["variants"]
+    ):
+        return False
+    return all(
+        os.path.exists(os.path.join(OUTPUT_DIR, v["url"][len(OUTPUT_URL_PREFIX) :]))
+        for v in entry["variants"]
+    )
+
+
+def build_all(force: bool = False) -> dict:
+    """Build derivatives for new/changed images. Returns the manifest."""
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    formats = supported_formats()
+    if "avif" not in formats:
+        print("AVIF encoder not available, generating WebP only")
+
+    manifest = load_manifest()
+    sources = sorted(
+        f for f in os.listdir(SOURCE_DIR) if f.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+    # Drop derivatives of images that no longer exist
+    removed = [name for name in manifest if name not in sources]
+    for name in removed:
+        remove_outputs(manifest.pop(name))
+
+    pending = []
+    for name in sources:
+        content_hash = file_hash(os.path.join(SOURCE_DIR, name))
+        if force or not is_current(manifest.get(name), name, content_hash, formats):
+            pending.append((name, content_hash))
+
+    print(f"Found {len(sources)} images, {len(pending)} new or changed")
+
+    built = 0
+    errors = []
+    with ProcessPoolExecutor() as pool:
+        futures = {
+            pool.submit(build_derivatives, name, content_hash, formats): name
+            for name, content_hash in pending
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                entry = future.result()
+            except Exception as e:
+                errors.append((name, str(e)))
+                print(f"  ERROR: {name[:50]} - {str(e)[:60]}")
+                continue
+            old = manifest.get(name)
+            if old:
+                old_urls = {v["url"] for v in old["variants"]}
+                new_urls = {v["url"] for v in entry["variants"]}
+                remove_outputs({"variants": [{"url": u} for u in old_urls - new_urls]})
+            manifest[name] = entry
+            built += 1
+            if built % 25 == 0:
+                save_manifest(manifest)
+                print(f"  ► {built}/{len(pending)} images processed")
+
+    save_manifest(manifest)
+
+    print(f"\n=== SUMMARY ===")
+    print(f"Images processed: {built}")
+    print(f"Unchanged (skipped): {len(sources) - len(pending)}")
+    print(f"Removed: {len(removed)}")
+    print(f"Errors: {len(errors)}")
+    return manifest
+
+
+def fetch_all(supabase, table: str, columns: str) -> list:
+    rows = []
+    start = 0
+    while True:
+        page = (
+            supabase.table(table)
+            .select(columns)
+            .order("id")
+            .range(start, start + PAGE_SIZE - 1)
+            .execute()
+            .data
+        )
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+
+def sync_template_image_variants(manifest: dict) -> int:
+    """Upsert derivative rows for every template image found in the manifest,
+    and delete the rows of derivatives that are no longer produced."""
+    from catalog_client import get_client
+
+    supabase = get_client()
+
+    images = fetch_all(supabase, "product_template_images", "id, image_url")
+
+    rows = []
+    synced_images = set()
+    for image in images:
+        url = image["image_url"] or ""
+        if not url.startswith(SOURCE_URL_PREFIX):
+            continue
+        synced_images.add(image["id"])
+        entry = manifest.get(url[len(SOURCE_URL_PREFIX) :])
+        if not entry:
+            continue
+        for variant in entry["variants"]:
+            rows.append(
+                {
+                    "product_template_image_id": image["id"],
+                    "format": variant["format"],
+                    "width": variant["width"],
+                    "height": variant["height"],
+                    "image_url": variant["url"],
+                    "content_hash": entry["hash"],
+                }
+            )
+
+    for i in range(0, len(rows), SYNC_BATCH_SIZE):
+        supabase.table("product_template_image_variants").upsert(
+            rows[i : i + SYNC_BATCH_SIZE],
+            on_conflict="product_template_image_id,format,width",
+        ).execute()
+
+    # Widths/formats dropped from the build (or whose source image is gone)
+    produced = {(r["product_template_image_id"], r["format"], r["width"]) for r in rows}
+    stale = [
+        r["id"]
+        for r in fetch_all(
+            supabase,
+            "product_template_image_variants",
+            "id, product_template_image_id, format, width",
+        )
+        if r["product_template_image_id"] in synced_images
+        and (r["product_template_image_id"], r["format"], r["width"]) not in produced
+    ]
+    for i in range(0, len(stale), ID_BATCH_SIZE):
+        supabase.table("product_template_image_variants").delete().in_(
+            "id", stale[i : i + ID_BATCH_SIZE]
+        ).execute()
+
+    print(
+        f"Synced {len(rows)} image variants for {len(images)} template images, "
+        f"deleted {len(stale)} stale"
+    )
+    return len(rows)
+
+
+def main():
+    import sys
+
+    manifest = build_all(force="--force" in sys.argv)
+    if "--sync" in sys.argv:
+        sync_template_image_variants(manifest)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Build a compact prebuilt product search index for static/edge serving.
+
+Reads active product templates and variants from a local snapshot
+(.cache/catalog/search_snapshot.sqlite3, refreshed incrementally by
+updated_at like the importer snapshot) and writes public/search-index.json:
+
+    docs   [[url_slug, name, min_price, image_url, category_id], ...]
+    title  {term: [doc, ...]}   terms found in the product name
+    body   {term: [doc, ...]}   terms only in short description / advantages
+
+Posting lists are sorted doc positions, delta-encoded. Terms are lowercased,
+unaccented, stripped of Portuguese stopwords and plurals (see tokenize());
+clients must normalize queries the same way. The file is rewritten only
+when its content changes, so unchanged catalogs do not churn deploys.
+
+The database-side equivalent (tsvector + GIN + trigram indexes used by
+search_products) is in supabase/migrations/20261019110000_add_product_search_index.sql.
+
+Usage:
+    python scripts/build_search_index.py [--full] [--offline]
+"""
+
+import json
+import os
+import re
+import unicodedata
+from datetime import datetime
+
+from catalog_snapshot import CACHE_DIR, CatalogSnapshot
+
+OUTPUT_FILE = "public/search-index.json"
+SNAPSHOT_FILE = os.path.join(CACHE_DIR, "search_snapshot.sqlite3")
+INDEX_VERSION = 1
+
+SEARCH_TABLES = {
+    "product_templates": [
+        "id",
+        "name",
+        "category_id",
+        "short_description",
+        "advantages",
+        "is_active",
+        "updated_at",
+    ],
+    "product_variants": [
+        "id",
+        "product_template_id",
+        "url_slug",
+        "base_price_including_vat",
+        "main_image_url",
+        "display_order",
+        "is_active",
+        "updated_at",
+    ],
+}
+
+STOPWORDS = set(
+    "a ao aos as c com da das de do dos e em na nas no nos o os ou para pela "
+    "pelo por sem um uma".split()
+)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase and strip accents ("Acrílico" -> "acrilico")."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def stem(token: str) -> str:
+    """Light Portuguese plural stripping (folhetos -> folheto, acoes -> acao)."""
+    if len(token) <= 3 or token.isdigit():
+        return token
+    if token.endswith(("oes", "aes")):
+        return token[:-3] + "ao"
+    if token.endswith("eis"):
+        return token[:-3] + "el"
+    if token.endswith("ns"):
+        return token[:-2] + "m"
+    if token.endswith("es") and token[-3] in "rsz":
+        return token[:-2]
+    if token.endswith("s"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str | None) -> list:
+    if not text:
+        return []
+    return [
+        stem(t)
+        for t in _TOKEN_RE.findall(normalize(text))
+        if t not in STOPWORDS and (len(t) > 1 or t.isdigit())
+    ]
+
+
+def delta_encode(positions: list) -> list:
+    return [p - positions[i - 1] if i else p for i, p in enumerate(positions)]
+
+
+def build_index(templates: list, variants: list) -> dict:
+    """Search index for active templates with at least one active variant."""
+    variants_by_template = {}
+    for v in variants:
+        if v.get("is_active") is False:
+            continue
+        variants_by_template.setdefault(v["product_template_id"], []).append(v)
+
+    docs = []
+    title = {}
+    body = {}
+    for template in sorted(templates, key=lambda t: t["id"]):
+        if template.get("is_active") is False:
+            continue
+        template_variants = variants_by_template.get(template["id"])
+        if not template_variants:
+            continue
+        template_variants.sort(key=lambda v: (v.get("display_order") or 0, v["id"]))
+        first = template_variants[0]
+        prices = [
+            float(v["base_price_including_vat"])
+            for v in template_variants
+            if v.get("base_price_including_vat")
+        ]
+
+        position = len(docs)
+        docs.append(
+            [
+                first["url_slug"],
+                template["name"],
+                min(prices) if prices else None,
+                first.get("main_image_url"),
+                template.get("category_id"),
+            ]
+        )
+
+        title_terms = set(tokenize(template["name"]))
+        body_terms = set(
+            tokenize(template.get("short_description"))
+            + tokenize(template.get("advantages"))
+        )
+        for term in title_terms:
+            title.setdefault(term, []).append(position)
+        for term in body_terms - title_terms:
+            body.setdefault(term, []).append(position)
+
+    return {
+        "version": INDEX_VERSION,
+        "stopwords": sorted(STOPWORDS),
+        "docs": docs,
+        "title": {t: delta_encode(p) for t, p in sorted(title.items())},
+        "body": {t: delta_encode(p) for t, p in sorted(body.items())},
+    }
+
+
+def write_index(index: dict, path: str = OUTPUT_FILE) -> bool:
+    """Write the index unless an identical one is already there."""
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            current = json.load(f)
+        current.pop("generated_at", None)
+        if current == index:
+            return False
+
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(
+            {"generated_at": datetime.now().isoformat(timespec="seconds"), **index},
+            f,
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+    os.replace(tmp_file, path)
+    return True
+
+
+def main(full: bool = False, offline: bool = False):
+    snapshot = CatalogSnapshot(SNAPSHOT_FILE, tables=SEARCH_TABLES)
+    try:
+        if offline:
+            # An empty snapshot would publish an empty index
+            snapshot.require_tables(["product_templates", "product_variants"])
+        else:
+            fetched = snapshot.refresh(full=full)
+            print(
+                "Snapshot refreshed: "
+                + ", ".join(f"{t} +{n}" for t, n in fetched.items())
+            )
+        templates = snapshot.rows("product_templates")
+        variants = snapshot.rows("product_variants")
+    finally:
+        snapshot.close()
+
+    index = build_index(templates, variants)
+    written = write_index(index)
+
+    print(f"\n=== SUMMARY ===")
+    print(f"Products indexed: {len(index['docs'])}")
+    print(f"Terms: {len(index['title'])} title, {len(index['body'])} body")
+    print(f"Index: {OUTPUT_FILE} ({os.path.getsize(OUTPUT_FILE):,} bytes)")
+    print("Written" if written else "Unchanged (not rewritten)")
+
+
+if __name__ == "__main__":
+    import sys
+
+    main(full="--full" in sys.argv, offline="--offline" in sys.argv)
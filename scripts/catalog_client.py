@@ -0,0 +1,37 @@
+"""
+Shared Supabase client for the catalog scripts.
+
+The client is created lazily on first use and then reused by every script
+running in the same process, so offline commands (dry runs, slugify, spec
+extraction, unit tests) never import supabase or read .env.local.
+With CATALOG_METRICS / CATALOG_TRACE set it is wrapped to record request
+metrics (see client_metrics).
+"""
+
+import os
+
+ENV_FILE = ".env.local"
+
+_client = None
+
+
+def get_client():
+    """Return the process-wide Supabase client, creating it on first use."""
+    global _client
+
+    if _client is None:
+        from dotenv import load_dotenv
+
+        from supabase import create_client
+
+        from client_metrics import instrument
+
+        load_dotenv(ENV_FILE)
+
+        url = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
+        key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv(
+            "NEXT_PUBLIC_SUPABASE_ANON_KEY"
+        )
+        _client = instrument(create_client(url, key))
+
+    return _client
@@ -0,0 +1,295 @@
+"""
+Local snapshot of the catalog reference tables.
+
+Keeps product_templates, product_variants and size_formats in a SQLite file
+under .cache/catalog so the importers can build their lookups without
+downloading the full tables on every run. Refreshes are incremental: only
+rows with updated_at at or after the stored watermark are fetched. Deleted
+rows are dropped too: after the fetch, one count request per table tells
+whether anything was deleted upstream, and only then are the ids compared
+(id-only keyset scan). --full re-downloads everything.
+
+Long-running processes (catalog_worker) call keep_reference_tables() so
+load_reference_tables keeps the decoded rows in memory and, after each
+incremental refresh, only re-reads the rows that changed.
+"""
+
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+CACHE_DIR = os.path.join(".cache", "catalog")
+SNAPSHOT_FILE = os.path.join(CACHE_DIR, "snapshot.sqlite3")
+PAGE_SIZE = 1000  # PostgREST max rows per request
+
+# Table -> columns kept in the snapshot (id and updated_at are always needed)
+SNAPSHOT_TABLES = {
+    "product_templates": ["id", "slug", "name", "updated_at"],
+    "product_variants": ["id", "product_template_id", "sku", "url_slug", "updated_at"],
+    "size_formats": ["id", "name", "code", "updated_at"],
+}
+
+
+# (snapshot path, table) -> (watermark, {id: row}); None = not kept
+_reference_cache = None
+
+
+class CatalogSnapshot:
+    """SQLite-backed copy of the reference tables with per-table watermarks."""
+
+    def __init__(self, path: str = SNAPSHOT_FILE, tables: dict | None = None):
+        self.path = path
+        # Table -> columns; other snapshots (e.g. the search index) pass
+        # their own set and path
+        self.tables = tables or SNAPSHOT_TABLES
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        # Table -> rows dropped by the last refresh (deleted upstream)
+        self.deleted = {}
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS snapshot_rows (
+                tbl TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                updated_at TEXT,
+                data TEXT NOT NULL,
+                PRIMARY KEY (tbl, id)
+            );
+            CREATE TABLE IF NOT EXISTS snapshot_watermarks (
+                tbl TEXT PRIMARY KEY,
+                updated_at TEXT,
+                refreshed_at TEXT NOT NULL
+            );
+            """
+        )
+
+    def close(self):
+        self.conn.close()
+
+    def watermark(self, table: str) -> str | None:
+        row = self.conn.execute(
+            "SELECT updated_at FROM snapshot_watermarks WHERE tbl = ?", (table,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def has_table(self, table: str) -> bool:
+        return (
+            self.conn.execute(
+                "SELECT 1 FROM snapshot_watermarks WHERE tbl = ?", (table,)
+            ).fetchone()
+            is not None
+        )
+
+    def require_tables(self, tables):
+        """Raise RuntimeError unless every table has been refreshed once."""
+        missing = [t for t in tables if not self.has_table(t)]
+        if missing:
+            raise RuntimeError(
+                f"No local snapshot for {', '.join(missing)}; "
+                "run once without --offline first"
+            )
+
+    def rows(self, table: str) -> list:
+        """All cached rows of a table, as dicts."""
+        return [
+            json.loads(data)
+            for (data,) in self.conn.execute(
+                "SELECT data FROM snapshot_rows WHERE tbl = ? ORDER BY id", (table,)
+            )
+        ]
+
+    def rows_since(self, table: str, since: str | None) -> list:
+        """Cached rows of a table updated at/after since (all when None)."""
+        if since is None:
+            return self.rows(table)
+        return [
+            json.loads(data)
+            for (data,) in self.conn.execute(
+                "SELECT data FROM snapshot_rows WHERE tbl = ? AND updated_at >= ?",
+                (table, since),
+            )
+        ]
+
+    def upsert_rows(self, table: str, rows: list):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO snapshot_rows (tbl, id, updated_at, data) "
+            "VALUES (?, ?, ?, ?)",
+            [
+                (table, r["id"], r.get("updated_at"), json.dumps(r, ensure_ascii=False))
+                for r in rows
+            ],
+        )
+
+    def refresh_table(self, client, table: str, full: bool = False) -> int:
+        """Fetch rows changed since the watermark. Returns rows transferred."""
+        columns = ", ".join(self.tables[table])
+        since = None if full else self.watermark(table)
+        newest = since
+        fetched = 0
+
+        if full:
+            self.conn.execute("DELETE FROM snapshot_rows WHERE tbl = ?", (table,))
+            if _reference_cache is not None:
+                _reference_cache.pop((self.path, table), None)
+
+        start = 0
+        while True:
+            query = client.table(table).select(columns)
+            if since:
+                # gte so rows sharing the watermark timestamp are never missed
+                query = query.gte("updated_at", since)
+            page = (
+                query.order("updated_at")
+                .order("id")
+                .range(start, start + PAGE_SIZE - 1)
+                .execute()
+                .data
+            )
+            if not page:
+                break
+
+            self.upsert_rows(table, page)
+            fetched += len(page)
+            for r in page:
+                if r.get("updated_at") and (newest is None or r["updated_at"] > newest):
+                    newest = r["updated_at"]
+
+            if len(page) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+
+        if since:
+            self.deleted[table] = self.drop_deleted(client, table)
+
+        self.conn.execute(
+            "INSERT OR REPLACE INTO snapshot_watermarks (tbl, updated_at, refreshed_at) "
+            "VALUES (?, ?, ?)",
+            (table, newest, datetime.now().isoformat()),
+        )
+        self.conn.commit()
+        return fetched
+
+    def drop_deleted(self, client, table: str) -> int:
+        """Drop cached rows deleted upstream. Returns how many were dropped.
+
+        Inserts and updates are all fetched by the incremental refresh, so
+        the cached table only outgrows the remote one through deletes.
+        """
+        remote = client.table(table).select("id", count="exact").limit(1).execute().count
+        (local,) = self.conn.execute(
+            "SELECT COUNT(*) FROM snapshot_rows WHERE tbl = ?", (table,)
+        ).fetchone()
+        if remote is None or local <= remote:
+            return 0
+
+        live = set()
+        last_id = 0
+        while True:
+            page = (
+                client.table(table)
+                .select("id")
+                .gt("id", last_id)
+                .order("id")
+                .limit(PAGE_SIZE)
+                .execute()
+                .data
+            )
+            live.update(r["id"] for r in page)
+            if len(page) < PAGE_SIZE:
+                break
+            last_id = page[-1]["id"]
+
+        deleted = [
+            row_id
+            for (row_id,) in self.conn.execute(
+                "SELECT id FROM snapshot_rows WHERE tbl = ?", (table,)
+            )
+            if row_id not in live
+        ]
+        self.conn.executemany(
+            "DELETE FROM snapshot_rows WHERE tbl = ? AND id = ?",
+            [(table, row_id) for row_id in deleted],
+        )
+        if _reference_cache is not None and (self.path, table) in _reference_cache:
+            rows = _reference_cache[(self.path, table)][1]
+            for row_id in deleted:
+                rows.pop(row_id, None)
+        return len(deleted)
+
+    def refresh(self, client=None, tables: list | None = None, full: bool = False) -> dict:
+        """Refresh the given tables (default: all). Returns rows per table."""
+        if client is None:
+            from catalog_client import get_client
+
+            client = get_client()
+        return {
+            table: self.refresh_table(client, table, full=full)
+            for table in (tables or self.tables)
+        }
+
+
+def load_reference_tables(tables: list, offline: bool = False) -> dict:
+    """Refresh (unless offline) and return the cached rows of each table."""
+    snapshot = CatalogSnapshot()
+    try:
+        if offline:
+            snapshot.require_tables(tables)
+        else:
+            fetched = snapshot.refresh(tables=tables)
+            print(
+                "Snapshot refreshed: "
+                + ", ".join(
+                    f"{t} +{n}"
+                    + (f" -{snapshot.deleted[t]}" if snapshot.deleted.get(t) else "")
+                    for t, n in fetched.items()
+                )
+            )
+        if _reference_cache is None:
+            return {t: snapshot.rows(t) for t in tables}
+        return {t: cached_rows(snapshot, t) for t in tables}
+    finally:
+        snapshot.close()
+
+
+def keep_reference_tables():
+    """Keep reference rows in memory across load_reference_tables calls."""
+    global _reference_cache
+
+    if _reference_cache is None:
+        _reference_cache = {}
+
+
+def cached_rows(snapshot: CatalogSnapshot, table: str) -> list:
+    """Rows of table from memory, updated with the rows changed since last time."""
+    key = (snapshot.path, table)
+    since, rows = _reference_cache.get(key, (None, None))
+    if rows is None:
+        rows = {}
+    for row in snapshot.rows_since(table, since):
+        rows[row["id"]] = row
+    _reference_cache[key] = (snapshot.watermark(table), rows)
+    return sorted(rows.values(), key=lambda r: r["id"])
+
+
+def main():
+    import sys
+
+    full = "--full" in sys.argv
+    snapshot = CatalogSnapshot()
+    try:
+        fetched = snapshot.refresh(full=full)
+    finally:
+        snapshot.close()
+
+    print(f"\n=== SUMMARY ===")
+    print(f"Snapshot: {SNAPSHOT_FILE} ({'full' if full else 'incremental'})")
+    for table, count in fetched.items():
+        print(
+            f"{table}: {count} rows transferred, "
+            f"{snapshot.deleted.get(table, 0)} deleted rows dropped"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""
+Long-running catalog worker with a local job queue.
+
+Jobs are jocril_catalog commands ("price-tiers --pg", "fix-variants",
+"enrich", ...) plus "retier VARIANT_ID ...", which regenerates the price
+tiers of a few variants after a price edit. They are queued in a SQLite file
+(.cache/catalog/jobs.sqlite3, WAL mode, so other processes can enqueue
+while the worker runs) and run in one warm process: interpreter, imports,
+.env.local and the Supabase client are set up once, and reference tables
+stay decoded in memory between jobs (only rows changed since the previous
+job are re-read, see catalog_snapshot.keep_reference_tables).
+
+Queue semantics:
+    priority     higher runs first (default per command, see PRIORITIES)
+    dedup        enqueuing a job identical to one still queued only raises
+                 the queued job's priority; a job already running is queued
+                 again, as it may have missed the change
+    coalescing   queued retier jobs are claimed together and run as one
+    retry        failed jobs are retried MAX_ATTEMPTS times with exponential
+                 backoff, then kept as failed (see status)
+
+Usage:
+    python scripts/catalog_worker.py run [--once] [--poll SECONDS]
+    python scripts/catalog_worker.py enqueue [--priority N] COMMAND [ARGS ...]
+    python scripts/catalog_worker.py status
+"""
+
+import json
+import os
+import signal
+import sqlite3
+import time
+import traceback
+
+from catalog_snapshot import CACHE_DIR
+
+QUEUE_FILE = os.path.join(CACHE_DIR, "jobs.sqlite3")
+POLL_SECONDS = 1.0
+MAX_ATTEMPTS = 3
+RETRY_BASE_SECONDS = 30
+COALESCE_LIMIT = 500  # Queued retier jobs merged into one run
+ID_BATCH_SIZE = 200
+
+RETIER_COMMAND = "retier"
+# Default priority per command; others run at 0
+PRIORITIES = {
+    RETIER_COMMAND: 10,
+    "stock-sync": 5,
+    "effective-prices": 5,
+}
+NOT_QUEUEABLE = ("worker", "enqueue")
+
+
+class JobQueue:
+    """SQLite-backed priority queue of commands."""
+
+    def __init__(self, path: str = QUEUE_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                command TEXT NOT NULL,
+                args TEXT NOT NULL,
+                dedup_key TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                run_after REAL NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                last_error TEXT
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_queued_dedup
+                ON jobs (dedup_key) WHERE status = 'queued';
+            CREATE INDEX IF NOT EXISTS idx_jobs_next
+                ON jobs (status, priority DESC, id);
+            """
+        )
+
+    def close(self):
+        self.conn.close()
+
+    def enqueue(self, argv: list, priority: int | None = None) -> int:
+        """Queue a command (deduplicated against queued jobs). Returns its id."""
+        command, args = argv[0], list(argv[1:])
+        if priority is None:
+            priority = PRIORITIES.get(command, 0)
+        dedup_key = json.dumps([command, *args])
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT id FROM jobs WHERE dedup_key = ? AND status = 'queued'",
+                (dedup_key,),
+            ).fetchone()
+            if row:
+                self.conn.execute(
+                    "UPDATE jobs SET priority = MAX(priority, ?) WHERE id = ?",
+                    (priority, row["id"]),
+                )
+                job_id = row["id"]
+            else:
+                job_id = self.conn.execute(
+                    "INSERT INTO jobs (command, args, dedup_key, priority, run_after, "
+                    "created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (command, json.dumps(args), dedup_key, priority, now, now),
+                ).lastrowid
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return job_id
+
+    def claim(self) -> list:
+        """Mark the next due job running and return it, with any queued jobs
+        coalesced into it (retier), as a list of rows. Empty when idle."""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            job = self.conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND run_after <= ? "
+                "ORDER BY priority DESC, id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if job is None:
+                self.conn.execute("COMMIT")
+                return []
+            jobs = [job]
+            if job["command"] == RETIER_COMMAND:
+                jobs += self.conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' AND run_after <= ? "
+                    "AND command = ? AND id != ? ORDER BY id LIMIT ?",
+                    (now, RETIER_COMMAND, job["id"], COALESCE_LIMIT - 1),
+                ).fetchall()
+            self.conn.executemany(
+                "UPDATE jobs SET status = 'running', started_at = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                [(now, j["id"]) for j in jobs],
+            )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return jobs
+
+    def finish(self, jobs: list, error: str | None = None, retry: bool = True):
+        """Mark jobs done, or failed: queued again with backoff while attempts remain."""
+        now = time.time()
+        for job in jobs:
+            attempts = job["attempts"] + 1
+            if error is None:
+                status, run_after = "done", job["run_after"]
+            elif retry and attempts < MAX_ATTEMPTS:
+                backoff = RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+                status, run_after = "queued", now + backoff
+            else:
+                status, run_after = "failed", job["run_after"]
+            try:
+                self.conn.execute(
+                    "UPDATE jobs SET status = ?, run_after = ?, finished_at = ?, "
+                    "last_error = ? WHERE id = ?",
+                    (status, run_after, now, error, job["id"]),
+                )
+            except sqlite3.IntegrityError:
+                # An identical job was queued meanwhile: it replaces the retry
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'failed', finished_at = ?, last_error = ? "
+                    "WHERE id = ?",
+                    (now, error, job["id"]),
+                )
+
+    def release(self, jobs: list):
+        """Put jobs interrupted by a shutdown back in the queue."""
+        for job in jobs:
+            try:
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'queued', attempts = attempts - 1 "
+                    "WHERE id = ?",
+                    (job["id"],),
+                )
+            except sqlite3.IntegrityError:
+                self.conn.execute("DELETE FROM jobs WHERE id = ?", (job["id"],))
+
+    def recover(self) -> int:
+        """Requeue jobs left running by a worker that died. Returns their count.
+
+        The interrupted run counts as an attempt, so a job that kills the
+        worker every time ends up failed instead of looping.
+        """
+        stale = self.conn.execute("SELECT * FROM jobs WHERE status = 'running'").fetchall()
+        for job in stale:
+            self.finish([{**job, "attempts": job["attempts"] - 1}], error="worker stopped")
+        return len(stale)
+
+    def counts(self) -> dict:
+        return {
+            r["status"]: r["n"]
+            for r in self.conn.execute(
+                "SELECT status, count(*) AS n FROM jobs GROUP BY status"
+            )
+        }
+
+    def recent(self, status: str, limit: int = 10) -> list:
+        return self.conn.execute(
+            "SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?",
+            (status, limit),
+        ).fetchall()
+
+
+def retier(variant_ids: list) -> int:
+    """Regenerate the price tiers of a few variants. Returns tiers written."""
+    from catalog_client import get_client
+    from generate_price_tiers import retier_variants
+
+    supabase = get_client()
+    variant_ids = sorted(set(variant_ids))
+    prices = {}
+    for i in range(0, len(variant_ids), ID_BATCH_SIZE):
+        for row in (
+            supabase.table("product_variants")
+            .select("id, base_price_including_vat")
+            .in_("id", variant_ids[i : i + ID_BATCH_SIZE])
+            .eq("is_active", True)
+            .execute()
+            .data
+        ):
+            prices[row["id"]] = row["base_price_including_vat"]
+    return retier_variants(prices, supabase=supabase)
+
+
+def parse_job(parser, argv: list):
+    """Validated command args for argv (retier is handled by the worker)."""
+    if argv[0] in NOT_QUEUEABLE:
+        raise ValueError(f"'{argv[0]}' cannot run as a job")
+    if argv[0] == RETIER_COMMAND:
+        ids = [int(a) for a in argv[1:]]
+        if not ids:
+            raise ValueError("retier needs at least one variant id")
+        return ids
+    return parser.parse_args(argv)
+
+
+def error_text(e: BaseException) -> str:
+    return "".join(traceback.format_exception_only(type(e), e)).strip()
+
+
+def run_jobs(queue: JobQueue, jobs: list, parser) -> bool:
+    """Run claimed jobs (several only for coalesced retier). Returns success."""
+    import client_metrics
+
+    command = jobs[0]["command"]
+    # Checked per job, so one bad job does not fail a coalesced batch
+    parsed = []
+    for job in jobs:
+        try:
+            parsed.append((job, parse_job(parser, [command, *json.loads(job["args"])])))
+        except (ValueError, SystemExit) as e:
+            queue.finish([job], error=error_text(e), retry=False)
+            print(f"✗ job {job['id']}: {command} rejected: {error_text(e)}")
+    if not parsed:
+        return False
+    jobs = [job for job, _ in parsed]
+
+    label = f"job {jobs[0]['id']}: {command}"
+    start = time.perf_counter()
+    try:
+        if command == RETIER_COMMAND:
+            variant_ids = sorted({i for _, ids in parsed for i in ids})
+            count = retier(variant_ids)
+            label += f" ({len(variant_ids)} variants, {count} tiers, {len(jobs)} jobs)"
+        else:
+            args = parsed[0][1]
+            args.func(args)
+    except (Exception, SystemExit) as e:
+        queue.finish(jobs, error=error_text(e))
+        print(f"✗ {label} failed after {time.perf_counter() - start:.3f}s: {error_text(e)}")
+        traceback.print_exc()
+        client_metrics.report(label)
+        return False
+    queue.finish(jobs)
+    print(f"✓ {label} in {time.perf_counter() - start:.3f}s")
+    client_metrics.report(label)
+    return True
+
+
+def run(once: bool = False, poll: float = POLL_SECONDS):
+    """Process jobs until stopped (SIGINT/SIGTERM), or until idle with once."""
+    import catalog_snapshot
+    from catalog_client import get_client
+    from jocril_catalog import build_parser
+
+    queue = JobQueue()
+    recovered = queue.recover()
+    if recovered:
+        print(f"Requeued {recovered} jobs left running")
+
+    # Warm once: reference rows stay in memory, the client is shared
+    catalog_snapshot.keep_reference_tables()
+    parser = build_parser()
+    get_client()
+
+    stopping = []
+    previous = signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    stats = {"done": 0, "failed": 0}
+    print(f"Worker started (queue: {QUEUE_FILE})")
+    try:
+        while not stopping:
+            jobs = queue.claim()
+            if not jobs:
+                if once:
+                    break
+                time.sleep(poll)
+                continue
+            try:
+                ok = run_jobs(queue, jobs, parser)
+            except KeyboardInterrupt:
+                queue.release(jobs)
+                raise
+            stats["done" if ok else "failed"] += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+        counts = queue.counts()
+        queue.close()
+
+    print(f"\n=== SUMMARY ===")
+    print(f"Runs: {stats['done']} done, {stats['failed']} failed")
+    print(
+        "Queue: "
+        + ", ".join(f"{n} {status}" for status, n in sorted(counts.items()))
+    )
+
+
+def enqueue(argv: list, priority: int | None = None) -> int:
+    """Validate and queue one command. Returns the job id."""
+    from jocril_catalog import build_parser
+
+    parse_job(build_parser(), argv)
+    queue = JobQueue()
+    try:
+        return queue.enqueue(argv, priority)
+    finally:
+        queue.close()
+
+
+def status():
+    queue = JobQueue()
+    try:
+        counts = queue.counts()
+        print(
+            "Queue: "
+            + (", ".join(f"{n} {s}" for s, n in sorted(counts.items())) or "empty")
+        )
+        for label in ("queued", "running", "failed"):
+            for job in queue.recent(label):
+                args = " ".join(json.loads(job["args"]))
+                print(
+                    f"  [{label}] #{job['id']} p{job['priority']} {job['command']} {args}"
+                    f" (attempts: {job['attempts']})"
+                )
+                if job["last_error"]:
+                    print(f"      {job['last_error']}")
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    argv = sys.argv[1:]
+    if argv[:1] == ["run"]:
+        poll = POLL_SECONDS
+        if "--poll" in argv:
+            poll = float(argv[argv.index("--poll") + 1])
+        run(once="--once" in argv, poll=poll)
+    elif argv[:1] == ["enqueue"] and len(argv) > 1:
+        argv = argv[1:]
+        priority = None
+        if argv[0] == "--priority":
+            priority, argv = int(argv[1]), argv[2:]
+        print(f"Queued job {enqueue(argv, priority)}")
+    elif argv[:1] == ["status"]:
+        status()
+    else:
+        print(__doc__)
+        sys.exit(1)
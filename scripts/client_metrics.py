@@ -0,0 +1,284 @@
+"""
+Request metrics for the shared Supabase client.
+
+With CATALOG_METRICS=1 (or jocril_catalog --metrics) get_client returns the
+client wrapped in InstrumentedClient. Every executed request is counted per
+(table, operation) with the rows it returned, its approximate payload
+(JSON size of the request body and of the response data) and a latency
+histogram, and a breakdown is printed after the script's SUMMARY: per
+table/operation, plus how much of the run's wall time was spent waiting on
+the database. With CATALOG_TRACE=FILE (or --trace FILE) every request is
+also appended to FILE as one JSON span per line.
+
+When neither is set get_client returns the bare client: nothing is wrapped,
+timed or serialized.
+
+Usage:
+    CATALOG_METRICS=1 python scripts/effective_prices.py
+    python scripts/jocril_catalog.py --metrics --trace .cache/catalog/trace.jsonl feed
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+
+METRICS_ENV = "CATALOG_METRICS"
+TRACE_ENV = "CATALOG_TRACE"
+
+# Upper bounds (ms) of the latency histogram buckets; the last one is open
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Builder methods that pick the operation of a request, and carry its body
+OPERATIONS = ("select", "insert", "upsert", "update", "delete")
+BODY_OPERATIONS = ("insert", "upsert", "update")
+
+_metrics = None
+
+
+class RequestStats:
+    """Counters and latency histogram of one (table, operation)."""
+
+    __slots__ = ("count", "errors", "rows", "bytes", "seconds", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, seconds: float, rows: int, nbytes: int, error: bool):
+        self.count += 1
+        self.errors += error
+        self.rows += rows
+        self.bytes += nbytes
+        self.seconds += seconds
+        ms = seconds * 1000
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def percentile(self, q: float) -> str:
+        """Bucket holding the q-quantile, as its upper bound ("≤50ms")."""
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= target:
+                if i < len(LATENCY_BUCKETS_MS):
+                    return f"≤{LATENCY_BUCKETS_MS[i]}ms"
+                return f">{LATENCY_BUCKETS_MS[-1]}ms"
+        return "-"
+
+
+class ClientMetrics:
+    """Per-run request counters, shared by every thread using the client."""
+
+    def __init__(self, trace_path: str | None = None):
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.started = time.perf_counter()
+        self.trace = None
+        if trace_path:
+            os.makedirs(os.path.dirname(trace_path) or ".", exist_ok=True)
+            self.trace = open(trace_path, "a", encoding="utf-8")
+
+    def record(
+        self,
+        table: str,
+        op: str,
+        started: float,
+        seconds: float,
+        rows: int,
+        nbytes: int,
+        error: str | None = None,
+    ):
+        with self.lock:
+            stats = self.stats.get((table, op))
+            if stats is None:
+                stats = self.stats[(table, op)] = RequestStats()
+            stats.add(seconds, rows, nbytes, error is not None)
+            if self.trace:
+                span = {
+                    "name": f"{table}.{op}",
+                    "start": round(started, 6),
+                    "duration_ms": round(seconds * 1000, 3),
+                    "rows": rows,
+                    "bytes": nbytes,
+                    "thread": threading.current_thread().name,
+                }
+                if error:
+                    span["error"] = error
+                self.trace.write(json.dumps(span) + "\n")
+
+    def report(self, title: str = "run"):
+        """Print the breakdown of the requests since the last report and reset."""
+        with self.lock:
+            stats, self.stats = self.stats, {}
+            wall = time.perf_counter() - self.started
+            self.started = time.perf_counter()
+            if self.trace:
+                self.trace.flush()
+        if not stats:
+            return
+
+        total = RequestStats()
+        print(f"\n=== CLIENT METRICS ({title}) ===")
+        print(
+            f"{'table.operation':<38} {'requests':>8} {'errors':>6} {'rows':>9} "
+            f"{'KB':>9} {'total s':>8} {'p50':>8} {'p95':>8}"
+        )
+        for (table, op), s in sorted(stats.items(), key=lambda kv: -kv[1].seconds):
+            print(
+                f"{table + '.' + op:<38} {s.count:>8} {s.errors:>6} {s.rows:>9} "
+                f"{s.bytes / 1024:>9.1f} {s.seconds:>8.2f} "
+                f"{s.percentile(0.5):>8} {s.percentile(0.95):>8}"
+            )
+            total.count += s.count
+            total.errors += s.errors
+            total.rows += s.rows
+            total.bytes += s.bytes
+            total.seconds += s.seconds
+        # Parallel imports overlap requests, so this can exceed 100%
+        share = total.seconds / wall * 100 if wall else 0
+        print(
+            f"Requests: {total.count} ({total.errors} failed), {total.rows} rows, "
+            f"{total.bytes / 1024:.1f} KB"
+        )
+        print(
+            f"Waiting on the database: {total.seconds:.2f}s of {wall:.2f}s wall "
+            f"({share:.0f}%)"
+        )
+
+    def close(self):
+        self.report()
+        if self.trace:
+            self.trace.close()
+            self.trace = None
+
+
+def payload_size(data) -> int:
+    if data is None:
+        return 0
+    return len(json.dumps(data, default=str))
+
+
+def row_count(data) -> int:
+    if isinstance(data, list):
+        return len(data)
+    return 0 if data is None else 1
+
+
+class InstrumentedBuilder:
+    """A postgrest request builder whose execute() is timed and counted."""
+
+    __slots__ = ("_builder", "_metrics", "_table", "_op", "_body_bytes")
+
+    def __init__(self, builder, metrics, table, op=None, body_bytes=0):
+        self._builder = builder
+        self._metrics = metrics
+        self._table = table
+        self._op = op
+        self._body_bytes = body_bytes
+
+    def __getattr__(self, name):
+        value = getattr(self._builder, name)
+        if not callable(value):
+            # Properties such as .not_ return the builder itself
+            return self._wrap(value, self._op, self._body_bytes)
+
+        def method(*args, **kwargs):
+            op, body_bytes = self._op, self._body_bytes
+            if op is None and name in OPERATIONS:
+                op = name
+                if name in BODY_OPERATIONS and args:
+                    body_bytes = payload_size(args[0])
+            return self._wrap(value(*args, **kwargs), op, body_bytes)
+
+        return method
+
+    def _wrap(self, value, op, body_bytes):
+        if hasattr(value, "execute"):
+            return InstrumentedBuilder(value, self._metrics, self._table, op, body_bytes)
+        return value
+
+    def execute(self, *args, **kwargs):
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            response = self._builder.execute(*args, **kwargs)
+        except Exception as e:
+            self._metrics.record(
+                self._table,
+                self._op or "request",
+                started,
+                time.perf_counter() - start,
+                0,
+                self._body_bytes,
+                error=type(e).__name__,
+            )
+            raise
+        seconds = time.perf_counter() - start
+        data = getattr(response, "data", None)
+        self._metrics.record(
+            self._table,
+            self._op or "request",
+            started,
+            seconds,
+            row_count(data),
+            self._body_bytes + payload_size(data),
+        )
+        return response
+
+
+class InstrumentedClient:
+    """Supabase client whose table/rpc requests are recorded in metrics."""
+
+    def __init__(self, client, metrics: ClientMetrics):
+        self._client = client
+        self.metrics = metrics
+
+    def table(self, name: str):
+        return InstrumentedBuilder(self._client.table(name), self.metrics, name)
+
+    from_ = table
+
+    def rpc(self, fn: str, params: dict | None = None, *args, **kwargs):
+        builder = self._client.rpc(fn, params or {}, *args, **kwargs)
+        return InstrumentedBuilder(
+            builder, self.metrics, f"rpc:{fn}", "call", payload_size(params)
+        )
+
+    def __getattr__(self, name):
+        # storage, auth, ... are passed through untimed
+        return getattr(self._client, name)
+
+
+def enable(trace_path: str | None = None):
+    """Turn metrics on for clients created from now on in this process."""
+    os.environ[METRICS_ENV] = "1"
+    if trace_path:
+        os.environ[TRACE_ENV] = trace_path
+
+
+def instrument(client):
+    """Wrap client when metrics are enabled, else return it unchanged."""
+    global _metrics
+
+    trace_path = os.getenv(TRACE_ENV)
+    if os.getenv(METRICS_ENV, "0") in ("", "0") and not trace_path:
+        return client
+    if _metrics is None:
+        _metrics = ClientMetrics(trace_path)
+        atexit.register(_metrics.close)
+    return InstrumentedClient(client, _metrics)
+
+
+def report(title: str = "run"):
+    """Print and reset the breakdown so far (no-op when metrics are off)."""
+    if _metrics is not None:
+        _metrics.report(title)
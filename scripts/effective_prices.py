@@ -0,0 +1,380 @@
+"""
+Materialize product_effective_prices: the unit price a customer pays per
+variant and quantity band on a given date.
+
+Bands are the variant's price_tiers (plus a 1..first tier band at the base
+price). On each band the best promotion is applied that is active on the
+date (is_active, start/end dates, usage_count below usage_limit) and linked
+through promotion_products:
+    percentage  price * (1 - value / 100)
+    fixed       price - value per unit
+bogo/bundle promotions depend on the cart contents and are left to the
+cart. min_purchase_amount and max_discount_amount are evaluated at the
+band's min_quantity; the cart still re-checks them for the real quantity.
+
+Runs are incremental. Only variants are recomputed whose product_variants
+or price_tiers rows changed since the stored watermark (updated_at), or
+that are linked to a promotion that started, ended, hit its usage limit or
+was edited since the last run. Rows are written only when they differ from
+what is stored, and bands that no longer exist are deleted.
+price_date is the date a row was last recomputed for. Run it daily;
+generate_price_tiers.py --effective-prices also runs it after rewriting tiers.
+
+Usage:
+    python scripts/effective_prices.py [--full] [--dry-run] [--date YYYY-MM-DD]
+"""
+
+import json
+import os
+from datetime import date
+
+from catalog_snapshot import CACHE_DIR
+
+STATE_FILE = os.path.join(CACHE_DIR, "effective_prices.json")
+
+PAGE_SIZE = 1000
+ID_BATCH_SIZE = 200  # Variant ids per in_() filter (URL length)
+UPSERT_BATCH_SIZE = 500
+UNIT_PRICE_PROMOTIONS = ("percentage", "fixed")
+PROMOTION_TERMS = (
+    "promotion_type",
+    "discount_value",
+    "min_purchase_amount",
+    "max_discount_amount",
+    "updated_at",
+)
+
+ROW_COLUMNS = (
+    "product_variant_id",
+    "min_quantity",
+    "max_quantity",
+    "list_price",
+    "tier_price",
+    "price_per_unit",
+    "discount_percentage",
+    "promotion_id",
+    "price_date",
+)
+
+
+def load_state(full: bool = False) -> dict:
+    if full or not os.path.exists(STATE_FILE):
+        return {"watermark": None, "price_date": None, "promotions": {}}
+    with open(STATE_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state: dict):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp_file = STATE_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_file, STATE_FILE)
+
+
+def promotion_is_active(promotion: dict, on_date: date) -> bool:
+    if promotion.get("is_active") is False:
+        return False
+    if promotion.get("promotion_type") not in UNIT_PRICE_PROMOTIONS:
+        return False
+    if not promotion["start_date"] <= on_date.isoformat() <= promotion["end_date"]:
+        return False
+    limit = promotion.get("usage_limit")
+    return limit is None or (promotion.get("usage_count") or 0) < limit
+
+
+def promoted_price(promotion: dict, price: float, quantity: int) -> float | None:
+    """Unit price after the promotion, or None if it does not apply."""
+    minimum = promotion.get("min_purchase_amount")
+    if minimum and price * quantity < float(minimum):
+        return None
+
+    value = float(promotion["discount_value"])
+    if promotion["promotion_type"] == "percentage":
+        discount = price * value / 100
+    else:
+        discount = value
+    cap = promotion.get("max_discount_amount")
+    if cap:
+        discount = min(discount, float(cap) / quantity)
+    return max(round(price - discount, 2), 0.0)
+
+
+def quantity_bands(base_price: float, tiers: list) -> list:
+    """[(min_quantity, max_quantity, tier_price)] covering 1..infinity."""
+    tiers = sorted(tiers, key=lambda t: t["min_quantity"])
+    bands = []
+    if not tiers or tiers[0]["min_quantity"] > 1:
+        first = tiers[0]["min_quantity"] - 1 if tiers else None
+        bands.append((1, first, base_price))
+    for t in tiers:
+        bands.append((t["min_quantity"], t.get("max_quantity"), float(t["price_per_unit"])))
+    return bands
+
+
+def effective_rows(variant: dict, tiers: list, promotions: list, on_date: date) -> list:
+    """product_effective_prices rows for one variant (empty if not for sale)."""
+    base_price = float(variant.get("base_price_including_vat") or 0)
+    if variant.get("is_active") is False or base_price <= 0:
+        return []
+
+    rows = []
+    for min_quantity, max_quantity, tier_price in quantity_bands(base_price, tiers):
+        price, promotion_id = tier_price, None
+        for promotion in promotions:
+            candidate = promoted_price(promotion, tier_price, min_quantity)
+            if candidate is not None and candidate < price:
+                price, promotion_id = candidate, promotion["id"]
+        rows.append(
+            {
+                "product_variant_id": variant["id"],
+                "min_quantity": min_quantity,
+                "max_quantity": max_quantity,
+                "list_price": round(base_price, 2),
+                "tier_price": round(tier_price, 2),
+                "price_per_unit": round(price, 2),
+                "discount_percentage": round((1 - price / base_price) * 100, 2),
+                "promotion_id": promotion_id,
+                "price_date": on_date.isoformat(),
+            }
+        )
+    return rows
+
+
+def fetch_all(query_factory) -> list:
+    """All rows of a query, PAGE_SIZE at a time (ordered by id)."""
+    rows = []
+    start = 0
+    while True:
+        page = (
+            query_factory().order("id").range(start, start + PAGE_SIZE - 1).execute().data
+        )
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+
+def fetch_by_variant(supabase, table: str, columns: str, variant_ids: list) -> dict:
+    """{variant_id: [row, ...]} for the given variants."""
+    key = "id" if table == "product_variants" else "product_variant_id"
+    grouped = {}
+    for i in range(0, len(variant_ids), ID_BATCH_SIZE):
+        batch = variant_ids[i : i + ID_BATCH_SIZE]
+        rows = fetch_all(
+            lambda: supabase.table(table).select(columns).in_(key, batch)
+        )
+        for row in rows:
+            grouped.setdefault(row[key], []).append(row)
+    return grouped
+
+
+def load_promotions(supabase, on_date: date) -> tuple:
+    """({promotion_id: fingerprint}, {variant_id: [active promotion, ...]})
+
+    The fingerprint covers everything that changes a promotion's effect on
+    the date, including its linked variants, so comparing fingerprints with
+    the previous run finds promotions that started, ended or were edited.
+    """
+    promotions = fetch_all(lambda: supabase.table("promotions").select("*"))
+    links = fetch_all(
+        lambda: supabase.table("promotion_products").select(
+            "id, promotion_id, product_variant_id"
+        )
+    )
+    variants_of = {}
+    for link in links:
+        variants_of.setdefault(link["promotion_id"], []).append(link["product_variant_id"])
+
+    fingerprints = {}
+    by_variant = {}
+    for promotion in promotions:
+        variant_ids = sorted(variants_of.get(promotion["id"], []))
+        active = promotion_is_active(promotion, on_date)
+        fingerprints[str(promotion["id"])] = {
+            "active": active,
+            "terms": [str(promotion.get(c)) for c in PROMOTION_TERMS],
+            "variants": variant_ids,
+        }
+        if active:
+            for variant_id in variant_ids:
+                by_variant.setdefault(variant_id, []).append(promotion)
+    return fingerprints, by_variant
+
+
+def changed_promotion_variants(previous: dict, current: dict) -> set:
+    """Variants linked (before or now) to a promotion whose fingerprint changed."""
+    affected = set()
+    for promotion_id in set(previous) | set(current):
+        before = previous.get(promotion_id) or {"active": False, "variants": []}
+        after = current.get(promotion_id) or {"active": False, "variants": []}
+        if before == after or not (before["active"] or after["active"]):
+            continue
+        affected.update(before["variants"], after["variants"])
+    return affected
+
+
+def changed_since(supabase, table: str, column: str, watermark: str | None) -> tuple:
+    """(ids in `column` of rows updated at/after the watermark, newest updated_at)"""
+    rows = fetch_all(
+        lambda: supabase.table(table)
+        .select(f"id, {column}, updated_at")
+        .gte("updated_at", watermark)
+    )
+    newest = max((r["updated_at"] for r in rows if r.get("updated_at")), default=None)
+    return {r[column] for r in rows}, newest
+
+
+def diff_rows(stored: list, computed: list) -> tuple:
+    """(rows to upsert, stale min_quantities to delete) for one variant.
+
+    price_date is not compared: a row stays valid until its price changes.
+    """
+    by_quantity = {
+        r["min_quantity"]: {c: r.get(c) for c in ROW_COLUMNS} for r in stored
+    }
+    upserts = []
+    for row in computed:
+        old = by_quantity.pop(row["min_quantity"], None)
+        if old is None or any(
+            _differs(old[c], row[c]) for c in ROW_COLUMNS if c != "price_date"
+        ):
+            upserts.append(row)
+    return upserts, sorted(by_quantity)
+
+
+def _differs(stored, computed) -> bool:
+    if isinstance(computed, float) and stored is not None:
+        return abs(float(stored) - computed) > 0.005
+    return stored != computed
+
+
+def refresh(
+    supabase,
+    variant_ids: list | None,
+    promotions_by_variant: dict,
+    on_date: date,
+    dry_run: bool = False,
+) -> dict:
+    """Recompute the given variants (None = all). Returns counts."""
+    if variant_ids is None:
+        variants = fetch_all(
+            lambda: supabase.table("product_variants").select(
+                "id, base_price_including_vat, is_active"
+            )
+        )
+        variant_ids = [v["id"] for v in variants]
+        variants = {v["id"]: [v] for v in variants}
+    else:
+        variant_ids = sorted(variant_ids)
+        variants = fetch_by_variant(
+            supabase,
+            "product_variants",
+            "id, base_price_including_vat, is_active",
+            variant_ids,
+        )
+
+    tiers = fetch_by_variant(
+        supabase,
+        "price_tiers",
+        "id, product_variant_id, min_quantity, max_quantity, price_per_unit",
+        variant_ids,
+    )
+    stored = fetch_by_variant(
+        supabase, "product_effective_prices", "id, " + ", ".join(ROW_COLUMNS), variant_ids
+    )
+
+    upserts = []
+    deletes = {}
+    unchanged = 0
+    for variant_id in variant_ids:
+        variant = variants.get(variant_id, [{"id": variant_id, "is_active": False}])[0]
+        rows = effective_rows(
+            variant,
+            tiers.get(variant_id, []),
+            promotions_by_variant.get(variant_id, []),
+            on_date,
+        )
+        changed, stale = diff_rows(stored.get(variant_id, []), rows)
+        if not changed and not stale:
+            unchanged += 1
+        upserts.extend(changed)
+        if stale:
+            deletes[variant_id] = stale
+
+    if not dry_run:
+        for i in range(0, len(upserts), UPSERT_BATCH_SIZE):
+            supabase.table("product_effective_prices").upsert(
+                upserts[i : i + UPSERT_BATCH_SIZE],
+                on_conflict="product_variant_id,min_quantity",
+            ).execute()
+        for variant_id, quantities in deletes.items():
+            supabase.table("product_effective_prices").delete().eq(
+                "product_variant_id", variant_id
+            ).in_("min_quantity", quantities).execute()
+
+    return {
+        "variants": len(variant_ids),
+        "unchanged": unchanged,
+        "upserted": len(upserts),
+        "deleted": sum(len(q) for q in deletes.values()),
+        "promoted": sum(1 for r in upserts if r["promotion_id"] is not None),
+    }
+
+
+def main(full: bool = False, dry_run: bool = False, on_date: date | None = None):
+    from catalog_client import get_client
+
+    supabase = get_client()
+    on_date = on_date or date.today()
+    state = load_state(full)
+    if state["price_date"] and state["price_date"] != on_date.isoformat():
+        print(f"Price date: {state['price_date']} -> {on_date}")
+
+    fingerprints, promotions_by_variant = load_promotions(supabase, on_date)
+
+    since = state["watermark"] or "1970-01-01"
+    changed_variants, newest_variant = changed_since(
+        supabase, "product_variants", "id", since
+    )
+    changed_tiers, newest_tier = changed_since(
+        supabase, "price_tiers", "product_variant_id", since
+    )
+    if state["watermark"] is None:
+        print("No watermark: recomputing every variant")
+        affected = None
+    else:
+        # Promotions starting or ending on the new date flip "active" in
+        # their fingerprint, so a date change needs no full recompute
+        promoted = changed_promotion_variants(state["promotions"], fingerprints)
+        affected = changed_variants | changed_tiers | promoted
+        print(
+            f"Changed since {state['watermark']}: {len(changed_variants)} variants, "
+            f"{len(changed_tiers)} with tiers, {len(promoted)} via promotions"
+        )
+
+    counts = refresh(supabase, affected, promotions_by_variant, on_date, dry_run=dry_run)
+
+    if not dry_run:
+        newest = [t for t in (state["watermark"], newest_variant, newest_tier) if t]
+        state["watermark"] = max(newest) if newest else None
+        state["price_date"] = on_date.isoformat()
+        state["promotions"] = fingerprints
+        save_state(state)
+
+    print(f"\n=== SUMMARY ===")
+    print(f"Price date: {on_date}")
+    print(f"Active unit-price promotions: {sum(1 for f in fingerprints.values() if f['active'])}")
+    print(f"Variants recomputed: {counts['variants']} ({counts['unchanged']} unchanged)")
+    print(f"{'Would upsert' if dry_run else 'Upserted'} rows: {counts['upserted']} ({counts['promoted']} promoted)")
+    print(f"{'Would delete' if dry_run else 'Deleted'} stale bands: {counts['deleted']}")
+    return counts
+
+
+if __name__ == "__main__":
+    import sys
+
+    on_date = None
+    if "--date" in sys.argv:
+        on_date = date.fromisoformat(sys.argv[sys.argv.index("--date") + 1])
+    main(full="--full" in sys.argv, dry_run="--dry-run" in sys.argv, on_date=on_date)
@@ -12,14 +12,15 @@ Usage:
     python enrich_products.py
 """
 
+import hashlib
+import html
 import json
 import os
+import random
 import re
 import time
 from datetime import datetime
 
-import requests
-
 # =============================================================================
 # CONFIGURATION
 # =============================================================================
@@ -57,6 +58,41 @@ FORMAT_MAP = {
     (100, 297): "1/3 A4",
 }
 
+# Near-duplicate detection (MinHash/LSH over name + description + notes)
+DEDUP_ENABLED = True
+DEDUP_THRESHOLD = 0.8  # Minimum estimated Jaccard similarity to share AI copy
+DEDUP_SHINGLE_SIZE = 5  # Characters per shingle
+DEDUP_NUM_PERM = 64  # MinHash signature length
+DEDUP_BANDS = 16  # LSH bands (DEDUP_NUM_PERM / DEDUP_BANDS rows per band)
+
+# Prompt compaction and token budgeting
+CHARS_PER_TOKEN = 3.5  # Rough estimate for Portuguese text
+PROMPT_FIELD_TOKEN_BUDGET = {
+    "name": 40,
+    "description": 350,
+    "notes": 350,
+}
+# Expected length (characters) of each generated field for a bare product,
+# used for max_tokens; richer products get more (see output_token_budget)
+EXPECTED_OUTPUT_CHARS = {
+    "resumo": 200,
+    "descricao_completa": 1500,
+    "vantagens": 800,
+}
+OUTPUT_CHARS_PER_VARIATION = 60  # Sizes/finishes the description goes through
+OUTPUT_CHARS_PER_SOURCE_CHAR = 0.5  # Extra copy per character of prompt text
+OUTPUT_TOKEN_MARGIN = 1.5  # Headroom over the expected output size
+MIN_OUTPUT_TOKENS = 400
+MAX_OUTPUT_TOKENS = 2000
+
+# Sentences that add nothing to the copy and are repeated across products
+BOILERPLATE_PATTERNS = [
+    r"os pre[çc]os est[ãa]o apresentados para configura[çc][õo]es standard.*",
+    r"desconto para compra em quantidade\.?",
+    r"(?:clique|carregue) aqui.*",
+    r"para mais informa[çc][õo]es,? contacte-nos.*",
+]
+
 # Global model index for round-robin
 current_model_index = 0
 
@@ -185,15 +221,251 @@ def extract_specifications(notes: str) -> dict:
     return specs
 
 
+# =============================================================================
+# PROMPT BUILDER
+# =============================================================================
+
+_BOILERPLATE_RE = re.compile(
+    "|".join(f"(?:{p})" for p in BOILERPLATE_PATTERNS), re.IGNORECASE
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for a text (no tokenizer dependency)."""
+    if not text:
+        return 0
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def normalize_text(text: str) -> str:
+    """Strip HTML remnants, decorative symbols and repeated whitespace."""
+    if not text:
+        return ""
+    text = html.unescape(text)
+    text = re.sub(r"<br\s*/?>|</p>|</li>", "\n", text, flags=re.IGNORECASE)
+    text = re.sub(r"<[^>]+>", " ", text)
+    text = re.sub(r"[\u2022\u25a0-\u27bf\U0001f300-\U0001faff\ufe0f]", " ", text)
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = re.sub(r"[ \t\xa0]+", " ", text)
+    text = re.sub(r" *\n[\n ]*", "\n", text)
+    return text.strip()
+
+
+def split_sentences(text: str) -> list:
+    """Split normalized text into sentences / lines."""
+    return [s.strip() for s in re.split(r"(?<=[.!?])\s+|\n+", text) if s.strip()]
+
+
+def compact_field(text: str, token_budget: int, seen: set) -> str:
+    """Normalize, dedupe and truncate a prompt field to its token budget.
+
+    ``seen`` holds normalized sentences already used by earlier fields, so
+    notes that repeat the description are not sent twice.
+    """
+    kept = []
+    used = 0
+    for sentence in split_sentences(normalize_text(text)):
+        if _BOILERPLATE_RE.fullmatch(sentence):
+            continue
+        key = re.sub(r"\W+", " ", sentence.lower()).strip()
+        if not key or key in seen:
+            continue
+        seen.add(key)
+
+        cost = estimate_tokens(sentence)
+        if used + cost > token_budget:
+            remaining_chars = int((token_budget - used) * CHARS_PER_TOKEN)
+            if remaining_chars > 40:
+                kept.append(sentence[:remaining_chars].rsplit(" ", 1)[0] + "…")
+            break
+        kept.append(sentence)
+        used += cost
+    return " ".join(kept)
+
+
+def output_token_budget(product: dict) -> int:
+    """max_tokens derived from the expected size of one product's JSON response.
+
+    Grows with the number of variations and with the description and notes
+    as they appear in the (compacted) prompt.
+    """
+    expected_chars = sum(EXPECTED_OUTPUT_CHARS.values())
+    expected_chars += OUTPUT_CHARS_PER_VARIATION * len(product.get("variations") or [])
+    source_chars = sum(
+        min(
+            len(product.get(field) or ""),
+            int(PROMPT_FIELD_TOKEN_BUDGET[key] * CHARS_PER_TOKEN),
+        )
+        for field, key in (("description", "description"), ("_notes", "notes"))
+    )
+    expected_chars += int(OUTPUT_CHARS_PER_SOURCE_CHAR * source_chars)
+    # JSON keys, quotes and braces
+    expected_chars += sum(len(k) + 8 for k in EXPECTED_OUTPUT_CHARS) + 10
+    budget = int(expected_chars / CHARS_PER_TOKEN * OUTPUT_TOKEN_MARGIN)
+    return min(max(budget, MIN_OUTPUT_TOKENS), MAX_OUTPUT_TOKENS)
+
+
+def build_prompt(product: dict, category: str) -> str:
+    """Build a compact enrichment prompt for one product."""
+    seen = set()
+    name = compact_field(
+        product.get("name", ""), PROMPT_FIELD_TOKEN_BUDGET["name"], set()
+    )
+    description = compact_field(
+        product.get("description", ""), PROMPT_FIELD_TOKEN_BUDGET["description"], seen
+    )
+    notes = compact_field(
+        product.get("_notes", ""), PROMPT_FIELD_TOKEN_BUDGET["notes"], seen
+    )
+    return PROMPT_TEMPLATE.format(
+        name=name,
+        category=category,
+        description=description or "-",
+        notes=notes or "-",
+    )
+
+
+# =============================================================================
+# NEAR-DUPLICATE DETECTION
+# =============================================================================
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(42)  # Fixed seed so clusters are stable between runs
+_MINHASH_PARAMS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(DEDUP_NUM_PERM)
+]
+
+
+def dedup_text(product: dict) -> str:
+    """Text used to compare products: name + description + notes."""
+    parts = [
+        product.get("name", ""),
+        product.get("description", ""),
+        product.get("_notes", ""),
+    ]
+    text = " ".join(p for p in parts if p).lower()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def shingles(text: str, k: int = DEDUP_SHINGLE_SIZE) -> set:
+    """Hashed character k-shingles of a text."""
+    if len(text) <= k:
+        text = text.ljust(k)
+    return {
+        int.from_bytes(
+            hashlib.blake2b(text[i : i + k].encode("utf-8"), digest_size=8).digest(),
+            "little",
+        )
+        for i in range(len(text) - k + 1)
+    }
+
+
+def minhash_signature(shingle_set: set) -> tuple:
+    """MinHash signature with DEDUP_NUM_PERM universal hash permutations."""
+    return tuple(
+        min((a * x + b) % _MERSENNE_PRIME for x in shingle_set)
+        for a, b in _MINHASH_PARAMS
+    )
+
+
+def estimate_similarity(sig_a: tuple, sig_b: tuple) -> float:
+    """Estimated Jaccard similarity from two MinHash signatures."""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+def cluster_near_duplicates(
+    products: list, threshold: float = DEDUP_THRESHOLD
+) -> dict:
+    """Group near-duplicate products with LSH banding over MinHash signatures.
+
+    Returns a mapping of product id -> representative product id. Products
+    are taken in input order: each one joins the representative it is most
+    similar to, among the earlier representatives it directly reaches
+    threshold with, or becomes a representative itself. Similarity is never
+    chained (A~B and B~C does not put C with A), and the representative is
+    always enriched before its siblings. Products with no text to compare
+    stay on their own.
+    """
+    rows = DEDUP_NUM_PERM // DEDUP_BANDS
+    order = {p["id"]: i for i, p in enumerate(products)}
+    texts = {p["id"]: dedup_text(p) for p in products}
+    signatures = {
+        pid: minhash_signature(shingles(text)) for pid, text in texts.items() if text
+    }
+
+    # Candidate pairs share at least one identical band
+    buckets = {}
+    for pid, sig in signatures.items():
+        for band in range(DEDUP_BANDS):
+            key = (band, sig[band * rows : (band + 1) * rows])
+            buckets.setdefault(key, []).append(pid)
+    candidates = {}
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        for pid in members:
+            candidates.setdefault(pid, set()).update(members)
+
+    representative_of = {}
+    for product in products:
+        pid = product["id"]
+        best, best_similarity = pid, threshold
+        for other in sorted(candidates.get(pid, ()), key=order.get):
+            if other == pid or representative_of.get(other) != other:
+                continue
+            similarity = estimate_similarity(signatures[pid], signatures[other])
+            if similarity >= threshold and (best == pid or similarity > best_similarity):
+                best, best_similarity = other, similarity
+        representative_of[pid] = best
+    return representative_of
+
+
+def adapt_copy(ai_content: dict, source_name: str, target_name: str) -> dict:
+    """Adapt a representative's AI copy to a sibling with templated edits.
+
+    Replaces the full product name, plus every word that differs between the
+    two names at the same position (e.g. "A4" -> "A5", "Branco" -> "Preto").
+    All substitutions happen in a single pass so swaps never chain.
+    """
+    swaps = {source_name.lower(): target_name}
+    source_words = source_name.split()
+    target_words = target_name.split()
+    if len(source_words) == len(target_words):
+        for s, t in zip(source_words, target_words):
+            if s.lower() != t.lower():
+                swaps.setdefault(s.lower(), t)
+
+    alternation = "|".join(
+        re.escape(old) for old in sorted(swaps, key=len, reverse=True)
+    )
+    pattern = re.compile(rf"(?<!\w)(?:{alternation})(?!\w)", re.IGNORECASE)
+
+    adapted = {}
+    for field, text in ai_content.items():
+        if isinstance(text, str):
+            text = pattern.sub(lambda m: swaps[m.group(0).lower()], text)
+        adapted[field] = text
+    return adapted
+
+
 # =============================================================================
 # OPENROUTER API FUNCTIONS
 # =============================================================================
 
 
-def call_openrouter(prompt: str, max_retries: int = 3) -> dict | None:
-    """Call OpenRouter API with model rotation and retry logic."""
+def call_openrouter(
+    prompt: str, max_tokens: int = 2000, max_retries: int = 3
+) -> tuple[dict | None, dict]:
+    """Call OpenRouter API with model rotation and retry logic.
+
+    Returns the parsed JSON content (or None) and the token usage reported
+    by the API, summed over all attempts.
+    """
     global current_model_index
 
+    import requests  # Imported lazily so spec extraction runs without it
+
     model = MODELS[current_model_index]
     current_model_index = (current_model_index + 1) % len(MODELS)
 
@@ -208,8 +480,9 @@ def call_openrouter(prompt: str, max_retries: int = 3) -> dict | None:
         "model": model,
         "messages": [{"role": "user", "content": prompt}],
         "temperature": 0.7,
-        "max_tokens": 2000,
+        "max_tokens": max_tokens,
     }
+    usage = {"prompt_tokens": 0, "completion_tokens": 0}
 
     for attempt in range(max_retries):
         try:
@@ -231,6 +504,8 @@ def call_openrouter(prompt: str, max_retries: int = 3) -> dict | None:
 
             response.raise_for_status()
             result = response.json()
+            for field in usage:
+                usage[field] += (result.get("usage") or {}).get(field) or 0
 
             if "choices" not in result or len(result["choices"]) == 0:
                 print(f"    No choices in response: {result}")
@@ -292,7 +567,7 @@ def call_openrouter(prompt: str, max_retries: int = 3) -> dict | None:
             if json_match:
                 content = json_match.group(0)
 
-            return json.loads(content)
+            return json.loads(content), usage
 
         except json.JSONDecodeError as e:
             print(f"    JSON parse error on attempt {attempt + 1}: {e}")
@@ -302,23 +577,23 @@ def call_openrouter(prompt: str, max_retries: int = 3) -> dict | None:
             if attempt < max_retries - 1:
                 time.sleep(5)
                 continue
-            return None
+            return None, usage
 
         except requests.exceptions.Timeout:
             print(f"    Timeout on attempt {attempt + 1}")
             if attempt < max_retries - 1:
                 time.sleep(10)
                 continue
-            return None
+            return None, usage
 
         except Exception as e:
             print(f"    API error on attempt {attempt + 1}: {e}")
             if attempt < max_retries - 1:
                 time.sleep(10)
                 continue
-            return None
+            return None, usage
 
-    return None
+    return None, usage
 
 
 # =============================================================================
@@ -375,6 +650,44 @@ def process_products(input_file: str, output_file: str):
     processed_ids, enriched_products = load_checkpoint()
     print(f"Resuming from checkpoint: {len(processed_ids)} already processed")
 
+    # Pre-pass: group near-duplicates so each cluster needs a single AI call
+    representative_of = {}
+    if DEDUP_ENABLED:
+        representative_of = cluster_near_duplicates(products)
+    cluster_sizes = {}
+    for rep_id in representative_of.values():
+        cluster_sizes[rep_id] = cluster_sizes.get(rep_id, 0) + 1
+    multi_clusters = sorted(
+        (size for size in cluster_sizes.values() if size > 1), reverse=True
+    )
+    if multi_clusters:
+        print(
+            f"Near-duplicates: {len(multi_clusters)} clusters covering "
+            f"{sum(multi_clusters)} products"
+        )
+
+    # AI copy by product id, rebuilt from the checkpoint so resumed runs can
+    # still reuse copy from representatives processed earlier
+    ai_by_id = {
+        p["id"]: {
+            "resumo": p.get("resumo", ""),
+            "descricao_completa": p.get("descricao_completa", ""),
+            "vantagens": p.get("vantagens", ""),
+        }
+        for p in enriched_products
+        if p.get("resumo") and not p.get("_ai_source_id")
+    }
+    products_by_id = {p["id"]: p for p in products}
+    ai_calls = 0
+    skipped_calls = 0
+    max_tokens_seen = []
+    token_totals = {
+        "prompt": 0,
+        "completion": 0,
+        "estimated_prompt": 0,
+        "estimated_raw_prompt": 0,
+    }
+
     # Process each product
     total = len(products)
     for i, product in enumerate(products):
@@ -390,16 +703,44 @@ def process_products(input_file: str, output_file: str):
         notes = product.get("_notes", "")
         specs = extract_specifications(notes)
 
-        # Phase 2: AI enhancement
-        category_name = categories.get(product.get("category_id"), "Acrílicos")
-        prompt = PROMPT_TEMPLATE.format(
-            name=product.get("name", ""),
-            category=category_name,
-            description=product.get("description", ""),
-            notes=notes,
-        )
+        # Phase 2: AI enhancement (reuse the representative's copy if possible)
+        rep_id = representative_of.get(product_id, product_id)
+        ai_content = None
+        if rep_id != product_id and rep_id in ai_by_id:
+            ai_content = adapt_copy(
+                ai_by_id[rep_id],
+                products_by_id[rep_id].get("name", ""),
+                product.get("name", ""),
+            )
+            skipped_calls += 1
+            print(f"    ↺ Reusing copy from near-duplicate {rep_id}")
+        else:
+            category_name = categories.get(product.get("category_id"), "Acrílicos")
+            prompt = build_prompt(product, category_name)
+            raw_prompt_tokens = estimate_tokens(
+                PROMPT_TEMPLATE.format(
+                    name=product.get("name", ""),
+                    category=category_name,
+                    description=product.get("description", ""),
+                    notes=notes,
+                )
+            )
 
-        ai_content = call_openrouter(prompt)
+            max_tokens = output_token_budget(product)
+            max_tokens_seen.append(max_tokens)
+            ai_content, usage = call_openrouter(prompt, max_tokens=max_tokens)
+            ai_calls += 1
+            token_totals["estimated_raw_prompt"] += raw_prompt_tokens
+            token_totals["estimated_prompt"] += estimate_tokens(prompt)
+            token_totals["prompt"] += usage["prompt_tokens"]
+            token_totals["completion"] += usage["completion_tokens"]
+            print(
+                f"    Tokens: prompt {usage['prompt_tokens']} "
+                f"(~{estimate_tokens(prompt)} est., ~{raw_prompt_tokens} uncompacted), "
+                f"completion {usage['completion_tokens']}/{max_tokens}"
+            )
+            if ai_content:
+                ai_by_id[product_id] = ai_content
 
         # Build enriched product
         enriched = {
@@ -414,6 +755,8 @@ def process_products(input_file: str, output_file: str):
             "especificacoes_tecnicas": specs,
             "notas": notes,
         }
+        if rep_id != product_id and rep_id in ai_by_id:
+            enriched["_ai_source_id"] = rep_id
 
         # Log success/failure
         if ai_content:
@@ -430,7 +773,8 @@ def process_products(input_file: str, output_file: str):
             print(f"  ► Checkpoint saved: {len(processed_ids)} products")
 
         # Delay between calls to avoid rate limiting (free models need more time)
-        time.sleep(5)
+        if "_ai_source_id" not in enriched:
+            time.sleep(5)
 
     # Final save
     save_checkpoint(processed_ids, enriched_products)
@@ -442,6 +786,8 @@ def process_products(input_file: str, output_file: str):
         "stats": {
             "total_products": len(enriched_products),
             "enriched_at": datetime.now().isoformat(),
+            "prompt_tokens": token_totals["prompt"],
+            "completion_tokens": token_totals["completion"],
         },
     }
 
@@ -452,10 +798,22 @@ def process_products(input_file: str, output_file: str):
     print(f"COMPLETE!")
     print(f"{'=' * 60}")
     print(f"Total products processed: {len(enriched_products)}")
+    print(f"AI calls made: {ai_calls}")
+    print(f"AI calls skipped (near-duplicates): {skipped_calls}")
+    print(f"Prompt tokens: {token_totals['prompt']}")
+    print(f"Completion tokens: {token_totals['completion']}")
+    if token_totals["estimated_raw_prompt"]:
+        saved = 1 - token_totals["estimated_prompt"] / token_totals["estimated_raw_prompt"]
+        print(f"Prompt compaction: ~{saved:.0%} fewer input tokens (estimated)")
+    if max_tokens_seen:
+        print(f"max_tokens per call: {min(max_tokens_seen)}-{max(max_tokens_seen)}")
+    if multi_clusters:
+        print(f"Near-duplicate clusters: {len(multi_clusters)}")
+        print(f"  Largest cluster sizes: {multi_clusters[:10]}")
     print(f"Output saved to: {output_file}")
 
 
-def main():
+def main(input_file: str = INPUT_FILE, output_file: str = OUTPUT_FILE):
     """Entry point."""
 
     if not OPENROUTER_API_KEY:
@@ -471,13 +829,13 @@ def main():
     print("=" * 60)
     print("JOCRIL PRODUCT ENRICHMENT")
     print("=" * 60)
-    print(f"Input:  {INPUT_FILE}")
-    print(f"Output: {OUTPUT_FILE}")
+    print(f"Input:  {input_file}")
+    print(f"Output: {output_file}")
     print(f"Models: {len(MODELS)} in rotation")
     print("=" * 60)
     print()
 
-    process_products(INPUT_FILE, OUTPUT_FILE)
+    process_products(input_file, output_file)
 
 
 if __name__ == "__main__":
@@ -6,17 +6,12 @@ import json
 import os
 import re
 
-from dotenv import load_dotenv
-
-from supabase import create_client
-
-load_dotenv(".env.local")
-
-url = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
-key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv(
-    "NEXT_PUBLIC_SUPABASE_ANON_KEY"
-)
-supabase = create_client(url, key)
+from catalog_client import get_client
+from catalog_records import VARIANT_COLUMNS, VariantRecord
+from catalog_snapshot import load_reference_tables
+from image_manifest import get_image_manifest, save_image_manifests
+from pg_bulk import get_bulk_loader
+from unique_keys import VariantKeyIndex, key_exists
 
 VAT_RATE = 0.23
 
@@ -66,12 +61,10 @@ def parse_price(price_str):
         return 0.0
 
 
-def build_size_format_map():
+def build_size_format_map(sizes):
     """Build map from variation name to size_format_id"""
-    sizes = supabase.table("size_formats").select("id, name, code").execute()
-
     size_map = {}
-    for s in sizes.data:
+    for s in sizes:
         # Map by exact name (case insensitive)
         size_map[s["name"].lower()] = s["id"]
         if s["code"]:
@@ -121,34 +114,39 @@ def get_size_format_id(var_name, size_map):
 def find_local_image(product_name, img_dir="public/imagens_produto"):
     if not os.path.exists(img_dir):
         return None
-    slug = slugify(product_name)
-    for img in os.listdir(img_dir):
-        img_lower = img.lower()
-        if "_tecnico" in img_lower:
-            continue
-        img_base = img_lower.rsplit(".", 1)[0]
-        if img_base == slug or slug in img_base or img_base in slug:
-            return f"/imagens_produto/{img}"
-    return None
+    return get_image_manifest(img_dir).main_image_url(slugify(product_name))
 
 
-def fix_missing_variants():
+def fix_missing_variants(dry_run=False, offline=False, use_pg=False):
     with open("public/TEMP/jocril_products_enriched.json", "r", encoding="utf-8") as f:
         data = json.load(f)
 
     products = [p for p in data["products"] if p.get("_keep") == True]
 
+    if dry_run:
+        print("\n=== DRY RUN MODE - No changes will be made ===\n")
+
+    # Lookups come from the local snapshot, refreshed incrementally
+    tables = load_reference_tables(
+        ["size_formats", "product_templates", "product_variants"], offline=offline
+    )
+
     # Build size format map
-    size_map = build_size_format_map()
+    size_map = build_size_format_map(tables["size_formats"])
     print(f"Loaded {len(size_map)} size format mappings")
 
     # Get existing templates
-    templates = supabase.table("product_templates").select("id, slug, name").execute()
-    template_by_slug = {t["slug"]: t for t in templates.data}
+    template_by_slug = {t["slug"]: t for t in tables["product_templates"]}
 
-    # Get existing variants by SKU
-    db_variants = supabase.table("product_variants").select("sku").execute()
-    db_skus = set(v["sku"] for v in db_variants.data)
+    # Taken SKUs / url_slugs: conflicts are resolved before anything is sent
+    variant_keys = VariantKeyIndex.from_rows(tables["product_variants"])
+
+    # With --pg, rows are collected and bulk-loaded once at the end
+    loader = None if dry_run else get_bulk_loader(use_pg)
+    pending_rows = []
+    confirm_sku = key_exists(
+        "product_variants", "sku", None if dry_run or loader else get_client(), loader
+    )
 
     added = 0
     errors = []
@@ -168,7 +166,7 @@ def fix_missing_variants():
             sku = var.get("sku")
 
             # Skip if already exists
-            if sku in db_skus:
+            if variant_keys.skus.taken(sku, confirm_sku):
                 continue
 
             try:
@@ -185,36 +183,62 @@ def fix_missing_variants():
                 )
                 var_slug = f"{base_slug}-{sku.lower()}"
 
-                variant_data = {
-                    "product_template_id": template["id"],
-                    "size_format_id": size_format_id,
-                    "sku": sku,
-                    "url_slug": var_slug,
-                    "orientation": "vertical",
-                    "base_price_excluding_vat": price_exc_vat,
-                    "base_price_including_vat": price_inc_vat,
-                    "stock_quantity": 100,
-                    "stock_status": "in_stock",
-                    "is_active": True,
-                    "display_order": idx,
-                    "main_image_url": main_image,
-                }
-
-                supabase.table("product_variants").insert(variant_data).execute()
-                db_skus.add(sku)
+                variant = VariantRecord(
+                    product_template_id=template["id"],
+                    size_format_id=size_format_id,
+                    sku=sku,
+                    url_slug=var_slug,
+                    base_price_excluding_vat=price_exc_vat,
+                    base_price_including_vat=price_inc_vat,
+                    display_order=idx,
+                    main_image_url=main_image,
+                )
+
+                variant = variant_keys.resolve(variant, confirm_sku)
+                if variant is None:
+                    continue
+
+                if loader:
+                    pending_rows.append(variant)
+                elif not dry_run:
+                    get_client().table("product_variants").insert(
+                        variant.as_row()
+                    ).execute()
                 added += 1
                 print(
-                    f"  Added: {product['name'][:40]} -> {var_name} (size_format: {size_format_id})"
+                    f"  {'WOULD ADD' if dry_run else 'Added'}: {product['name'][:40]} -> {var_name} (size_format: {size_format_id})"
                 )
 
             except Exception as e:
                 errors.append((product["name"], var_name, str(e)))
                 print(f"  ERROR: {product['name'][:30]} / {var_name}: {str(e)[:60]}")
 
+    if loader:
+        inserted = loader.merge(
+            "product_variants",
+            (v.as_row() for v in pending_rows),
+            columns=VARIANT_COLUMNS,
+            returning=["sku"],
+        )
+        loader.commit()
+        loader.close()
+        conflicts = len(pending_rows) - len(inserted)
+        added = len(inserted)
+        print(f"Bulk-loaded {added} variants ({conflicts} skipped on conflict)")
+
+    save_image_manifests()
+
     print(f"\n=== SUMMARY ===")
     print(f"Variants added: {added}")
+    print(f"URL slugs made unique: {variant_keys.renamed}")
     print(f"Errors: {len(errors)}")
 
 
 if __name__ == "__main__":
-    fix_missing_variants()
+    import sys
+
+    fix_missing_variants(
+        dry_run="--dry-run" in sys.argv,
+        offline="--offline" in sys.argv,
+        use_pg="--pg" in sys.argv,
+    )
@@ -0,0 +1,281 @@
+"""
+Fill frequently_bought_together from order history.
+
+Streams order_items grouped by order_id (keyset pagination on order_id),
+builds a sparse order x variant incidence matrix and turns it into variant
+co-occurrence counts with one sparse product (B.T @ B). Counts are added to
+the matrix kept from previous runs, so each run only reads orders after the
+stored watermark (the last processed order_id).
+
+For every variant the TOP_K partners bought together at least
+MIN_TIMES_TOGETHER times are kept. Only pairs that are new or whose count
+changed since the last published state are upserted, and pairs that fell
+out of a variant's top K are deleted. bundle_discount_percentage, which is
+set by hand, is never touched.
+
+State lives in .cache/catalog/fbt/: state.json (watermark, published pairs
+and the name of the matrix file they go with) and cooccurrence-{watermark}.npz.
+A new matrix is written under a new name and state.json is replaced last, so
+a crash never pairs a matrix with another run's watermark; when the matrix
+is missing, the counts are rebuilt from the first order. Use --full to
+rebuild on purpose.
+
+Usage:
+    python scripts/frequently_bought_together.py [--full] [--dry-run]
+
+Requires numpy and scipy.
+"""
+
+import json
+import os
+
+STATE_DIR = os.path.join(".cache", "catalog", "fbt")
+STATE_FILE = os.path.join(STATE_DIR, "state.json")
+
+PAGE_SIZE = 1000
+TOP_K = 8
+MIN_TIMES_TOGETHER = 2
+EXCLUDED_ORDER_STATUSES = ["cancelled", "canceled", "refunded"]
+UPSERT_BATCH_SIZE = 500
+CHUNK_ORDERS = 50_000  # Orders per sparse product; bounds memory on big backfills
+
+
+def stream_orders(supabase, after_order_id: int):
+    """Yield (order_id, [variant_id, ...]) for orders after the watermark.
+
+    Pages end on an order boundary: the last (possibly partial) order of a
+    full page is fetched again at the start of the next page.
+    """
+    last_order_id = after_order_id
+    while True:
+        page = (
+            supabase.table("order_items")
+            .select("order_id, product_variant_id, orders!inner(status)")
+            .gt("order_id", last_order_id)
+            .not_.in_("orders.status", EXCLUDED_ORDER_STATUSES)
+            .order("order_id")
+            .order("id")
+            .limit(PAGE_SIZE)
+            .execute()
+            .data
+        )
+        if not page:
+            return
+
+        full_page = len(page) == PAGE_SIZE
+        if full_page and page[0]["order_id"] == page[-1]["order_id"]:
+            # One order larger than a page: read it on its own
+            order_id = page[0]["order_id"]
+            items = (
+                supabase.table("order_items")
+                .select("product_variant_id")
+                .eq("order_id", order_id)
+                .execute()
+                .data
+            )
+            yield order_id, [i["product_variant_id"] for i in items]
+            last_order_id = order_id
+            continue
+
+        if full_page:
+            boundary = page[-1]["order_id"]
+            page = [i for i in page if i["order_id"] != boundary]
+
+        current_id = None
+        variants = []
+        for item in page:
+            if item["order_id"] != current_id:
+                if current_id is not None:
+                    yield current_id, variants
+                current_id = item["order_id"]
+                variants = []
+            variants.append(item["product_variant_id"])
+        yield current_id, variants
+        last_order_id = current_id
+
+        if not full_page:
+            return
+
+
+def load_state(full: bool = False) -> tuple:
+    """(co-occurrence matrix or None, state dict)"""
+    from scipy import sparse
+
+    if full or not os.path.exists(STATE_FILE):
+        return None, {"watermark": 0, "variant_ids": [], "published": {}}
+    with open(STATE_FILE, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    matrix_file = os.path.join(STATE_DIR, state.get("matrix_file") or "")
+    if state.get("matrix_file") and os.path.exists(matrix_file):
+        return sparse.load_npz(matrix_file), state
+    # Counts lost: rebuild them, still diffing against the published pairs
+    print("Co-occurrence matrix missing, rebuilding from the first order")
+    return None, {"watermark": 0, "variant_ids": [], "published": state["published"]}
+
+
+def save_state(matrix, state: dict):
+    """Write the matrix under a new name, then point state.json at it."""
+    from scipy import sparse
+
+    os.makedirs(STATE_DIR, exist_ok=True)
+    matrix_file = f"cooccurrence-{state['watermark']}.npz"
+    # save_npz appends .npz to names without it
+    tmp_file = os.path.join(STATE_DIR, matrix_file + ".tmp.npz")
+    sparse.save_npz(tmp_file, matrix)
+    os.replace(tmp_file, os.path.join(STATE_DIR, matrix_file))
+
+    state["matrix_file"] = matrix_file
+    tmp_file = STATE_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_file, STATE_FILE)
+
+    for name in os.listdir(STATE_DIR):
+        if name.startswith("cooccurrence") and name != matrix_file:
+            os.remove(os.path.join(STATE_DIR, name))
+
+
+def cooccurrence(orders: list, index_of: dict, size: int):
+    """Variant x variant counts of orders containing both (diagonal zeroed)."""
+    import numpy as np
+    from scipy import sparse
+
+    rows = []
+    cols = []
+    for row, (_, variants) in enumerate(orders):
+        for variant_id in set(variants):
+            rows.append(row)
+            cols.append(index_of[variant_id])
+
+    incidence = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+        shape=(len(orders), size),
+    )
+    counts = (incidence.T @ incidence).tocsr()
+    counts.setdiag(0)
+    counts.eliminate_zeros()
+    return counts
+
+
+def top_pairs(matrix, variant_ids: list) -> dict:
+    """{"a:b": count} for each variant's TOP_K partners (ties: lower id)."""
+    import numpy as np
+
+    ids = np.asarray(variant_ids)
+    pairs = {}
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        if start == end:
+            continue
+        counts = matrix.data[start:end]
+        partners = ids[matrix.indices[start:end]]
+        keep = counts >= MIN_TIMES_TOGETHER
+        counts, partners = counts[keep], partners[keep]
+        if not len(counts):
+            continue
+        order = np.lexsort((partners, -counts))[:TOP_K]
+        variant_id = int(ids[row])
+        for partner, count in zip(partners[order], counts[order]):
+            pairs[f"{variant_id}:{int(partner)}"] = int(count)
+    return pairs
+
+
+def publish(supabase, previous: dict, current: dict) -> tuple:
+    """Upsert changed pairs and delete dropped ones. Returns (upserted, deleted)."""
+    changed = [
+        {
+            "product_variant_id": int(key.split(":")[0]),
+            "related_variant_id": int(key.split(":")[1]),
+            "times_bought_together": count,
+        }
+        for key, count in current.items()
+        if previous.get(key) != count
+    ]
+    for i in range(0, len(changed), UPSERT_BATCH_SIZE):
+        supabase.table("frequently_bought_together").upsert(
+            changed[i : i + UPSERT_BATCH_SIZE],
+            on_conflict="product_variant_id,related_variant_id",
+        ).execute()
+
+    dropped = {}
+    for key in previous:
+        if key not in current:
+            variant_id, partner = (int(x) for x in key.split(":"))
+            dropped.setdefault(variant_id, []).append(partner)
+    for variant_id, partners in dropped.items():
+        supabase.table("frequently_bought_together").delete().eq(
+            "product_variant_id", variant_id
+        ).in_("related_variant_id", partners).execute()
+
+    return len(changed), sum(len(p) for p in dropped.values())
+
+
+def accumulate(matrix, orders: list, variant_ids: list, index_of: dict):
+    """Add one chunk of orders to the running co-occurrence matrix."""
+    for _, variants in orders:
+        for variant_id in variants:
+            if variant_id not in index_of:
+                index_of[variant_id] = len(variant_ids)
+                variant_ids.append(variant_id)
+    size = len(variant_ids)
+
+    counts = cooccurrence(orders, index_of, size)
+    if matrix is None:
+        return counts
+    matrix = matrix.tocsr()
+    matrix.resize((size, size))
+    return (matrix + counts).tocsr()
+
+
+def main(full: bool = False, dry_run: bool = False):
+    from catalog_client import get_client
+
+    supabase = get_client()
+    matrix, state = load_state(full)
+    print(f"Watermark: order {state['watermark']}")
+
+    variant_ids = state["variant_ids"]
+    index_of = {v: i for i, v in enumerate(variant_ids)}
+    processed = 0
+    chunk = []
+    for order in stream_orders(supabase, state["watermark"]):
+        chunk.append(order)
+        if len(chunk) == CHUNK_ORDERS:
+            matrix = accumulate(matrix, chunk, variant_ids, index_of)
+            processed += len(chunk)
+            state["watermark"] = chunk[-1][0]
+            chunk = []
+            print(f"  ► {processed} orders processed")
+    if chunk:
+        matrix = accumulate(matrix, chunk, variant_ids, index_of)
+        processed += len(chunk)
+        state["watermark"] = chunk[-1][0]
+
+    if matrix is None:
+        print("No orders to process")
+        return
+
+    current = top_pairs(matrix, variant_ids)
+    previous = state["published"]
+    if dry_run:
+        upserted = sum(1 for k, c in current.items() if previous.get(k) != c)
+        deleted = sum(1 for k in previous if k not in current)
+    else:
+        upserted, deleted = publish(supabase, previous, current)
+        state["published"] = current
+        state["variant_ids"] = variant_ids
+        save_state(matrix, state)
+
+    print(f"\n=== SUMMARY ===")
+    print(f"Orders processed: {processed}")
+    print(f"Variants with co-purchases: {len({k.split(':')[0] for k in current})}")
+    print(f"Pairs kept (top {TOP_K}, >= {MIN_TIMES_TOGETHER}x): {len(current)}")
+    print(f"{'Would upsert' if dry_run else 'Upserted'} (new/changed): {upserted}")
+    print(f"{'Would delete' if dry_run else 'Deleted'} (dropped): {deleted}")
+    print(f"Watermark: order {state['watermark']}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    main(full="--full" in sys.argv, dry_run="--dry-run" in sys.argv)
@@ -8,22 +8,17 @@ Discount structure (based on order total value):
 - > €1000 → 3% discount
 
 Quantities are rounded up to nice numbers (nearest 5, 10, 20, 50, 100).
-"""
-
-import os
-
-from dotenv import load_dotenv
 
-from supabase import create_client
+With --effective-prices, product_effective_prices is refreshed afterwards
+for the variants whose tiers changed (see effective_prices.py).
 
-load_dotenv(".env.local")
-
-SUPABASE_URL = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv(
-    "NEXT_PUBLIC_SUPABASE_ANON_KEY"
-)
+retier_variants() replaces the tiers of a few variants only (used by
+stock_sync after supplier price changes).
+"""
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+from catalog_client import get_client
+from catalog_records import TierBatch
+from pg_bulk import get_bulk_loader
 
 # Discount tiers based on order VALUE
 VALUE_TIERS = [
@@ -32,6 +27,9 @@ VALUE_TIERS = [
     {"min_value": 800, "discount_pct": 1.5},
     {"min_value": 1000, "discount_pct": 3.0},
 ]
+TIER_COLUMNS = ["max_quantity", "discount_percentage", "price_per_unit", "display_text"]
+ID_BATCH_SIZE = 200
+INSERT_BATCH_SIZE = 500
 
 
 def round_to_nice(qty: int) -> int:
@@ -54,12 +52,11 @@ def round_price_to_half(price: float) -> float:
     return round(price * 2) / 2
 
 
-def generate_tiers_for_variant(variant_id: int, base_price: float) -> list:
-    """Generate value-based tiers with rounded quantities."""
-    tiers = []
-
+def iter_tiers(base_price: float):
+    """Value-based tiers with rounded quantities, as
+    (min_quantity, max_quantity, discount_percentage, price_per_unit)."""
     if base_price <= 0:
-        return tiers
+        return
 
     prev_max_qty = 0
 
@@ -85,39 +82,93 @@ def generate_tiers_for_variant(variant_id: int, base_price: float) -> list:
             if next_min_qty > min_qty:
                 max_qty = next_min_qty - 1
 
-        tiers.append(
-            {
-                "product_variant_id": variant_id,
-                "min_quantity": min_qty,
-                "max_quantity": max_qty,
-                "discount_percentage": discount_pct,
-                "price_per_unit": price_per_unit,
-                "display_text": f"{min_qty} unidades",
-            }
-        )
+        yield min_qty, max_qty, discount_pct, price_per_unit
 
         prev_max_qty = min_qty
 
-    return tiers
+
+def generate_tiers_for_variant(variant_id: int, base_price: float) -> list:
+    """Generate value-based tiers with rounded quantities."""
+    return [
+        {
+            "product_variant_id": variant_id,
+            "min_quantity": min_qty,
+            "max_quantity": max_qty,
+            "discount_percentage": discount_pct,
+            "price_per_unit": price_per_unit,
+            "display_text": f"{min_qty} unidades",
+        }
+        for min_qty, max_qty, discount_pct, price_per_unit in iter_tiers(base_price)
+    ]
+
+
+def retier_variants(prices: dict, supabase=None, loader=None) -> int:
+    """Replace the tiers of the given variants ({variant_id: base price incl. VAT}).
+
+    Writes through loader (not committed) when given, else through supabase.
+    Returns the number of tiers written.
+    """
+    tiers = TierBatch()
+    for variant_id, base_price in prices.items():
+        for tier in iter_tiers(float(base_price or 0)):
+            tiers.append(variant_id, *tier)
+    variant_ids = sorted(prices)
+
+    if loader:
+        loader.execute(
+            "DELETE FROM price_tiers WHERE product_variant_id = ANY(%s)", (variant_ids,)
+        )
+        if tiers:
+            loader.merge(
+                "price_tiers",
+                tiers.rows(),
+                columns=TierBatch.COLUMNS,
+                conflict_columns=["product_variant_id", "min_quantity"],
+                update_columns=TIER_COLUMNS,
+            )
+        return len(tiers)
+
+    for i in range(0, len(variant_ids), ID_BATCH_SIZE):
+        supabase.table("price_tiers").delete().in_(
+            "product_variant_id", variant_ids[i : i + ID_BATCH_SIZE]
+        ).execute()
+    for i in range(0, len(tiers), INSERT_BATCH_SIZE):
+        supabase.table("price_tiers").insert(
+            list(tiers.rows(i, i + INSERT_BATCH_SIZE))
+        ).execute()
+    return len(tiers)
 
 
-def main():
+def main(use_pg=False, effective_prices=False):
+    loader = get_bulk_loader(use_pg)
+    supabase = None if loader else get_client()
+
     # Get all active variants
-    result = (
-        supabase.table("product_variants")
-        .select("id, base_price_including_vat")
-        .eq("is_active", True)
-        .execute()
-    )
-    variants = result.data
+    if loader:
+        variants = loader.fetch(
+            "SELECT id, base_price_including_vat FROM product_variants "
+            "WHERE is_active = true"
+        )
+    else:
+        result = (
+            supabase.table("product_variants")
+            .select("id, base_price_including_vat")
+            .eq("is_active", True)
+            .execute()
+        )
+        variants = result.data
 
     print(f"Found {len(variants)} active variants")
 
     # Delete ALL existing price tiers
-    supabase.table("price_tiers").delete().neq("id", 0).execute()
+    if loader:
+        loader.execute("DELETE FROM price_tiers")
+    else:
+        supabase.table("price_tiers").delete().neq("id", 0).execute()
     print("Deleted existing price tiers")
 
-    all_tiers = []
+    # Columnar: row dicts are only built while writing
+    all_tiers = TierBatch()
     skipped = 0
 
     for variant in variants:
@@ -128,25 +179,42 @@ def main():
             skipped += 1
             continue
 
-        tiers = generate_tiers_for_variant(variant_id, base_price)
-        all_tiers.extend(tiers)
+        for tier in iter_tiers(base_price):
+            all_tiers.append(variant_id, *tier)
 
     print(
         f"Generated {len(all_tiers)} price tiers for {len(variants) - skipped} variants"
     )
     print(f"Skipped {skipped} variants with no price")
 
-    if all_tiers:
+    if all_tiers and loader:
+        # Single COPY + merge, committed together with the delete above
+        loader.merge(
+            "price_tiers",
+            all_tiers.rows(),
+            columns=TierBatch.COLUMNS,
+            conflict_columns=["product_variant_id", "min_quantity"],
+            update_columns=TIER_COLUMNS,
+        )
+        print(f"Copied {len(all_tiers)} tiers")
+    elif all_tiers:
         # Insert in batches
         batch_size = 100
         for i in range(0, len(all_tiers), batch_size):
-            batch = all_tiers[i : i + batch_size]
+            batch = list(all_tiers.rows(i, i + batch_size))
             supabase.table("price_tiers").insert(batch).execute()
             print(f"Inserted batch {i // batch_size + 1} ({len(batch)} tiers)")
 
     # Verify
-    count = supabase.table("price_tiers").select("id", count="exact").execute()
-    print(f"\nTotal price tiers in database: {count.count}")
+    if loader:
+        loader.commit()
+        total = loader.fetch("SELECT count(*) AS count FROM price_tiers")[0]["count"]
+        loader.close()
+    else:
+        total = (
+            supabase.table("price_tiers").select("id", count="exact").execute().count
+        )
+    print(f"\nTotal price tiers in database: {total}")
 
     # Show example for a €2.50 product
     print("\nExample for €2.50 product:")
@@ -158,6 +226,14 @@ def main():
             f"  >{tier['min_value']}€ → {nice_qty} unidades → {price}€/un (-{tier['discount_pct']}%)"
         )
 
+    if effective_prices:
+        import effective_prices as prices
+
+        print("\nRefreshing effective prices...")
+        prices.main()
+
 
 if __name__ == "__main__":
-    main()
+    import sys
+
+    main(use_pg="--pg" in sys.argv, effective_prices="--effective-prices" in sys.argv)
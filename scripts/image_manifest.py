@@ -0,0 +1,196 @@
+"""
+Image manifest for incremental product image matching.
+
+Records path, size, mtime and content hash of every file in
+public/imagens_produto, plus the main/technical image matched for each
+product slug. Later runs reuse the stored matches and only re-match:
+- slugs never seen before (new or renamed products)
+- slugs for which an added file is a candidate match
+- slugs whose matched file was removed
+
+so import time no longer grows with the size of the image library.
+
+Usage:
+    python scripts/image_manifest.py            # refresh and report
+    python scripts/image_manifest.py --rebuild  # discard stored matches
+"""
+
+import hashlib
+import json
+import os
+
+IMG_DIR = "public/imagens_produto"
+IMG_URL_PREFIX = "/imagens_produto/"
+MANIFEST_FILE = os.path.join(".cache", "catalog", "image_manifest.json")
+TECHNICAL_MARKER = "_tecnico"
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_main_candidate(slug: str, filename: str) -> bool:
+    """Same rule as find_local_image: name contains / is contained in slug."""
+    img_lower = filename.lower()
+    if TECHNICAL_MARKER in img_lower:
+        return False
+    img_base = img_lower.rsplit(".", 1)[0]
+    return img_base == slug or slug in img_base or img_base in slug
+
+
+def is_technical_candidate(slug: str, filename: str) -> bool:
+    """Same rule as find_technical_image."""
+    img_lower = filename.lower()
+    if TECHNICAL_MARKER not in img_lower:
+        return False
+    img_base = img_lower.replace(TECHNICAL_MARKER, "").rsplit(".", 1)[0]
+    return slug in img_base or img_base in slug
+
+
+def match_images(slug: str, filenames: list) -> dict:
+    """First main and technical candidate for a slug, in filename order."""
+    main = next((f for f in filenames if is_main_candidate(slug, f)), None)
+    technical = next((f for f in filenames if is_technical_candidate(slug, f)), None)
+    return {"main": main, "technical": technical}
+
+
+class ImageManifest:
+    """File inventory and per-slug matches for an image directory."""
+
+    def __init__(self, img_dir: str = IMG_DIR, manifest_file: str = MANIFEST_FILE):
+        self.img_dir = img_dir
+        self.manifest_file = manifest_file
+        self.files = {}
+        self.matches = {}
+        self.stats = {"added": 0, "removed": 0, "changed": 0, "rematched": 0}
+        self._dirty = False
+        self._filenames = []
+
+        if os.path.exists(manifest_file):
+            with open(manifest_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("img_dir") == img_dir:
+                self.files = data.get("files", {})
+                self.matches = data.get("matches", {})
+
+    def refresh(self):
+        """Rescan the directory and invalidate matches affected by changes."""
+        current = {}
+        if os.path.exists(self.img_dir):
+            with os.scandir(self.img_dir) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                    old = self.files.get(entry.name)
+                    if old and old["size"] == st.st_size and old["mtime"] == st.st_mtime:
+                        current[entry.name] = old
+                        continue
+                    current[entry.name] = {
+                        "size": st.st_size,
+                        "mtime": st.st_mtime,
+                        "hash": file_hash(entry.path),
+                    }
+                    if old:
+                        self.stats["changed"] += 1
+
+        added = [name for name in current if name not in self.files]
+        removed = [name for name in self.files if name not in current]
+        self.stats["added"] += len(added)
+        self.stats["removed"] += len(removed)
+
+        removed_set = set(removed)
+        for slug, match in list(self.matches.items()):
+            if match["main"] in removed_set or match["technical"] in removed_set:
+                del self.matches[slug]
+            elif any(
+                is_main_candidate(slug, f) or is_technical_candidate(slug, f)
+                for f in added
+            ):
+                del self.matches[slug]
+
+        if added or removed or current != self.files:
+            self._dirty = True
+        self.files = current
+        self._filenames = sorted(current)
+
+    def lookup(self, product_slug: str) -> dict:
+        """Matched {"main", "technical"} filenames for a slug."""
+        match = self.matches.get(product_slug)
+        if match is None:
+            match = match_images(product_slug, self._filenames)
+            self.matches[product_slug] = match
+            self.stats["rematched"] += 1
+            self._dirty = True
+        return match
+
+    def main_image_url(self, product_slug: str) -> str | None:
+        filename = self.lookup(product_slug)["main"]
+        return f"{IMG_URL_PREFIX}{filename}" if filename else None
+
+    def technical_image_url(self, product_slug: str) -> str | None:
+        filename = self.lookup(product_slug)["technical"]
+        return f"{IMG_URL_PREFIX}{filename}" if filename else None
+
+    def save(self):
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.manifest_file) or ".", exist_ok=True)
+        tmp_file = self.manifest_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(
+                {"img_dir": self.img_dir, "files": self.files, "matches": self.matches},
+                f,
+                ensure_ascii=False,
+                indent=1,
+                sort_keys=True,
+            )
+        os.replace(tmp_file, self.manifest_file)
+        self._dirty = False
+
+
+_manifests = {}
+
+
+def get_image_manifest(img_dir: str = IMG_DIR) -> ImageManifest:
+    """Process-wide manifest for an image directory, refreshed on first use."""
+    manifest = _manifests.get(img_dir)
+    if manifest is None:
+        manifest = ImageManifest(img_dir)
+        manifest.refresh()
+        _manifests[img_dir] = manifest
+    return manifest
+
+
+def save_image_manifests():
+    """Persist every manifest used in this process."""
+    for manifest in _manifests.values():
+        manifest.save()
+
+
+def main(rebuild: bool = False):
+    manifest = ImageManifest()
+    if rebuild:
+        manifest.matches = {}
+    manifest.refresh()
+    manifest._dirty = True
+    manifest.save()
+
+    print(f"\n=== SUMMARY ===")
+    print(f"Images: {len(manifest.files)}")
+    print(f"Added: {manifest.stats['added']}")
+    print(f"Removed: {manifest.stats['removed']}")
+    print(f"Changed content: {manifest.stats['changed']}")
+    print(f"Cached product matches: {len(manifest.matches)}")
+    print(f"Manifest: {manifest.manifest_file}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    main(rebuild="--rebuild" in sys.argv)
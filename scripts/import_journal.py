@@ -0,0 +1,104 @@
+"""
+Write-ahead journal for import_products.
+
+Each product goes through the stages below, and every stage is appended
+(and fsync'ed) to a JSONL file before the import moves on:
+
+    started   -> about to insert the template
+    template  -> template inserted (template_id recorded)
+    images    -> template images inserted
+    variants  -> variants inserted, product finished
+
+After a crash, a rerun skips finished products without querying the
+database and resumes half-done ones from their last recorded stage. A
+"started" record begins a fresh attempt (any earlier template id of the
+slug is forgotten). import_products truncates the journal after a run
+without errors, so finished entries only outlive the run that needs them.
+"""
+
+import json
+import os
+import threading
+
+JOURNAL_FILE = os.path.join(".cache", "catalog", "import_journal.jsonl")
+STAGES = ("started", "template", "images", "variants")
+
+
+class ImportJournal:
+    """Append-only per-slug stage log."""
+
+    def __init__(self, path: str = JOURNAL_FILE, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self.entries = {}
+        self._file = None
+        # Sources are imported in parallel threads sharing one journal
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn last write from a crash
+                        continue
+                    entry = self.entries.setdefault(record["slug"], {})
+                    if record["stage"] == STAGES[0]:
+                        entry.clear()
+                    entry["stage"] = record["stage"]
+                    if record.get("template_id") is not None:
+                        entry["template_id"] = record["template_id"]
+
+    def get(self, slug: str) -> dict | None:
+        return self.entries.get(slug)
+
+    def is_done(self, slug: str) -> bool:
+        entry = self.entries.get(slug)
+        return bool(entry) and entry["stage"] == STAGES[-1]
+
+    def reached(self, slug: str, stage: str) -> bool:
+        """True if the slug has already completed the given stage."""
+        entry = self.entries.get(slug)
+        return bool(entry) and STAGES.index(entry["stage"]) >= STAGES.index(stage)
+
+    def record(self, slug: str, stage: str, template_id: int | None = None):
+        with self._lock:
+            entry = self.entries.setdefault(slug, {})
+            if stage == STAGES[0]:
+                entry.clear()
+            entry["stage"] = stage
+            if template_id is not None:
+                entry["template_id"] = template_id
+            if self.read_only:
+                return
+
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(
+                json.dumps({"slug": slug, "stage": stage, "template_id": template_id})
+                + "\n"
+            )
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def discard(self, slug: str):
+        """Forget a slug's progress (its product is imported from scratch)."""
+        with self._lock:
+            self.entries.pop(slug, None)
+
+    def pending(self) -> list:
+        """Slugs started but not finished."""
+        return [s for s, e in self.entries.items() if e["stage"] != STAGES[-1]]
+
+    def reset(self):
+        self.close()
+        self.entries = {}
+        if not self.read_only and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -1,24 +1,30 @@
 """
 Product Import Script for Jocril
-Imports products from jocril_products_enriched.json where _keep=true
+Imports products from jocril_products_enriched.json where _keep=true, and
+from any other supplier export configured in source_adapters.SOURCES:
+
+    python scripts/import_products.py --source jocril,estudioplast
+
+Progress is journaled in .cache/catalog/import_journal.jsonl, so an
+interrupted --execute run can simply be restarted; use --fresh to ignore
+the journal.
 """
 
-import json
 import os
 import re
-
-from dotenv import load_dotenv
-
-from supabase import create_client
-
-# Load environment
-load_dotenv(".env.local")
-
-url = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
-key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv(
-    "NEXT_PUBLIC_SUPABASE_ANON_KEY"
-)
-supabase = create_client(url, key)
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from catalog_client import get_client
+from catalog_records import IMAGE_COLUMNS, VARIANT_COLUMNS, ImageRecord, VariantRecord
+from catalog_snapshot import load_reference_tables
+from image_manifest import get_image_manifest, save_image_manifests
+from import_journal import ImportJournal
+from pg_bulk import get_bulk_loader
+from source_adapters import DEFAULT_SOURCES, get_source
+from technical_specs import merge_specs, sync_specs
+from unique_keys import KeyIndex, VariantKeyIndex, key_exists
 
 # Category mapping from JSON category names to DB category IDs
 CATEGORY_MAP = {
@@ -122,212 +128,445 @@ def find_local_image(product_name, img_dir="public/imagens_produto"):
     """Find matching local image for product"""
     if not os.path.exists(img_dir):
         return None
+    return get_image_manifest(img_dir).main_image_url(slugify(product_name))
 
-    slug = slugify(product_name)
-    local_images = os.listdir(img_dir)
 
-    for img in local_images:
-        img_lower = img.lower()
-        img_base = img_lower.rsplit(".", 1)[0]
+def find_technical_image(product_name, img_dir="public/imagens_produto"):
+    """Find matching technical image for product"""
+    if not os.path.exists(img_dir):
+        return None
+    return get_image_manifest(img_dir).technical_image_url(slugify(product_name))
 
-        # Skip technical images for main image
-        if "_tecnico" in img_lower:
-            continue
 
-        if img_base == slug or slug in img_base or img_base in slug:
-            return f"/imagens_produto/{img}"
+def write_product(supabase, journal, slug, template_data, image_rows, variant_rows):
+    """Insert one product stage by stage, resuming from the journal.
 
-    return None
+    Returns the template id.
+    """
+    entry = journal.get(slug) or {}
+    template_id = entry.get("template_id")
 
+    # Stage 1: template
+    if template_id is None:
+        if entry.get("stage") == "started":
+            # Crashed around the insert: the template may or may not exist
+            existing = (
+                supabase.table("product_templates")
+                .select("id")
+                .eq("slug", slug)
+                .execute()
+                .data
+            )
+            if existing:
+                template_id = existing[0]["id"]
+        if template_id is None:
+            journal.record(slug, "started")
+            result = supabase.table("product_templates").insert(template_data).execute()
+            template_id = result.data[0]["id"]
+        journal.record(slug, "template", template_id)
+
+    # Stage 2: main / technical images
+    if not journal.reached(slug, "images"):
+        done_types = set()
+        if entry:
+            done_types = {
+                r["image_type"]
+                for r in supabase.table("product_template_images")
+                .select("image_type")
+                .eq("product_template_id", template_id)
+                .execute()
+                .data
+            }
+        for image in image_rows:
+            if image.image_type in done_types:
+                continue
+            supabase.table("product_template_images").insert(
+                image.as_row(template_id)
+            ).execute()
+        journal.record(slug, "images", template_id)
+
+    # Stage 3: variants (idempotent on sku when resuming)
+    for variant in variant_rows:
+        row = variant.as_row(template_id)
+        if entry:
+            supabase.table("product_variants").upsert(
+                row, on_conflict="sku", ignore_duplicates=True
+            ).execute()
+        else:
+            supabase.table("product_variants").insert(row).execute()
+    # Typed spec rows (idempotent: only differing rows are written)
+    sync_specs(supabase, {template_id: template_data.get("specifications_json")})
+    journal.record(slug, "variants", template_id)
+
+    return template_id
+
+
+def build_product_rows(product):
+    """Template, image and variant rows for one source product.
+
+    Returns (slug, template_data, image_rows, variant_rows), images and
+    variants as compact records; their product_template_id is set when
+    they are written.
+    """
+    name = product["name"]
+    slug = slugify(name)
+
+    # Get category
+    json_cat_id = product.get("_newCategory") or product.get("category_id") or "3"
+    db_category_id = CATEGORY_MAP.get(str(json_cat_id), 2)
+
+    # Extract reference code from manufacturer field
+    manufacturer = product.get("manufacturer") or ""
+    ref_code = None
+    if "Referência:" in manufacturer:
+        ref_code = manufacturer.split("Referência:")[-1].strip().split("\n")[0].strip()
+
+    # Find images
+    main_image = find_local_image(name)
+    technical_image = find_technical_image(name)
+
+    # Build template data
+    template_data = {
+        "name": name,
+        "slug": slug,
+        "reference_code": ref_code,
+        "sku_prefix": ref_code[:10] if ref_code else slug[:10].upper(),
+        "category_id": db_category_id,
+        "material_id": DEFAULT_MATERIAL_ID,
+        "short_description": product.get("resumo"),
+        "full_description": product.get("descricao_completa"),
+        "advantages": product.get("vantagens"),
+        "specifications_text": product.get("notas"),
+        "is_active": True,
+        "is_featured": False,
+        "orientation": "vertical",
+        "min_order_quantity": 1,
+    }
 
-def find_technical_image(product_name, img_dir="public/imagens_produto"):
-    """Find matching technical image for product"""
-    if not os.path.exists(img_dir):
-        return None
+    # Handle specifications_json
+    specs = product.get("especificacoes_tecnicas")
+    if specs:
+        template_data["specifications_json"] = specs
 
-    slug = slugify(product_name)
-    local_images = os.listdir(img_dir)
+    image_rows = []
+    if main_image:
+        image_rows.append(ImageRecord(main_image, "main", 0))
+    if technical_image:
+        image_rows.append(ImageRecord(technical_image, "technical", 1))
 
-    for img in local_images:
-        img_lower = img.lower()
-        if "_tecnico" in img_lower:
-            img_base = img_lower.replace("_tecnico", "").rsplit(".", 1)[0]
-            if slug in img_base or img_base in slug:
-                return f"/imagens_produto/{img}"
+    variant_rows = []
+    for idx, var in enumerate(product.get("variations", [])):
+        if not var.get("_keep", True):
+            continue
 
-    return None
+        var_name = var.get("name", "Standard")
+        price_inc_vat = parse_price(var.get("price"))
+        price_exc_vat = round(price_inc_vat / (1 + VAT_RATE), 2)
 
+        size_format_id = get_size_format_id(var_name) or DEFAULT_SIZE_FORMAT_ID
 
-def import_products(dry_run=True):
-    """Import products from JSON to database"""
+        var_slug = f"{slug}-{slugify(var_name)}" if var_name != "Standard" else slug
 
-    # Load JSON data
-    with open("public/TEMP/jocril_products_enriched.json", "r", encoding="utf-8") as f:
-        data = json.load(f)
+        variant_rows.append(
+            VariantRecord(
+                size_format_id=size_format_id,
+                sku=var.get("sku") or f"{ref_code}-{idx}",
+                url_slug=var_slug,
+                base_price_excluding_vat=price_exc_vat,
+                base_price_including_vat=price_inc_vat,
+                display_order=idx,
+                main_image_url=main_image,
+                technical_image_url=technical_image,
+            )
+        )
 
-    # Filter to _keep=true only
-    products = [p for p in data["products"] if p.get("_keep") == True]
-    print(f"Importing {len(products)} products (_keep=true)")
+    return slug, template_data, image_rows, variant_rows
 
-    if dry_run:
-        print("\n=== DRY RUN MODE - No changes will be made ===\n")
 
-    imported = 0
-    skipped = 0
-    errors = []
+def bulk_load(loader, journal, pending, resuming=()):
+    """Merge collected products with one COPY per table. Returns (loaded, skipped).
+
+    Products in resuming whose template already exists were left half-done
+    by an earlier run: their remaining images and variants are merged into
+    it. Other existing slugs were created meanwhile and are skipped.
+    """
+    existing = {
+        r["slug"]: r["id"]
+        for r in loader.fetch(
+            "SELECT id, slug FROM product_templates WHERE slug = ANY(%s)",
+            ([t["slug"] for t, _, _ in pending],),
+        )
+    }
+    resumed = {slug: i for slug, i in existing.items() if slug in resuming}
+
+    templates = loader.merge(
+        "product_templates",
+        [t for t, _, _ in pending if t["slug"] not in existing],
+        returning=["id", "slug"],
+    )
+    id_by_slug = {t["slug"]: t["id"] for t in templates}
+    id_by_slug.update(resumed)
+    loaded = [
+        (id_by_slug[t["slug"]], images, variants)
+        for t, images, variants in pending
+        if t["slug"] in id_by_slug
+    ]
+    # Images a resumed product already has (variants conflict on sku/url_slug)
+    done_images = set()
+    if resumed:
+        done_images = {
+            (r["product_template_id"], r["image_type"])
+            for r in loader.fetch(
+                "SELECT product_template_id, image_type FROM product_template_images "
+                "WHERE product_template_id = ANY(%s)",
+                (list(resumed.values()),),
+            )
+        }
+    # Row dicts are built while streaming into COPY
+    image_count = loader.merge(
+        "product_template_images",
+        (
+            i.as_row(template_id)
+            for template_id, images, _ in loaded
+            for i in images
+            if (template_id, i.image_type) not in done_images
+        ),
+        columns=IMAGE_COLUMNS,
+    )
+    variant_count = loader.merge(
+        "product_variants",
+        (
+            v.as_row(template_id)
+            for template_id, _, variants in loaded
+            for v in variants
+        ),
+        columns=VARIANT_COLUMNS,
+    )
+    spec_count = merge_specs(
+        loader,
+        {
+            id_by_slug[t["slug"]]: t.get("specifications_json")
+            for t, _, _ in pending
+            if t["slug"] in id_by_slug
+        },
+    )
+    loader.commit()
+    for slug in id_by_slug:
+        journal.record(slug, "variants", id_by_slug[slug])
+    print(
+        f"Bulk-loaded {len(templates)} templates ({len(resumed)} more resumed), "
+        f"{image_count} images, {variant_count} variants, {spec_count} specs"
+    )
+    return len(loaded), len(existing) - len(resumed)
+
+
+def import_source(
+    source,
+    supabase,
+    journal,
+    resuming,
+    claims,
+    claims_lock,
+    template_slugs,
+    variant_keys,
+    dry_run,
+    use_pg,
+    tag="",
+):
+    """Import every product a source yields. Returns per-source stats."""
+    stats = {
+        "source": source.name,
+        "read": 0,
+        "imported": 0,
+        "skipped": 0,
+        "already_done": 0,
+        "duplicates": 0,
+        "errors": [],
+    }
+    start = time.perf_counter()
+
+    # With --pg, rows are collected and bulk-loaded at the end instead of
+    # one request per row
+    loader = None if dry_run else get_bulk_loader(use_pg)
+    pending = []
+    confirm_slug = key_exists("product_templates", "slug", supabase, loader)
+    confirm_sku = key_exists("product_variants", "sku", supabase, loader)
 
-    for product in products:
+    for product in source.products():
+        stats["read"] += 1
         try:
             name = product["name"]
             slug = slugify(name)
 
-            # Check if already exists
-            existing = (
-                supabase.table("product_templates")
-                .select("id")
-                .eq("slug", slug)
-                .execute()
-            )
-            if existing.data:
-                print(f"  SKIP (exists): {name[:50]}")
-                skipped += 1
+            if journal.is_done(slug):
+                if slug in template_slugs:
+                    stats["already_done"] += 1
+                    continue
+                # Finished before, deleted since (filter misses are exact)
+                journal.discard(slug)
+
+            # The same product can come from several suppliers (or twice
+            # from one): the first to reach a slug imports it
+            with claims_lock:
+                owner = claims.get(slug)
+                claims.setdefault(slug, source.name)
+            if owner:
+                print(f"  {tag}SKIP (from {owner}): {name[:50]}")
+                stats["duplicates"] += 1
                 continue
 
-            # Get category
-            json_cat_id = (
-                product.get("_newCategory") or product.get("category_id") or "3"
-            )
-            db_category_id = CATEGORY_MAP.get(str(json_cat_id), 2)
-
-            # Extract reference code from manufacturer field
-            manufacturer = product.get("manufacturer", "")
-            ref_code = None
-            if "Referência:" in manufacturer:
-                ref_code = (
-                    manufacturer.split("Referência:")[-1].strip().split("\n")[0].strip()
-                )
+            # Check if already exists, against the snapshot index
+            # (Bloom filter hits are confirmed with a query)
+            exists = slug not in resuming and template_slugs.taken(slug, confirm_slug)
+            if exists:
+                print(f"  {tag}SKIP (exists): {name[:50]}")
+                stats["skipped"] += 1
+                continue
 
-            # Find images
-            main_image = find_local_image(name)
-            technical_image = find_technical_image(name)
-
-            # Build template data
-            template_data = {
-                "name": name,
-                "slug": slug,
-                "reference_code": ref_code,
-                "sku_prefix": ref_code[:10] if ref_code else slug[:10].upper(),
-                "category_id": db_category_id,
-                "material_id": DEFAULT_MATERIAL_ID,
-                "short_description": product.get("resumo"),
-                "full_description": product.get("descricao_completa"),
-                "advantages": product.get("vantagens"),
-                "specifications_text": product.get("notas"),
-                "is_active": True,
-                "is_featured": False,
-                "orientation": "vertical",
-                "min_order_quantity": 1,
-            }
+            slug, template_data, image_rows, variant_rows = build_product_rows(product)
 
-            # Handle specifications_json
-            specs = product.get("especificacoes_tecnicas")
-            if specs:
-                template_data["specifications_json"] = specs
+            # Drop variants whose SKU exists and make url_slugs unique, so no
+            # insert is sent only to fail on a constraint
+            variant_rows = [
+                r for r in (variant_keys.resolve(v, confirm_sku) for v in variant_rows) if r
+            ]
 
             if dry_run:
-                print(f"  WOULD INSERT template: {name[:50]}")
-                print(f"    Category: {db_category_id}, Image: {main_image or 'None'}")
+                main_image = next(
+                    (i.image_url for i in image_rows if i.image_type == "main"), None
+                )
+                print(f"  {tag}WOULD INSERT template: {name[:50]}")
+                print(
+                    f"    Category: {template_data['category_id']}, "
+                    f"Image: {main_image or 'None'}"
+                )
 
                 # Show variations
-                variations = product.get("variations", [])
-                for var in variations:
+                for var in product.get("variations", []):
                     if var.get("_keep", True):
                         price_inc = parse_price(var.get("price"))
                         print(
                             f"    -> Variant: {var.get('name', 'Standard')} @ {price_inc}€"
                         )
+            elif loader:
+                pending.append((template_data, image_rows, variant_rows))
             else:
-                # Insert template
-                result = (
-                    supabase.table("product_templates").insert(template_data).execute()
+                template_id = write_product(
+                    supabase, journal, slug, template_data, image_rows, variant_rows
+                )
+                print(
+                    f"  {tag}{'RESUMED' if slug in resuming else 'IMPORTED'}: "
+                    f"{name[:50]} (ID: {template_id})"
                 )
-                template_id = result.data[0]["id"]
-
-                # Insert main image if found
-                if main_image:
-                    supabase.table("product_template_images").insert(
-                        {
-                            "product_template_id": template_id,
-                            "image_url": main_image,
-                            "image_type": "main",
-                            "display_order": 0,
-                        }
-                    ).execute()
-
-                # Insert technical image if found
-                if technical_image:
-                    supabase.table("product_template_images").insert(
-                        {
-                            "product_template_id": template_id,
-                            "image_url": technical_image,
-                            "image_type": "technical",
-                            "display_order": 1,
-                        }
-                    ).execute()
-
-                # Insert variants
-                variations = product.get("variations", [])
-                for idx, var in enumerate(variations):
-                    if not var.get("_keep", True):
-                        continue
-
-                    var_name = var.get("name", "Standard")
-                    price_inc_vat = parse_price(var.get("price"))
-                    price_exc_vat = round(price_inc_vat / (1 + VAT_RATE), 2)
-
-                    size_format_id = (
-                        get_size_format_id(var_name) or DEFAULT_SIZE_FORMAT_ID
-                    )
-
-                    var_slug = (
-                        f"{slug}-{slugify(var_name)}"
-                        if var_name != "Standard"
-                        else slug
-                    )
-
-                    variant_data = {
-                        "product_template_id": template_id,
-                        "size_format_id": size_format_id,
-                        "sku": var.get("sku", f"{ref_code}-{idx}"),
-                        "url_slug": var_slug,
-                        "orientation": "vertical",
-                        "base_price_excluding_vat": price_exc_vat,
-                        "base_price_including_vat": price_inc_vat,
-                        "stock_quantity": 100,
-                        "stock_status": "in_stock",
-                        "is_active": True,
-                        "display_order": idx,
-                        "main_image_url": main_image,
-                    }
-
-                    if technical_image:
-                        variant_data["technical_image_url"] = technical_image
-
-                    supabase.table("product_variants").insert(variant_data).execute()
-
-                print(f"  IMPORTED: {name[:50]} (ID: {template_id})")
-
-            imported += 1
+
+            stats["imported"] += 1
 
         except Exception as e:
-            errors.append((product.get("name", "Unknown"), str(e)))
-            print(f"  ERROR: {product.get('name', 'Unknown')[:40]} - {str(e)[:50]}")
+            stats["errors"].append((product.get("name", "Unknown"), str(e)))
+            print(
+                f"  {tag}ERROR: {product.get('name', 'Unknown')[:40]} - {str(e)[:50]}"
+            )
+
+    if loader:
+        try:
+            if pending:
+                stats["imported"], skipped = bulk_load(
+                    loader, journal, pending, resuming
+                )
+                stats["skipped"] += skipped
+        finally:
+            loader.close()
+
+    stats["elapsed"] = time.perf_counter() - start
+    return stats
+
+
+def import_products(dry_run=True, use_pg=False, fresh=False, sources=None):
+    """Import products from one or more supplier sources to the database
+
+    Sources are read in parallel, one thread each.
+    """
+    sources = [get_source(name) for name in (sources or DEFAULT_SOURCES)]
+    print(f"Importing from {', '.join(s.name for s in sources)}")
+
+    if dry_run:
+        print("\n=== DRY RUN MODE - No changes will be made ===\n")
+
+    # Created up front: the client is shared by the source threads
+    supabase = None if dry_run or use_pg else get_client()
+
+    # Progress journal: finished products are skipped without a query,
+    # half-done ones are resumed
+    journal = ImportJournal(read_only=dry_run)
+    if fresh:
+        journal.reset()
+    resuming = set(journal.pending())
+    if resuming:
+        print(f"Resuming {len(resuming)} partially imported products")
+
+    # Existing slugs and SKUs, from the snapshot refreshed once per run
+    try:
+        tables = load_reference_tables(
+            ["product_templates", "product_variants"], offline=dry_run
+        )
+    except RuntimeError:
+        # Dry run without a local snapshot yet
+        print("No local snapshot: existing slugs/SKUs are not checked")
+        tables = {"product_templates": [], "product_variants": []}
+    template_slugs = KeyIndex.from_values(
+        [t["slug"] for t in tables["product_templates"]]
+    )
+    variant_keys = VariantKeyIndex.from_rows(tables["product_variants"])
+    del tables
+
+    claims = {}
+    claims_lock = threading.Lock()
+    multiple = len(sources) > 1
+    with ThreadPoolExecutor(max_workers=len(sources)) as pool:
+        results = list(
+            pool.map(
+                lambda source: import_source(
+                    source,
+                    supabase,
+                    journal,
+                    resuming,
+                    claims,
+                    claims_lock,
+                    template_slugs,
+                    variant_keys,
+                    dry_run,
+                    use_pg,
+                    tag=f"[{source.name}] " if multiple else "",
+                ),
+                sources,
+            )
+        )
+
+    errors = [e for r in results for e in r["errors"]]
+
+    if not dry_run and not errors:
+        # Nothing left to resume: later runs check the snapshot instead
+        journal.reset()
+    journal.close()
+    save_image_manifests()
 
     print(f"\n=== SUMMARY ===")
-    print(f"Imported: {imported}")
-    print(f"Skipped (already exist): {skipped}")
+    print(f"Imported: {sum(r['imported'] for r in results)}")
+    print(f"Skipped (already exist): {sum(r['skipped'] for r in results)}")
+    print(f"Skipped (finished in journal): {sum(r['already_done'] for r in results)}")
+    print(f"Skipped (duplicate slug): {sum(r['duplicates'] for r in results)}")
+    print(f"Variants skipped (duplicate SKU): {variant_keys.duplicates}")
+    print(f"Variant URL slugs made unique: {variant_keys.renamed}")
     print(f"Errors: {len(errors)}")
 
+    print("\nPer source:")
+    for r in results:
+        rate = r["read"] / r["elapsed"] if r["elapsed"] else 0
+        print(
+            f"  {r['source']}: {r['read']} read, {r['imported']} imported "
+            f"in {r['elapsed']:.2f}s ({rate:,.1f} products/s)"
+        )
+
     if errors:
         print("\nErrors:")
         for name, err in errors[:10]:
@@ -342,4 +581,13 @@ if __name__ == "__main__":
     if dry_run:
         print("Running in DRY RUN mode. Use --execute to actually import.")
 
-    import_products(dry_run=dry_run)
+    sources = None
+    if "--source" in sys.argv:
+        sources = sys.argv[sys.argv.index("--source") + 1].split(",")
+
+    import_products(
+        dry_run=dry_run,
+        use_pg="--pg" in sys.argv,
+        fresh="--fresh" in sys.argv,
+        sources=sources,
+    )
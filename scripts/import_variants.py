@@ -6,17 +6,12 @@ import json
 import os
 import re
 
-from dotenv import load_dotenv
-
-from supabase import create_client
-
-load_dotenv(".env.local")
-
-url = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
-key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv(
-    "NEXT_PUBLIC_SUPABASE_ANON_KEY"
-)
-supabase = create_client(url, key)
+from catalog_client import get_client
+from catalog_records import VARIANT_COLUMNS, VariantRecord
+from catalog_snapshot import load_reference_tables
+from image_manifest import get_image_manifest, save_image_manifests
+from pg_bulk import get_bulk_loader
+from unique_keys import VariantKeyIndex, key_exists
 
 SIZE_FORMAT_MAP = {
     "a1": 1,
@@ -91,44 +86,41 @@ def get_size_format_id(variation_name):
 def find_local_image(product_name, img_dir="public/imagens_produto"):
     if not os.path.exists(img_dir):
         return None
-    slug = slugify(product_name)
-    for img in os.listdir(img_dir):
-        img_lower = img.lower()
-        if "_tecnico" in img_lower:
-            continue
-        img_base = img_lower.rsplit(".", 1)[0]
-        if img_base == slug or slug in img_base or img_base in slug:
-            return f"/imagens_produto/{img}"
-    return None
+    return get_image_manifest(img_dir).main_image_url(slugify(product_name))
 
 
 def find_technical_image(product_name, img_dir="public/imagens_produto"):
     if not os.path.exists(img_dir):
         return None
-    slug = slugify(product_name)
-    for img in os.listdir(img_dir):
-        img_lower = img.lower()
-        if "_tecnico" in img_lower:
-            img_base = img_lower.replace("_tecnico", "").rsplit(".", 1)[0]
-            if slug in img_base or img_base in slug:
-                return f"/imagens_produto/{img}"
-    return None
+    return get_image_manifest(img_dir).technical_image_url(slugify(product_name))
 
 
-def import_variants():
+def import_variants(dry_run=False, offline=False, use_pg=False):
     with open("public/TEMP/jocril_products_enriched.json", "r", encoding="utf-8") as f:
         data = json.load(f)
 
     products = [p for p in data["products"] if p.get("_keep") == True]
 
-    templates = supabase.table("product_templates").select("id, slug, name").execute()
-    template_by_slug = {t["slug"]: t for t in templates.data}
+    if dry_run:
+        print("\n=== DRY RUN MODE - No changes will be made ===\n")
 
-    existing_variants = (
-        supabase.table("product_variants").select("product_template_id").execute()
+    # Lookups come from the local snapshot, refreshed incrementally
+    tables = load_reference_tables(
+        ["product_templates", "product_variants"], offline=offline
     )
+    template_by_slug = {t["slug"]: t for t in tables["product_templates"]}
     templates_with_variants = set(
-        v["product_template_id"] for v in existing_variants.data
+        v["product_template_id"] for v in tables["product_variants"]
+    )
+
+    # Taken SKUs / url_slugs: conflicts are resolved before anything is sent
+    variant_keys = VariantKeyIndex.from_rows(tables["product_variants"])
+
+    # With --pg, rows are collected and bulk-loaded once at the end
+    loader = None if dry_run else get_bulk_loader(use_pg)
+    pending_rows = []
+    confirm_sku = key_exists(
+        "product_variants", "sku", None if dry_run or loader else get_client(), loader
     )
 
     added = 0
@@ -174,25 +166,32 @@ def import_variants():
                     f"{slug}-{slugify(var_name)}" if var_name != "Standard" else slug
                 )
 
-                variant_data = {
-                    "product_template_id": template["id"],
-                    "size_format_id": size_format_id,
-                    "sku": var.get("sku", f"{ref_code or slug[:8]}-{idx}"),
-                    "url_slug": var_slug,
-                    "orientation": "vertical",
-                    "base_price_excluding_vat": price_exc_vat,
-                    "base_price_including_vat": price_inc_vat,
-                    "stock_quantity": 100,
-                    "stock_status": "in_stock",
-                    "is_active": True,
-                    "display_order": idx,
-                    "main_image_url": main_image,
-                }
-
-                if technical_image:
-                    variant_data["technical_image_url"] = technical_image
-
-                supabase.table("product_variants").insert(variant_data).execute()
+                variant = VariantRecord(
+                    product_template_id=template["id"],
+                    size_format_id=size_format_id,
+                    sku=var.get("sku", f"{ref_code or slug[:8]}-{idx}"),
+                    url_slug=var_slug,
+                    base_price_excluding_vat=price_exc_vat,
+                    base_price_including_vat=price_inc_vat,
+                    display_order=idx,
+                    main_image_url=main_image,
+                    technical_image_url=technical_image,
+                )
+
+                variant = variant_keys.resolve(variant, confirm_sku)
+                if variant is None:
+                    print(f"    SKIP (duplicate SKU): {var_slug}")
+                    continue
+                var_slug = variant.url_slug
+
+                if dry_run:
+                    print(f"    WOULD INSERT variant: {var_slug}")
+                elif loader:
+                    pending_rows.append(variant)
+                else:
+                    get_client().table("product_variants").insert(
+                        variant.as_row()
+                    ).execute()
                 added += 1
                 var_count += 1
 
@@ -202,9 +201,26 @@ def import_variants():
         if var_count > 0:
             print(f"  Added {var_count} variants for: {template['name'][:50]}")
 
+    if loader:
+        inserted = loader.merge(
+            "product_variants",
+            (v.as_row() for v in pending_rows),
+            columns=VARIANT_COLUMNS,
+            returning=["sku"],
+        )
+        loader.commit()
+        loader.close()
+        conflicts = len(pending_rows) - len(inserted)
+        added = len(inserted)
+        print(f"Bulk-loaded {added} variants ({conflicts} skipped on conflict)")
+
+    save_image_manifests()
+
     print(f"\n=== SUMMARY ===")
     print(f"Variants added: {added}")
     print(f"Templates skipped (had variants): {skipped}")
+    print(f"Variants skipped (duplicate SKU): {variant_keys.duplicates}")
+    print(f"URL slugs made unique: {variant_keys.renamed}")
     print(f"Errors: {len(errors)}")
 
     if errors:
@@ -214,4 +230,10 @@ def import_variants():
 
 
 if __name__ == "__main__":
-    import_variants()
+    import sys
+
+    import_variants(
+        dry_run="--dry-run" in sys.argv,
+        offline="--offline" in sys.argv,
+        use_pg="--pg" in sys.argv,
+    )
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Jocril catalog CLI
+
+Single entry point for the catalog maintenance scripts. Script modules and
+heavy dependencies (supabase, requests) are imported only by the command
+that needs them, and the Supabase client is created on first use and shared
+by every command run in the same process.
+
+Usage (from the repository root):
+    python scripts/jocril_catalog.py import [--execute] [--pg] [--fresh] [--source NAME ...]
+    python scripts/jocril_catalog.py variants [--dry-run] [--offline] [--pg]
+    python scripts/jocril_catalog.py fix-variants [--dry-run] [--offline] [--pg]
+    python scripts/jocril_catalog.py snapshot [--full]
+    python scripts/jocril_catalog.py price-tiers [--pg] [--effective-prices]
+    python scripts/jocril_catalog.py stock-sync [FEED ...] [--dry-run] [--force] [--full] [--pg]
+    python scripts/jocril_catalog.py effective-prices [--full] [--dry-run] [--date YYYY-MM-DD]
+    python scripts/jocril_catalog.py enrich [--input FILE] [--output FILE]
+    python scripts/jocril_catalog.py images [--sync] [--force]
+    python scripts/jocril_catalog.py image-manifest [--rebuild]
+    python scripts/jocril_catalog.py search-index [--full] [--offline]
+    python scripts/jocril_catalog.py bought-together [--full] [--dry-run]
+    python scripts/jocril_catalog.py similar-products [--full] [--dry-run] [--offline]
+    python scripts/jocril_catalog.py analytics-rollups [--full] [--dry-run] [--late-days N]
+    python scripts/jocril_catalog.py feed [--full] [--output DIR]
+    python scripts/jocril_catalog.py page-payloads [--full] [--dry-run] [--output DIR]
+    python scripts/jocril_catalog.py shipping-quotes [--orders N] [--benchmark N]
+    python scripts/jocril_catalog.py technical-specs [--full] [--dry-run]
+    python scripts/jocril_catalog.py worker [--once] [--poll SECONDS]
+    python scripts/jocril_catalog.py enqueue [--priority N] COMMAND [ARGS ...]
+    python scripts/jocril_catalog.py slugify "Porta Folhetos A4"
+    python scripts/jocril_catalog.py specs "Largura: 210mm Altura: 297mm"
+
+Several commands can be chained with "+" to run them in one process:
+    python scripts/jocril_catalog.py import --execute + variants + price-tiers + search-index
+
+--metrics prints per table/operation request counts, rows, bytes and
+latencies after each command; --trace FILE also writes one span per request:
+    python scripts/jocril_catalog.py --metrics --trace trace.jsonl feed
+"""
+
+import argparse
+import json
+import sys
+from datetime import date
+
+import client_metrics
+
+COMMAND_SEPARATOR = "+"
+
+
+def cmd_import(args):
+    from import_products import import_products
+
+    if not args.execute:
+        print("Running in DRY RUN mode. Use --execute to actually import.")
+    import_products(
+        dry_run=not args.execute,
+        use_pg=args.pg,
+        fresh=args.fresh,
+        sources=args.source,
+    )
+
+
+def cmd_variants(args):
+    from import_variants import import_variants
+
+    import_variants(dry_run=args.dry_run, offline=args.offline, use_pg=args.pg)
+
+
+def cmd_fix_variants(args):
+    from fix_missing_variants import fix_missing_variants
+
+    fix_missing_variants(dry_run=args.dry_run, offline=args.offline, use_pg=args.pg)
+
+
+def cmd_snapshot(args):
+    from catalog_snapshot import CatalogSnapshot
+
+    snapshot = CatalogSnapshot()
+    try:
+        fetched = snapshot.refresh(full=args.full)
+    finally:
+        snapshot.close()
+    for table, count in fetched.items():
+        print(f"{table}: {count} rows transferred")
+
+
+def cmd_price_tiers(args):
+    from generate_price_tiers import main
+
+    main(use_pg=args.pg, effective_prices=args.effective_prices)
+
+
+def cmd_stock_sync(args):
+    import stock_sync
+
+    stock_sync.main(
+        feeds=args.feeds,
+        dry_run=args.dry_run,
+        force=args.force,
+        use_pg=args.pg,
+        offline=args.offline,
+        effective_prices=args.effective_prices,
+        full_snapshot=args.full,
+    )
+
+
+def cmd_effective_prices(args):
+    import effective_prices
+
+    effective_prices.main(full=args.full, dry_run=args.dry_run, on_date=args.date)
+
+
+def cmd_enrich(args):
+    import enrich_products
+
+    enrich_products.main(
+        input_file=args.input or enrich_products.INPUT_FILE,
+        output_file=args.output or enrich_products.OUTPUT_FILE,
+    )
+
+
+def cmd_images(args):
+    from build_image_derivatives import build_all, sync_template_image_variants
+
+    manifest = build_all(force=args.force)
+    if args.sync:
+        sync_template_image_variants(manifest)
+
+
+def cmd_image_manifest(args):
+    import image_manifest
+
+    image_manifest.main(rebuild=args.rebuild)
+
+
+def cmd_search_index(args):
+    import build_search_index
+
+    build_search_index.main(full=args.full, offline=args.offline)
+
+
+def cmd_bought_together(args):
+    import frequently_bought_together
+
+    frequently_bought_together.main(full=args.full, dry_run=args.dry_run)
+
+
+def cmd_similar_products(args):
+    import similar_products
+
+    similar_products.main(full=args.full, dry_run=args.dry_run, offline=args.offline)
+
+
+def cmd_analytics_rollups(args):
+    import analytics_rollups
+
+    analytics_rollups.main(
+        full=args.full, dry_run=args.dry_run, late_days=args.late_days
+    )
+
+
+def cmd_feed(args):
+    import product_feed
+
+    product_feed.main(full=args.full, output_dir=args.output or product_feed.OUTPUT_DIR)
+
+
+def cmd_page_payloads(args):
+    import product_page_payloads
+
+    product_page_payloads.main(
+        full=args.full, dry_run=args.dry_run, output_dir=args.output
+    )
+
+
+def cmd_shipping_quotes(args):
+    import shipping_quotes
+
+    shipping_quotes.main(orders=args.orders, benchmark=args.benchmark)
+
+
+def cmd_technical_specs(args):
+    import technical_specs
+
+    technical_specs.main(full=args.full, dry_run=args.dry_run)
+
+
+def cmd_worker(args):
+    import catalog_worker
+
+    catalog_worker.run(once=args.once, poll=args.poll)
+
+
+def cmd_enqueue(args):
+    import catalog_worker
+
+    job_id = catalog_worker.enqueue(args.job, args.priority)
+    print(f"Queued job {job_id}")
+
+
+def cmd_slugify(args):
+    from import_products import slugify
+
+    for name in args.names:
+        print(slugify(name))
+
+
+def cmd_specs(args):
+    from enrich_products import extract_specifications
+
+    notes = args.notes if args.notes is not None else sys.stdin.read()
+    print(json.dumps(extract_specifications(notes), ensure_ascii=False, indent=2))
+
+
+def add_pg_flag(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--pg", action="store_true", help="Bulk-load via Postgres COPY (DATABASE_URL)"
+    )
+
+
+def add_snapshot_flags(parser: argparse.ArgumentParser):
+    parser.add_argument("--dry-run", action="store_true", help="Do not write")
+    parser.add_argument(
+        "--offline", action="store_true", help="Use the local snapshot as-is"
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="jocril-catalog",
+        description="Jocril catalog maintenance commands",
+    )
+    parser.add_argument(
+        "--metrics", action="store_true", help="Report Supabase request metrics"
+    )
+    parser.add_argument("--trace", metavar="FILE", help="Append request spans to FILE")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("import", help="Import products from supplier sources")
+    p.add_argument("--execute", action="store_true", help="Write to the database")
+    p.add_argument("--fresh", action="store_true", help="Ignore the import journal")
+    p.add_argument(
+        "--source",
+        action="append",
+        help="Source from source_adapters.SOURCES (repeatable, default: jocril)",
+    )
+    add_pg_flag(p)
+    p.set_defaults(func=cmd_import)
+
+    p = commands.add_parser("variants", help="Import variants for existing templates")
+    add_snapshot_flags(p)
+    add_pg_flag(p)
+    p.set_defaults(func=cmd_variants)
+
+    p = commands.add_parser("fix-variants", help="Add variants missing by SKU")
+    add_snapshot_flags(p)
+    add_pg_flag(p)
+    p.set_defaults(func=cmd_fix_variants)
+
+    p = commands.add_parser("snapshot", help="Refresh the local catalog snapshot")
+    p.add_argument("--full", action="store_true", help="Re-download all rows")
+    p.set_defaults(func=cmd_snapshot)
+
+    p = commands.add_parser("price-tiers", help="Regenerate all price tiers")
+    add_pg_flag(p)
+    p.add_argument(
+        "--effective-prices",
+        action="store_true",
+        help="Refresh product_effective_prices afterwards",
+    )
+    p.set_defaults(func=cmd_price_tiers)
+
+    p = commands.add_parser(
+        "stock-sync", help="Sync stock and prices from supplier feeds by SKU"
+    )
+    p.add_argument(
+        "feeds", nargs="*", help="Feeds from stock_sync.STOCK_FEEDS (default: estudioplast)"
+    )
+    p.add_argument("--dry-run", action="store_true", help="Do not write")
+    p.add_argument("--force", action="store_true", help="Sync unchanged feeds too")
+    p.add_argument(
+        "--full", action="store_true", help="Fully refresh the variant snapshot"
+    )
+    p.add_argument(
+        "--offline", action="store_true", help="Use the local snapshot as is"
+    )
+    add_pg_flag(p)
+    p.add_argument(
+        "--effective-prices",
+        action="store_true",
+        help="Refresh product_effective_prices after price changes",
+    )
+    p.set_defaults(func=cmd_stock_sync)
+
+    p = commands.add_parser(
+        "effective-prices", help="Update the materialized effective prices"
+    )
+    p.add_argument("--full", action="store_true", help="Recompute every variant")
+    p.add_argument("--dry-run", action="store_true", help="Do not write")
+    p.add_argument(
+        "--date",
+        type=date.fromisoformat,
+        help="Price date (default: today)",
+    )
+    p.set_defaults(func=cmd_effective_prices)
+
+    p = commands.add_parser("enrich", help="Enrich products with AI copy")
+    p.add_argument("--input", help="Input products JSON")
+    p.add_argument("--output", help="Output enriched JSON")
+    p.set_defaults(func=cmd_enrich)
+
+    p = commands.add_parser("images", help="Build responsive image derivatives")
+    p.add_argument("--force", action="store_true", help="Rebuild every image")
+    p.add_argument(
+        "--sync", action="store_true", help="Upsert product_template_image_variants"
+    )
+    p.set_defaults(func=cmd_images)
+
+    p = commands.add_parser(
+        "image-manifest", help="Refresh the image inventory and cached matches"
+    )
+    p.add_argument("--rebuild", action="store_true", help="Re-match every product")
+    p.set_defaults(func=cmd_image_manifest)
+
+    p = commands.add_parser(
+        "search-index", help="Export the static product search index"
+    )
+    p.add_argument("--full", action="store_true", help="Re-download all rows")
+    p.add_argument(
+        "--offline", action="store_true", help="Use the local snapshot as-is"
+    )
+    p.set_defaults(func=cmd_search_index)
+
+    p = commands.add_parser(
+        "bought-together", help="Update frequently_bought_together from orders"
+    )
+    p.add_argument("--full", action="store_true", help="Recount every order")
+    p.add_argument("--dry-run", action="store_true", help="Do not write")
+    p.set_defaults(func=cmd_bought_together)
+
+    p = commands.add_parser(
+        "similar-products", help="Update 'similar' related_products by content"
+    )
+    p.add_argument(
+        "--full", action="store_true", help="Full snapshot and re-read published pairs"
+    )
+    p.add_argument("--dry-run", action="store_true", help="Do not write")
+    p.add_argument(
+        "--offline", action="store_true", help="Use the local snapshot as is"
+    )
+    p.set_defaults(func=cmd_similar_products)
+
+    p = commands.add_parser(
+        "analytics-rollups", help="Update weekly/monthly product analytics rollups"
+    )
+    p.add_argument("--full", action="store_true", help="Rebuild every period")
+    p.add_argument("--dry-run", action="store_true", help="Do not write")
+    p.add_argument(
+        "--late-days",
+        type=int,
+        default=3,
+        help="Days before the watermark to recompute (late data)",
+    )
+    p.set_defaults(func=cmd_analytics_rollups)
+
+    p = commands.add_parser("feed", help="Export gzip XML/CSV product feeds")
+    p.add_argument(
+        "--full", action="store_true", help="Put every item in the delta feed"
+    )
+    p.add_argument("--output", help="Output directory (default: public/feeds)")
+    p.set_defaults(func=cmd_feed)
+
+    p = commands.add_parser(
+        "page-payloads", help="Prerender product page payloads per url_slug"
+    )
+    p.add_argument("--full", action="store_true", help="Rebuild every payload")
+    p.add_argument("--dry-run", action="store_true", help="Do not write")
+    p.add_argument(
+        "--output", help="Write DIR/<url_slug>.json instead of the table"
+    )
+    p.set_defaults(func=cmd_page_payloads)
+
+    p = commands.add_parser(
+        "shipping-quotes", help="Quote orders or synthetic carts in bulk"
+    )
+    p.add_argument(
+        "--orders", type=int, metavar="N", help="Re-quote the newest N orders"
+    )
+    p.add_argument(
+        "--benchmark", type=int, metavar="N", help="Quote N synthetic carts"
+    )
+    p.set_defaults(func=cmd_shipping_quotes)
+
+    p = commands.add_parser(
+        "technical-specs", help="Sync typed technical_specs rows from specs JSON"
+    )
+    p.add_argument("--full", action="store_true", help="Re-check every template")
+    p.add_argument("--dry-run", action="store_true", help="Do not write")
+    p.set_defaults(func=cmd_technical_specs)
+
+    p = commands.add_parser("worker", help="Run queued jobs in one warm process")
+    p.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    p.add_argument(
+        "--poll", type=float, default=1.0, help="Seconds between idle queue checks"
+    )
+    p.set_defaults(func=cmd_worker)
+
+    p = commands.add_parser(
+        "enqueue", help="Queue a command (or: retier VARIANT_ID ...) for the worker"
+    )
+    p.add_argument("--priority", type=int, help="Higher runs first")
+    p.add_argument("job", nargs=argparse.REMAINDER, help="Command and its arguments")
+    p.set_defaults(func=cmd_enqueue)
+
+    p = commands.add_parser("slugify", help="Print the slug for product names")
+    p.add_argument("names", nargs="+")
+    p.set_defaults(func=cmd_slugify)
+
+    p = commands.add_parser("specs", help="Extract specifications from notes")
+    p.add_argument("notes", nargs="?", help="Notes text (default: stdin)")
+    p.set_defaults(func=cmd_specs)
+
+    return parser
+
+
+def split_commands(argv: list) -> list:
+    """Split argv on the command separator into one argv per command."""
+    groups = [[]]
+    for arg in argv:
+        if arg == COMMAND_SEPARATOR:
+            groups.append([])
+        else:
+            groups[-1].append(arg)
+    return [g for g in groups if g]
+
+
+def main(argv: list | None = None):
+    parser = build_parser()
+    groups = split_commands(sys.argv[1:] if argv is None else argv)
+    if not groups:
+        parser.print_help()
+        return 1
+
+    # Parse everything up front so a typo in a later command fails fast
+    parsed = [parser.parse_args(group) for group in groups]
+    trace = next((args.trace for args in parsed if args.trace), None)
+    if trace or any(args.metrics for args in parsed):
+        client_metrics.enable(trace)
+
+    for args in parsed:
+        args.func(args)
+        client_metrics.report(args.command)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
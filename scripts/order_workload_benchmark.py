@@ -0,0 +1,342 @@
+"""
+Order workload benchmark for the order_items / orders indexes.
+
+Fills a local Postgres (loaded with the catalog and order schema) with
+synthetic customers, orders and order items, then replays the queries the
+storefront and batch jobs run against them and reports latency percentiles
+with the indexes as they were before
+supabase/migrations/20261019120000_add_order_access_indexes.sql and after
+applying it.
+
+Rows are generated server-side with generate_series, filling whatever NOT
+NULL columns the installed schema has (scripts/03-create-order-tables.sql
+and the Supabase migration name some columns differently). Order items
+reference existing product_variants, so load the catalog first.
+
+Usage (never against production; remote hosts are refused without --force):
+    createdb jocril_load
+    psql jocril_load -f scripts/01-create-database-schema.sql
+    psql jocril_load -f scripts/03-create-order-tables.sql
+    DATABASE_URL=postgresql:///jocril_load python scripts/pg_bulk.py --check  # or import the catalog
+    DATABASE_URL=postgresql:///jocril_load python scripts/order_workload_benchmark.py \\
+        --generate --customers 1000000 --orders 3000000
+    DATABASE_URL=postgresql:///jocril_load python scripts/order_workload_benchmark.py --compare
+
+Requires psycopg 3.
+"""
+
+import json
+import os
+import random
+import statistics
+import time
+
+from pg_bulk import PgBulkLoader, get_dsn
+
+MIGRATION_FILE = "supabase/migrations/20261019120000_add_order_access_indexes.sql"
+RESULTS_FILE = os.path.join(".cache", "catalog", "order_workload.json")
+
+DEFAULT_CUSTOMERS = 1_000_000
+DEFAULT_ORDERS = 3_000_000
+MAX_ITEMS_PER_ORDER = 6
+GENERATE_BATCH = 250_000
+QUERY_RUNS = 500
+SEED = 7
+ORDER_STATUSES = ["pending", "processing", "paid", "shipped", "delivered", "cancelled"]
+
+# Index layout before the migration (scripts/03-create-order-tables.sql)
+BEFORE_SQL = """
+DROP INDEX IF EXISTS idx_order_items_variant_order;
+DROP INDEX IF EXISTS idx_order_items_order_id_id;
+DROP INDEX IF EXISTS idx_orders_customer_created;
+CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id);
+CREATE INDEX IF NOT EXISTS idx_orders_customer_id ON orders(customer_id);
+ANALYZE order_items;
+ANALYZE orders;
+"""
+
+# name -> (SQL, parameter kind)
+QUERIES = {
+    "customer_history": (
+        "SELECT id, order_number, created_at, status FROM orders "
+        "WHERE customer_id = %s ORDER BY created_at DESC LIMIT 20",
+        "customer",
+    ),
+    "order_detail": ("SELECT * FROM order_items WHERE order_id = %s", "order"),
+    "order_by_number": (
+        "SELECT id, status, payment_status FROM orders WHERE order_number = %s",
+        "order_number",
+    ),
+    "variant_sales": (
+        "SELECT count(*), coalesce(sum(quantity), 0) FROM order_items "
+        "WHERE product_variant_id = %s",
+        "variant",
+    ),
+    "co_purchase": (
+        "SELECT b.product_variant_id, count(*) AS times FROM order_items a "
+        "JOIN order_items b ON b.order_id = a.order_id "
+        "AND b.product_variant_id <> a.product_variant_id "
+        "WHERE a.product_variant_id = %s "
+        "GROUP BY b.product_variant_id ORDER BY times DESC LIMIT 8",
+        "variant",
+    ),
+    "fbt_keyset_page": (
+        "SELECT order_id, product_variant_id FROM order_items "
+        "WHERE order_id > %s ORDER BY order_id, id LIMIT 1000",
+        "order",
+    ),
+}
+
+# Values for well-known columns; other required columns get type defaults
+COLUMN_OVERRIDES = {
+    "customers": {
+        "email": "'load-' || g || '@example.test'",
+        "full_name": "'Cliente ' || g",
+        "first_name": "'Cliente'",
+        "last_name": "g::text",
+        "phone": "'9' || lpad((g % 100000000)::text, 8, '0')",
+        "created_at": "now() - random() * interval '3 years'",
+    },
+    "orders": {
+        "customer_id": "{customer_min} + (random() * ({customers} - 1))::int",
+        "order_number": "'LOAD-' || g",
+        "status": "(ARRAY{statuses})[1 + (random() * {num_statuses})::int % {num_statuses}]",
+        "created_at": "now() - random() * interval '3 years'",
+    },
+}
+
+
+def is_local(dsn: str) -> bool:
+    return not any(host in dsn for host in ("supabase.co", "supabase.com", "pooler"))
+
+
+def table_columns(loader, table: str) -> dict:
+    """{column: (data_type, required)}; required = NOT NULL without a default."""
+    return {
+        r["column_name"]: (
+            r["data_type"],
+            r["is_nullable"] == "NO" and r["column_default"] is None,
+        )
+        for r in loader.fetch(
+            "SELECT column_name, data_type, is_nullable, column_default "
+            "FROM information_schema.columns "
+            "WHERE table_schema = 'public' AND table_name = %s",
+            (table,),
+        )
+    }
+
+
+def column_expressions(loader, table: str, overrides: dict) -> tuple:
+    """(names, expressions): overrides for existing columns, then required ones."""
+    columns = table_columns(loader, table)
+    names = [name for name in overrides if name in columns]
+    names += [
+        name
+        for name, (_, required) in columns.items()
+        if required and name not in overrides
+    ]
+    expressions = [
+        overrides.get(name) or default_expression(columns[name][0]) for name in names
+    ]
+    return names, expressions
+
+
+def default_expression(data_type: str) -> str:
+    if data_type in ("numeric", "double precision", "real"):
+        return "round((5 + random() * 500)::numeric, 2)"
+    if data_type in ("integer", "bigint", "smallint"):
+        return "1 + (random() * 9)::int"
+    if data_type == "boolean":
+        return "false"
+    if data_type.startswith("timestamp"):
+        return "now()"
+    return "'load ' || g"
+
+
+def insert_generated(loader, table: str, count: int, overrides: dict) -> int:
+    """INSERT ... SELECT FROM generate_series in batches. Returns rows added."""
+    names, expressions = column_expressions(loader, table, overrides)
+    start_id = loader.fetch(f"SELECT coalesce(max(id), 0) AS id FROM {table}")[0]["id"]
+
+    added = 0
+    while added < count:
+        size = min(GENERATE_BATCH, count - added)
+        first = start_id + added + 1
+        loader.execute(
+            f"INSERT INTO {table} ({', '.join(names)}) "
+            f"SELECT {', '.join(expressions)} "
+            f"FROM generate_series({first}, {first + size - 1}) AS g"
+        )
+        loader.commit()
+        added += size
+        print(f"  ► {table}: {added:,}/{count:,}")
+    return added
+
+
+def generate(loader, customers: int, orders: int):
+    variants = loader.fetch(
+        "SELECT min(id) AS lo, max(id) AS hi, count(*) AS n FROM product_variants"
+    )[0]
+    if not variants["n"]:
+        raise RuntimeError("No product_variants: load the catalog first")
+
+    start = time.perf_counter()
+    customer_min = loader.fetch(
+        "SELECT coalesce(max(id), 0) + 1 AS id FROM customers"
+    )[0]["id"]
+    insert_generated(loader, "customers", customers, COLUMN_OVERRIDES["customers"])
+
+    order_overrides = {
+        k: v.format(
+            customer_min=customer_min,
+            customers=customers,
+            statuses=ORDER_STATUSES,
+            num_statuses=len(ORDER_STATUSES),
+        )
+        for k, v in COLUMN_OVERRIDES["orders"].items()
+    }
+    order_min = loader.fetch("SELECT coalesce(max(id), 0) + 1 AS id FROM orders")[0][
+        "id"
+    ]
+    insert_generated(loader, "orders", orders, order_overrides)
+
+    # 1..MAX_ITEMS_PER_ORDER items per order; popular variants are skewed
+    # towards low ids (power law) like real catalogs. "o.id * 0" makes the
+    # series correlated, so random() is drawn per order rather than once
+    item_overrides = {
+        "order_id": "o.id",
+        "product_variant_id": (
+            f"{variants['lo']} + floor(power(random(), 3) * "
+            f"({variants['hi']} - {variants['lo']} + 1))::int"
+        ),
+        "quantity": "1 + (random() * 20)::int",
+    }
+    names, expressions = column_expressions(loader, "order_items", item_overrides)
+    for lo in range(order_min, order_min + orders, GENERATE_BATCH):
+        hi = min(lo + GENERATE_BATCH, order_min + orders) - 1
+        loader.execute(
+            f"INSERT INTO order_items ({', '.join(names)}) "
+            f"SELECT {', '.join(expressions)} FROM orders o "
+            f"CROSS JOIN LATERAL generate_series(1, 1 + (random() * "
+            f"{MAX_ITEMS_PER_ORDER - 1})::int + o.id * 0) AS i "
+            f"WHERE o.id BETWEEN {lo} AND {hi}"
+        )
+        loader.commit()
+        print(f"  ► order_items for orders {lo:,}-{hi:,}")
+
+    loader.execute("ANALYZE customers; ANALYZE orders; ANALYZE order_items")
+    loader.commit()
+    print(f"Generated in {time.perf_counter() - start:.0f}s")
+
+
+def sample_parameters(loader, runs: int) -> dict:
+    rng = random.Random(SEED)
+    bounds = loader.fetch(
+        "SELECT (SELECT min(id) FROM customers) AS c_lo, "
+        "(SELECT max(id) FROM customers) AS c_hi, "
+        "(SELECT min(id) FROM orders) AS o_lo, (SELECT max(id) FROM orders) AS o_hi, "
+        "(SELECT min(id) FROM product_variants) AS v_lo, "
+        "(SELECT max(id) FROM product_variants) AS v_hi"
+    )[0]
+    orders = [rng.randint(bounds["o_lo"], bounds["o_hi"]) for _ in range(runs)]
+    numbers = {
+        r["id"]: r["order_number"]
+        for r in loader.fetch(
+            "SELECT id, order_number FROM orders WHERE id = ANY(%s)", (orders,)
+        )
+    }
+    return {
+        "customer": [rng.randint(bounds["c_lo"], bounds["c_hi"]) for _ in range(runs)],
+        "order": orders,
+        "order_number": [numbers.get(o, "") for o in orders],
+        "variant": [rng.randint(bounds["v_lo"], bounds["v_hi"]) for _ in range(runs)],
+    }
+
+
+def replay(loader, parameters: dict) -> dict:
+    """Run every query once per sampled parameter; latency stats in ms."""
+    results = {}
+    for name, (query, kind) in QUERIES.items():
+        loader.fetch(query, (parameters[kind][0],))  # warm up
+        latencies = []
+        for value in parameters[kind]:
+            start = time.perf_counter()
+            loader.fetch(query, (value,))
+            latencies.append((time.perf_counter() - start) * 1000)
+        cuts = statistics.quantiles(latencies, n=100)
+        results[name] = {
+            "p50": round(cuts[49], 3),
+            "p95": round(cuts[94], 3),
+            "p99": round(cuts[98], 3),
+            "max": round(max(latencies), 3),
+        }
+        print(
+            f"  {name:<18} p50 {cuts[49]:8.2f} ms  p95 {cuts[94]:8.2f} ms  "
+            f"p99 {cuts[98]:8.2f} ms"
+        )
+    return results
+
+
+def compare(loader, runs: int = QUERY_RUNS) -> dict:
+    parameters = sample_parameters(loader, runs)
+
+    print("\n--- Before (original indexes) ---")
+    loader.execute(BEFORE_SQL)
+    loader.commit()
+    before = replay(loader, parameters)
+
+    print("\n--- After (migration applied) ---")
+    with open(MIGRATION_FILE, "r", encoding="utf-8") as f:
+        loader.execute(f.read())
+    loader.commit()
+    after = replay(loader, parameters)
+
+    print(f"\n=== SUMMARY ===")
+    print(f"{'query':<18} {'p50 before':>11} {'p50 after':>10} {'p99 before':>11} {'p99 after':>10}")
+    for name in QUERIES:
+        b, a = before[name], after[name]
+        print(
+            f"{name:<18} {b['p50']:>9.2f}ms {a['p50']:>8.2f}ms "
+            f"{b['p99']:>9.2f}ms {a['p99']:>8.2f}ms"
+        )
+
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "runs": runs,
+        "before": before,
+        "after": after,
+    }
+    os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+    with open(RESULTS_FILE, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results: {RESULTS_FILE}")
+    return results
+
+
+def main(argv: list | None = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--generate", action="store_true", help="Add synthetic data")
+    parser.add_argument("--customers", type=int, default=DEFAULT_CUSTOMERS)
+    parser.add_argument("--orders", type=int, default=DEFAULT_ORDERS)
+    parser.add_argument("--compare", action="store_true", help="Replay before/after")
+    parser.add_argument("--runs", type=int, default=QUERY_RUNS)
+    parser.add_argument("--force", action="store_true", help="Allow a remote host")
+    args = parser.parse_args(argv)
+
+    dsn = get_dsn()
+    if not is_local(dsn) and not args.force:
+        raise SystemExit("Refusing to load synthetic orders into a remote database")
+
+    with PgBulkLoader(dsn) as loader:
+        if args.generate:
+            generate(loader, args.customers, args.orders)
+        if args.compare:
+            compare(loader, args.runs)
+        if not (args.generate or args.compare):
+            parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
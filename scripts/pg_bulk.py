@@ -0,0 +1,277 @@
+"""
+Direct Postgres bulk-load backend for the catalog scripts.
+
+Instead of PostgREST JSON inserts, rows are streamed with
+COPY ... FROM STDIN into a temporary staging table and merged into the
+target with a single INSERT ... SELECT ... ON CONFLICT. Everything runs in
+one transaction, committed by the caller.
+
+Enable it with --pg in import_products, import_variants,
+fix_missing_variants and generate_price_tiers. The connection string is
+read from SUPABASE_DB_URL or DATABASE_URL (.env.local is loaded).
+Requires psycopg 3 (pip install "psycopg[binary]").
+
+Check against a local database loaded with the schema:
+    createdb jocril_test
+    psql jocril_test -f scripts/01-create-database-schema.sql
+    DATABASE_URL=postgresql:///jocril_test python scripts/pg_bulk.py --check
+The check loads synthetic templates, variants and price tiers, prints the
+throughput and rolls everything back.
+
+COPY columns are matched against information_schema.columns, so a database
+built from that schema alone (no price_tiers.display_text, no
+product_variants.technical_image_url, ...) still accepts the writes: the
+columns it lacks are skipped, with a note. Tables it lacks are an error
+(product_template_images needs
+supabase/migrations_archive_20250118/20250129_create_template_images.sql).
+"""
+
+import os
+import time
+
+DSN_ENV_VARS = ("SUPABASE_DB_URL", "DATABASE_URL")
+
+
+def get_dsn() -> str:
+    """Postgres connection string from the environment / .env.local."""
+    from dotenv import load_dotenv
+
+    load_dotenv(".env.local")
+    for var in DSN_ENV_VARS:
+        if os.getenv(var):
+            return os.getenv(var)
+    raise RuntimeError(f"Set one of {', '.join(DSN_ENV_VARS)} to use --pg")
+
+
+class PgBulkLoader:
+    """COPY-based staging/merge writer over a single psycopg connection."""
+
+    def __init__(self, dsn: str | None = None):
+        import psycopg
+
+        self.conn = psycopg.connect(dsn or get_dsn())
+        # Table -> its column names, read once from information_schema
+        self._table_columns = {}
+        self._noted = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.commit()
+        else:
+            self.conn.rollback()
+        self.conn.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+    def fetch(self, query: str, params=None) -> list:
+        """Run a query and return rows as dicts."""
+        from psycopg.rows import dict_row
+
+        with self.conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(query, params)
+            return cur.fetchall()
+
+    def execute(self, query: str, params=None) -> int:
+        with self.conn.cursor() as cur:
+            cur.execute(query, params)
+            return cur.rowcount
+
+    def table_columns(self, table: str) -> set:
+        if table not in self._table_columns:
+            self._table_columns[table] = {
+                r["column_name"]
+                for r in self.fetch(
+                    "SELECT column_name FROM information_schema.columns "
+                    "WHERE table_schema = current_schema() AND table_name = %s",
+                    (table,),
+                )
+            }
+        return self._table_columns[table]
+
+    def merge(
+        self,
+        table: str,
+        rows,
+        conflict_columns: list | None = None,
+        update_columns: list | None = None,
+        returning: list | None = None,
+        columns: list | None = None,
+    ) -> list | int:
+        """Bulk upsert rows (dicts) into table via a COPY-loaded staging table.
+
+        Without update_columns, conflicting rows are skipped (ON CONFLICT DO
+        NOTHING on any unique constraint). With update_columns, rows
+        conflicting on conflict_columns update those columns.
+        When columns is given, rows can be any iterable (e.g. a generator
+        of rows built on the fly) and is streamed into COPY in one pass.
+        Columns the table does not have (e.g. a database created from
+        scripts/01-create-database-schema.sql without the later migrations)
+        are left out, with a note.
+        Returns the RETURNING rows as dicts if requested, else the row count.
+        """
+        from psycopg import sql
+        from psycopg.rows import dict_row
+        from psycopg.types.json import Jsonb
+
+        if columns is None:
+            if not rows:
+                return [] if returning else 0
+            columns = list(rows[0].keys())
+            for row in rows:
+                for column in row:
+                    if column not in columns:
+                        columns.append(column)
+
+        existing = self.table_columns(table)
+        if not existing:
+            raise RuntimeError(f"Table {table} does not exist in the database")
+        missing = [c for c in columns if c not in existing]
+        if missing:
+            if (table, tuple(missing)) not in self._noted:
+                self._noted.add((table, tuple(missing)))
+                print(f"  {table}: no column {', '.join(missing)} in the database, not written")
+            columns = [c for c in columns if c in existing]
+            if update_columns:
+                update_columns = [c for c in update_columns if c in existing]
+
+        target = sql.Identifier(table)
+        staging = sql.Identifier(f"_stg_{table}")
+        cols = sql.SQL(", ").join(sql.Identifier(c) for c in columns)
+
+        with self.conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(staging))
+            cur.execute(
+                sql.SQL(
+                    "CREATE TEMP TABLE {} ON COMMIT DROP AS "
+                    "SELECT {} FROM {} WITH NO DATA"
+                ).format(staging, cols, target)
+            )
+
+            with cur.copy(
+                sql.SQL("COPY {} ({}) FROM STDIN").format(staging, cols)
+            ) as copy:
+                for row in rows:
+                    copy.write_row(
+                        [
+                            Jsonb(v) if isinstance(v, (dict, list)) else v
+                            for v in (row.get(c) for c in columns)
+                        ]
+                    )
+
+            select = sql.SQL("SELECT {} FROM {}").format(cols, staging)
+            if update_columns:
+                keys = sql.SQL(", ").join(sql.Identifier(c) for c in conflict_columns)
+                # One row per conflict key, otherwise DO UPDATE fails
+                select = sql.SQL("SELECT DISTINCT ON ({}) {} FROM {}").format(
+                    keys, cols, staging
+                )
+                action = sql.SQL("ON CONFLICT ({}) DO UPDATE SET {}").format(
+                    keys,
+                    sql.SQL(", ").join(
+                        sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(c))
+                        for c in update_columns
+                    ),
+                )
+            else:
+                action = sql.SQL("ON CONFLICT DO NOTHING")
+
+            query = sql.SQL("INSERT INTO {} ({}) {} {}").format(
+                target, cols, select, action
+            )
+            if returning:
+                query = sql.SQL("{} RETURNING {}").format(
+                    query, sql.SQL(", ").join(sql.Identifier(c) for c in returning)
+                )
+            cur.execute(query)
+            return cur.fetchall() if returning else cur.rowcount
+
+
+def get_bulk_loader(enabled: bool) -> PgBulkLoader | None:
+    """A loader when the Postgres backend is requested, else None."""
+    return PgBulkLoader() if enabled else None
+
+
+def check(num_variants: int = 100_000):
+    """Load synthetic catalog rows into a local database and roll back."""
+    from catalog_records import TierBatch
+    from generate_price_tiers import iter_tiers
+
+    with PgBulkLoader() as loader:
+        try:
+            size = loader.merge(
+                "size_formats",
+                [{"name": "_bulk_check", "width_mm": 210, "height_mm": 297}],
+                conflict_columns=["name"],
+                update_columns=["width_mm"],
+                returning=["id"],
+            )[0]["id"]
+
+            num_templates = max(1, num_variants // 4)
+            start = time.perf_counter()
+            templates = loader.merge(
+                "product_templates",
+                [
+                    {"name": f"Check {i}", "slug": f"bulk-check-{i}", "sku_prefix": "CHK"}
+                    for i in range(num_templates)
+                ],
+                returning=["id"],
+            )
+            variants = loader.merge(
+                "product_variants",
+                [
+                    {
+                        "product_template_id": templates[i % len(templates)]["id"],
+                        "size_format_id": size,
+                        "sku": f"CHK-{i}",
+                        "url_slug": f"bulk-check-variant-{i}",
+                        "base_price_excluding_vat": round((2 + i % 50) / 1.23, 2),
+                        "base_price_including_vat": 2 + i % 50,
+                    }
+                    for i in range(num_variants)
+                ],
+                returning=["id", "base_price_including_vat"],
+            )
+            tiers = TierBatch()
+            for v in variants:
+                for tier in iter_tiers(float(v["base_price_including_vat"])):
+                    tiers.append(v["id"], *tier)
+            tier_count = loader.merge(
+                "price_tiers",
+                tiers.rows(),
+                columns=TierBatch.COLUMNS,
+                conflict_columns=["product_variant_id", "min_quantity"],
+                update_columns=["max_quantity", "discount_percentage", "price_per_unit"],
+            )
+            elapsed = time.perf_counter() - start
+
+            total = len(templates) + len(variants) + tier_count
+            print(f"\n=== SUMMARY ===")
+            print(f"Templates: {len(templates)}")
+            print(f"Variants: {len(variants)}")
+            print(f"Price tiers: {tier_count}")
+            print(f"Loaded {total} rows in {elapsed:.2f}s ({total / elapsed:,.0f} rows/s)")
+        finally:
+            loader.rollback()
+            print("Rolled back")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--check" in sys.argv:
+        rows = 100_000
+        if "--rows" in sys.argv:
+            rows = int(sys.argv[sys.argv.index("--rows") + 1])
+        check(rows)
+    else:
+        print(__doc__)
@@ -0,0 +1,313 @@
+"""
+Export the catalog as marketplace / ads product feeds.
+
+Walks product_variants with keyset pagination (id > last id, one page of
+variants with their template, size and category embedded, plus paged
+queries for the page's images) and streams each item straight into
+gzip-compressed feeds, so the catalog is never held in memory:
+
+    public/feeds/products.xml.gz        Google Merchant RSS 2.0 (g: namespace)
+    public/feeds/products.csv.gz        same items, prices with and without VAT
+    public/feeds/products-delta.xml.gz  only items changed since the last export
+    public/feeds/products-delta.csv.gz
+
+Changes are detected with a CRC32 of each item's feed fields, kept per
+variant id in .cache/catalog/feed_state.json, so template edits (name,
+description) and image changes show up in the delta too. Items that
+disappeared (deleted or deactivated) are sent in the delta as out_of_stock.
+Feeds are written to temporary files and renamed when complete.
+
+Usage:
+    python scripts/product_feed.py [--full] [--output DIR]
+"""
+
+import csv
+import gzip
+import json
+import os
+import time
+import zlib
+from xml.sax.saxutils import escape
+
+from catalog_snapshot import CACHE_DIR
+
+OUTPUT_DIR = os.path.join("public", "feeds")
+STATE_FILE = os.path.join(CACHE_DIR, "feed_state.json")
+DEFAULT_SITE_URL = "https://jocril-store.vercel.app"
+PAGE_SIZE = 1000
+ID_BATCH_SIZE = 200  # Ids per .in_() filter (URL length)
+MAX_ADDITIONAL_IMAGES = 10
+BRAND = "Jocril"
+CURRENCY = "EUR"
+
+VARIANT_COLUMNS = (
+    "id, sku, url_slug, base_price_excluding_vat, base_price_including_vat, "
+    "stock_status, main_image_url, barcode, weight_grams, is_active, "
+    "size_formats(name), "
+    "product_templates(id, name, short_description, is_active, categories(name))"
+)
+
+# Feed fields, in CSV column order
+FIELDS = [
+    "id",
+    "item_group_id",
+    "title",
+    "description",
+    "link",
+    "image_link",
+    "additional_image_link",
+    "availability",
+    "price",
+    "price_excluding_vat",
+    "brand",
+    "mpn",
+    "gtin",
+    "condition",
+    "product_type",
+    "size",
+    "shipping_weight",
+]
+AVAILABILITY = {
+    "in_stock": "in_stock",
+    "low_stock": "in_stock",
+    "out_of_stock": "out_of_stock",
+    "discontinued": "out_of_stock",
+}
+
+
+def site_url() -> str:
+    from dotenv import load_dotenv
+
+    load_dotenv(".env.local")
+    return (os.getenv("NEXT_PUBLIC_SITE_URL") or DEFAULT_SITE_URL).rstrip("/")
+
+
+def stream_variants(supabase):
+    """Yield (page of variants with template etc., {variant_id: [image_url]})."""
+    last_id = 0
+    while True:
+        page = (
+            supabase.table("product_variants")
+            .select(VARIANT_COLUMNS)
+            .gt("id", last_id)
+            .order("id")
+            .limit(PAGE_SIZE)
+            .execute()
+            .data
+        )
+        if not page:
+            return
+        last_id = page[-1]["id"]
+
+        yield page, fetch_images(supabase, [v["id"] for v in page])
+        if len(page) < PAGE_SIZE:
+            return
+
+
+def fetch_images(supabase, variant_ids: list) -> dict:
+    """{variant_id: [image_url]} in display order, ID_BATCH_SIZE ids per
+    request and paged (a batch can have more than PAGE_SIZE images)."""
+    images = {}
+    for i in range(0, len(variant_ids), ID_BATCH_SIZE):
+        batch = variant_ids[i : i + ID_BATCH_SIZE]
+        start = 0
+        while True:
+            rows = (
+                supabase.table("product_images")
+                .select("id, product_variant_id, image_url, display_order")
+                .in_("product_variant_id", batch)
+                .order("display_order")
+                .order("id")
+                .range(start, start + PAGE_SIZE - 1)
+                .execute()
+                .data
+            )
+            for image in rows:
+                images.setdefault(image["product_variant_id"], []).append(
+                    image["image_url"]
+                )
+            if len(rows) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+    return images
+
+
+def feed_item(variant: dict, images: list, base_url: str) -> dict | None:
+    """Feed fields of an active variant (None when it is not for sale)."""
+    template = variant.get("product_templates") or {}
+    if variant.get("is_active") is False or template.get("is_active") is False:
+        return None
+    price = float(variant.get("base_price_including_vat") or 0)
+    if price <= 0:
+        return None
+
+    size = (variant.get("size_formats") or {}).get("name") or ""
+    title = template.get("name") or variant["sku"]
+    main_image = variant.get("main_image_url") or (images[0] if images else "")
+    extra_images = [i for i in images if i != main_image][:MAX_ADDITIONAL_IMAGES]
+    weight = variant.get("weight_grams")
+    return {
+        "id": variant["sku"],
+        "item_group_id": str(template.get("id") or ""),
+        "title": f"{title} - {size}" if size else title,
+        "description": template.get("short_description") or title,
+        "link": f"{base_url}/produtos/{variant['url_slug']}",
+        "image_link": absolute_url(main_image, base_url),
+        "additional_image_link": ",".join(absolute_url(i, base_url) for i in extra_images),
+        "availability": AVAILABILITY.get(variant.get("stock_status"), "in_stock"),
+        "price": f"{price:.2f} {CURRENCY}",
+        "price_excluding_vat": f"{float(variant.get('base_price_excluding_vat') or 0):.2f} {CURRENCY}",
+        "brand": BRAND,
+        "mpn": variant["sku"],
+        "gtin": variant.get("barcode") or "",
+        "condition": "new",
+        "product_type": ((template.get("categories") or {}).get("name")) or "",
+        "size": size,
+        "shipping_weight": f"{weight} g" if weight else "",
+    }
+
+
+def absolute_url(url: str, base_url: str) -> str:
+    if not url or url.startswith(("http://", "https://")):
+        return url or ""
+    return f"{base_url}/{url.lstrip('/')}"
+
+
+def item_hash(item: dict) -> int:
+    return zlib.crc32("\x1f".join(item[f] for f in FIELDS).encode("utf-8"))
+
+
+class FeedWriter:
+    """Gzip-compressed XML + CSV pair written through temporary files."""
+
+    def __init__(self, directory: str, name: str, base_url: str):
+        self.paths = [
+            os.path.join(directory, f"{name}.xml.gz"),
+            os.path.join(directory, f"{name}.csv.gz"),
+        ]
+        os.makedirs(directory, exist_ok=True)
+        self.xml = gzip.open(self.paths[0] + ".tmp", "wt", encoding="utf-8")
+        self.csv_file = gzip.open(self.paths[1] + ".tmp", "wt", encoding="utf-8", newline="")
+        self.csv = csv.writer(self.csv_file)
+        self.count = 0
+
+        self.csv.writerow(FIELDS)
+        self.xml.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<rss version="2.0" xmlns:g="http://base.google.com/ns/1.0">\n<channel>\n'
+            f"<title>{BRAND}</title>\n<link>{escape(base_url)}</link>\n"
+            f"<description>{BRAND} product feed</description>\n"
+        )
+
+    def write(self, item: dict):
+        self.csv.writerow([item[f] for f in FIELDS])
+        parts = ["<item>"]
+        for field in FIELDS:
+            if field == "price_excluding_vat" or not item[field]:
+                continue
+            if field == "additional_image_link":
+                parts.extend(
+                    f"<g:additional_image_link>{escape(url)}</g:additional_image_link>"
+                    for url in item[field].split(",")
+                )
+            else:
+                parts.append(f"<g:{field}>{escape(item[field])}</g:{field}>")
+        parts.append("</item>\n")
+        self.xml.write("".join(parts))
+        self.count += 1
+
+    def close(self, keep: bool = True):
+        """Finish and publish the feeds, or drop them (keep=False)."""
+        self.xml.write("</channel>\n</rss>\n")
+        self.xml.close()
+        self.csv_file.close()
+        for path in self.paths:
+            if keep:
+                os.replace(path + ".tmp", path)
+            else:
+                os.remove(path + ".tmp")
+
+
+def load_state(full: bool = False) -> dict:
+    if full or not os.path.exists(STATE_FILE):
+        return {"hashes": {}, "skus": {}}
+    with open(STATE_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state: dict):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp_file = STATE_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f, separators=(",", ":"))
+    os.replace(tmp_file, STATE_FILE)
+
+
+def removed_item(sku: str) -> dict:
+    item = dict.fromkeys(FIELDS, "")
+    item.update(id=sku, availability="out_of_stock", condition="new", brand=BRAND)
+    return item
+
+
+def main(full: bool = False, output_dir: str = OUTPUT_DIR):
+    from catalog_client import get_client
+
+    supabase = get_client()
+    base_url = site_url()
+    state = load_state(full)
+    previous = state["hashes"]
+    current = {}
+    skus = state["skus"]
+
+    start = time.perf_counter()
+    feed = FeedWriter(output_dir, "products", base_url)
+    delta = FeedWriter(output_dir, "products-delta", base_url)
+    skipped = 0
+    completed = False
+    try:
+        for page, images in stream_variants(supabase):
+            for variant in page:
+                item = feed_item(variant, images.get(variant["id"], []), base_url)
+                if item is None:
+                    skipped += 1
+                    continue
+                key = str(variant["id"])
+                current[key] = item_hash(item)
+                skus[key] = item["id"]
+                feed.write(item)
+                if previous.get(key) != current[key]:
+                    delta.write(item)
+        changed = delta.count
+
+        removed = [key for key in previous if key not in current]
+        for key in removed:
+            delta.write(removed_item(skus.get(key, key)))
+        completed = True
+    finally:
+        # A failed run leaves the previous feeds in place
+        feed.close(keep=completed)
+        delta.close(keep=completed)
+
+    state = {
+        "hashes": current,
+        "skus": {k: skus[k] for k in current},
+        "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    save_state(state)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n=== SUMMARY ===")
+    print(f"Items exported: {feed.count} ({skipped} inactive/unpriced skipped)")
+    print(f"Delta: {changed} new/changed, {len(removed)} removed")
+    for path in feed.paths + delta.paths:
+        print(f"  {path} ({os.path.getsize(path):,} bytes)")
+    print(f"Time: {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    import sys
+
+    output_dir = OUTPUT_DIR
+    if "--output" in sys.argv:
+        output_dir = sys.argv[sys.argv.index("--output") + 1]
+    main(full="--full" in sys.argv, output_dir=output_dir)
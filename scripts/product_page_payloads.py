@@ -0,0 +1,348 @@
+"""
+Materialize product page payloads, one per variant url_slug.
+
+A payload holds exactly the props app/(site)/produtos/[slug]/page.tsx
+assembles from six queries: the variant with its template (+ category) and
+size format, the template's active variants with their size formats, price
+tiers by variant, the variant's images and the template images. Payloads go
+to product_page_payloads (url_slug -> JSONB) or, with --output DIR, to
+static DIR/<url_slug>.json files.
+
+Runs are incremental. Rows of the source tables changed since the stored
+per-table watermark (updated_at; created_at for product_images, which are
+only ever inserted) are traced back to their templates (through variants,
+size formats and categories). Only those templates are re-read, and only
+payloads whose content hash changed are written; url_slugs that are no
+longer active are removed (a slug whose variant moved to another template
+is handed over, not removed). Pure deletions of tiers or images without any
+other change are picked up by --full, which also prunes payloads of
+deleted templates.
+
+Usage:
+    python scripts/product_page_payloads.py [--full] [--dry-run] [--output DIR]
+"""
+
+import hashlib
+import json
+import os
+
+from catalog_snapshot import CACHE_DIR
+
+STATE_FILE = os.path.join(CACHE_DIR, "page_payloads.json")
+PAGE_SIZE = 1000
+ID_BATCH_SIZE = 200
+TEMPLATE_BATCH_SIZE = 100
+UPSERT_BATCH_SIZE = 200
+
+# Source table -> (column that changes, column pointing towards the template)
+SOURCE_TABLES = {
+    "product_templates": ("updated_at", "id"),
+    "product_variants": ("updated_at", "product_template_id"),
+    "price_tiers": ("updated_at", "product_variant_id"),
+    "product_images": ("created_at", "product_variant_id"),
+    "product_template_images": ("updated_at", "product_template_id"),
+    "size_formats": ("updated_at", "id"),
+    "categories": ("updated_at", "id"),
+}
+# Not rendered by the page
+DROPPED_TEMPLATE_COLUMNS = ("search_vector",)
+
+
+def load_state(full: bool = False) -> dict:
+    if full or not os.path.exists(STATE_FILE):
+        return {"watermarks": {}, "hashes": {}, "slugs": {}}
+    with open(STATE_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state: dict):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp_file = STATE_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_file, STATE_FILE)
+
+
+def fetch_all(query_factory, order: str = "id") -> list:
+    rows = []
+    start = 0
+    while True:
+        page = (
+            query_factory().order(order).range(start, start + PAGE_SIZE - 1).execute().data
+        )
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+
+def fetch_in(supabase, table: str, columns: str, key: str, values) -> list:
+    """Rows whose `key` is in values, ID_BATCH_SIZE values per request."""
+    values = sorted(set(values))
+    rows = []
+    for i in range(0, len(values), ID_BATCH_SIZE):
+        batch = values[i : i + ID_BATCH_SIZE]
+        rows.extend(fetch_all(lambda: supabase.table(table).select(columns).in_(key, batch)))
+    return rows
+
+
+def newest_timestamp(supabase, table: str) -> str | None:
+    timestamp, _ = SOURCE_TABLES[table]
+    rows = (
+        supabase.table(table)
+        .select(timestamp)
+        .order(timestamp, desc=True)
+        .limit(1)
+        .execute()
+        .data
+    )
+    return rows[0][timestamp] if rows else None
+
+
+def changed_keys(supabase, table: str, since: str) -> tuple:
+    """(set of template-side keys of rows changed at/after since, newest timestamp)"""
+    timestamp, key = SOURCE_TABLES[table]
+    columns = "id" if key == "id" else f"id, {key}"
+    rows = fetch_all(
+        lambda: supabase.table(table).select(f"{columns}, {timestamp}").gte(timestamp, since)
+    )
+    newest = max((r[timestamp] for r in rows if r.get(timestamp)), default=since)
+    return {r[key] for r in rows}, newest
+
+
+def changed_templates(supabase, watermarks: dict) -> tuple:
+    """(template ids to rebuild, new watermarks); every template on a first run."""
+    if any(table not in watermarks for table in SOURCE_TABLES):
+        newest = {table: newest_timestamp(supabase, table) for table in SOURCE_TABLES}
+        templates = fetch_all(lambda: supabase.table("product_templates").select("id"))
+        return {t["id"] for t in templates}, newest
+
+    keys = {}
+    newest = {}
+    for table in SOURCE_TABLES:
+        if watermarks[table] is None:
+            # Table was empty: everything in it is new
+            watermarks[table] = "1970-01-01"
+        keys[table], newest[table] = changed_keys(supabase, table, watermarks[table])
+
+    templates = set(keys["product_templates"]) | keys["product_variants"]
+    templates |= keys["product_template_images"]
+
+    variant_ids = keys["price_tiers"] | keys["product_images"]
+    templates |= {
+        v["product_template_id"]
+        for v in fetch_in(supabase, "product_variants", "id, product_template_id", "id", variant_ids)
+    }
+    templates |= {
+        v["product_template_id"]
+        for v in fetch_in(
+            supabase,
+            "product_variants",
+            "id, product_template_id",
+            "size_format_id",
+            keys["size_formats"],
+        )
+    }
+    templates |= {
+        t["id"]
+        for t in fetch_in(supabase, "product_templates", "id", "category_id", keys["categories"])
+    }
+    return templates, newest
+
+
+def build_payloads(supabase, template_ids: list) -> dict:
+    """{template_id: {url_slug: payload}} for the given templates."""
+    templates = {
+        t["id"]: t
+        for t in fetch_in(supabase, "product_templates", "*, categories(*)", "id", template_ids)
+    }
+    variants = [
+        v
+        for v in fetch_in(
+            supabase, "product_variants", "*, size_formats(*)", "product_template_id", template_ids
+        )
+        if v.get("is_active")
+    ]
+    variant_ids = [v["id"] for v in variants]
+    tiers = fetch_in(supabase, "price_tiers", "*", "product_variant_id", variant_ids)
+    images = fetch_in(supabase, "product_images", "*", "product_variant_id", variant_ids)
+    template_images = fetch_in(
+        supabase, "product_template_images", "*", "product_template_id", template_ids
+    )
+
+    variants_by_template = {}
+    for v in variants:
+        variants_by_template.setdefault(v["product_template_id"], []).append(v)
+    tiers_by_variant = {}
+    for t in sorted(tiers, key=lambda t: t["min_quantity"]):
+        tiers_by_variant.setdefault(t["product_variant_id"], []).append(t)
+    images_by_variant = {}
+    for i in sorted(images, key=lambda i: (i.get("display_order") or 0, i["id"])):
+        images_by_variant.setdefault(i["product_variant_id"], []).append(i)
+    images_by_template = {}
+    for i in sorted(
+        template_images, key=lambda i: (i["image_type"], i.get("display_order") or 0, i["id"])
+    ):
+        images_by_template.setdefault(i["product_template_id"], []).append(i)
+
+    payloads = {}
+    for template_id in template_ids:
+        template = templates.get(template_id)
+        siblings = variants_by_template.get(template_id, [])
+        if template is None or not siblings:
+            payloads[template_id] = {}
+            continue
+        template = {k: v for k, v in template.items() if k not in DROPPED_TEMPLATE_COLUMNS}
+        siblings.sort(
+            key=lambda v: ((v.get("size_formats") or {}).get("display_order") or 0, v["id"])
+        )
+        tiers_of_template = {
+            str(v["id"]): tiers_by_variant[v["id"]]
+            for v in siblings
+            if v["id"] in tiers_by_variant
+        }
+        payloads[template_id] = {
+            v["url_slug"]: {
+                "currentVariant": {**v, "product_templates": template},
+                "allVariants": siblings,
+                "priceTiersByVariant": tiers_of_template,
+                "images": images_by_variant.get(v["id"], []),
+                "templateImages": images_by_template.get(template_id, []),
+            }
+            for v in siblings
+        }
+    return payloads
+
+
+def payload_hash(payload: dict) -> str:
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(encoded.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def write_payloads(supabase, rows: list, removed: list, output_dir: str | None):
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        for row in rows:
+            path = os.path.join(output_dir, f"{row['url_slug']}.json")
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(row["payload"], f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(path + ".tmp", path)
+        for url_slug in removed:
+            path = os.path.join(output_dir, f"{url_slug}.json")
+            if os.path.exists(path):
+                os.remove(path)
+        return
+
+    for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+        supabase.table("product_page_payloads").upsert(
+            rows[i : i + UPSERT_BATCH_SIZE], on_conflict="url_slug"
+        ).execute()
+    for i in range(0, len(removed), ID_BATCH_SIZE):
+        supabase.table("product_page_payloads").delete().in_(
+            "url_slug", removed[i : i + ID_BATCH_SIZE]
+        ).execute()
+
+
+def stored_slugs(supabase, output_dir: str | None) -> set:
+    """url_slugs currently published in the target."""
+    if output_dir:
+        if not os.path.isdir(output_dir):
+            return set()
+        return {name[:-5] for name in os.listdir(output_dir) if name.endswith(".json")}
+    return {
+        r["url_slug"]
+        for r in fetch_all(
+            lambda: supabase.table("product_page_payloads").select("url_slug"),
+            order="url_slug",
+        )
+    }
+
+
+def main(full: bool = False, dry_run: bool = False, output_dir: str | None = None):
+    from catalog_client import get_client
+
+    supabase = get_client()
+    state = load_state(full)
+    template_ids, watermarks = changed_templates(supabase, state["watermarks"])
+    template_ids = sorted(template_ids)
+    print(f"Templates to rebuild: {len(template_ids)}")
+
+    # url_slug -> template key listing it; a slug moves with its variant
+    owner = {slug: key for key, slugs in state["slugs"].items() for slug in slugs}
+    written = 0
+    removed = []
+    unchanged = 0
+    for i in range(0, len(template_ids), TEMPLATE_BATCH_SIZE):
+        batch = template_ids[i : i + TEMPLATE_BATCH_SIZE]
+        rows = []
+        batch_removed = []
+        for template_id, payloads in build_payloads(supabase, batch).items():
+            key = str(template_id)
+            for url_slug in state["slugs"].get(key, []):
+                if url_slug not in payloads and owner.get(url_slug) == key:
+                    batch_removed.append(url_slug)
+                    state["hashes"].pop(url_slug, None)
+                    owner.pop(url_slug)
+            for url_slug in payloads:
+                previous = owner.get(url_slug)
+                if previous is not None and previous != key:
+                    # Reassigned: the old template must not delete it later
+                    slugs = [s for s in state["slugs"].get(previous, []) if s != url_slug]
+                    if slugs:
+                        state["slugs"][previous] = slugs
+                    else:
+                        state["slugs"].pop(previous, None)
+                owner[url_slug] = key
+            for url_slug, payload in payloads.items():
+                digest = payload_hash(payload)
+                if state["hashes"].get(url_slug) == digest:
+                    unchanged += 1
+                    continue
+                state["hashes"][url_slug] = digest
+                rows.append(
+                    {
+                        "url_slug": url_slug,
+                        "product_template_id": template_id,
+                        "payload": payload,
+                        "payload_hash": digest,
+                    }
+                )
+            if payloads:
+                state["slugs"][key] = sorted(payloads)
+            else:
+                state["slugs"].pop(key, None)
+        # Dropped by one template of the batch but claimed by another
+        batch_removed = [s for s in batch_removed if s not in owner]
+
+        if not dry_run:
+            write_payloads(supabase, rows, batch_removed, output_dir)
+        written += len(rows)
+        removed.extend(batch_removed)
+        print(f"  ► {min(i + TEMPLATE_BATCH_SIZE, len(template_ids))}/{len(template_ids)} templates")
+
+    if full:
+        # The state was reset, so deleted templates are only found by listing
+        stale = sorted(stored_slugs(supabase, output_dir) - set(state["hashes"]))
+        if not dry_run:
+            write_payloads(supabase, [], stale, output_dir)
+        removed.extend(stale)
+
+    if not dry_run:
+        state["watermarks"] = watermarks
+        save_state(state)
+
+    print(f"\n=== SUMMARY ===")
+    print(f"Templates rebuilt: {len(template_ids)}")
+    print(f"{'Would write' if dry_run else 'Written'} payloads: {written}")
+    print(f"Unchanged payloads: {unchanged}")
+    print(f"{'Would remove' if dry_run else 'Removed'} payloads: {len(removed)}")
+    print(f"Target: {output_dir or 'product_page_payloads'}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    output_dir = None
+    if "--output" in sys.argv:
+        output_dir = sys.argv[sys.argv.index("--output") + 1]
+    main(full="--full" in sys.argv, dry_run="--dry-run" in sys.argv, output_dir=output_dir)
@@ -0,0 +1,390 @@
+"""
+Compiled shipping quote engine.
+
+Evaluates the same table-rate rules as fn_calculate_shipping (shipping_zones,
+shipping_classes, shipping_rates, shipping_settings) in process, so thousands
+of carts or orders can be quoted per call without a database round trip each:
+recalculating historical shipping costs, load-testing checkout pricing.
+
+The active rules are compiled once into sorted interval lookups (postal code
+-> zone, billable weight -> class -> rate band) plus each zone's free shipping
+threshold. They are cached in .cache/catalog/shipping_rules.json and reused
+while the row count and newest updated_at of every rule table are unchanged.
+
+Usage:
+    python scripts/shipping_quotes.py --orders [N]      # re-quote the last N orders
+    python scripts/shipping_quotes.py --benchmark [N]   # quote N synthetic carts
+"""
+
+import json
+import os
+import re
+import time
+from bisect import bisect_left, bisect_right
+
+from catalog_snapshot import CACHE_DIR
+
+CACHE_FILE = os.path.join(CACHE_DIR, "shipping_rules.json")
+RULE_TABLES = ["shipping_zones", "shipping_classes", "shipping_rates", "shipping_settings"]
+DEFAULT_VOLUMETRIC_DIVISOR = 4000
+CHECK_INTERVAL_SECONDS = 60  # get_engine() re-checks updated_at at most this often
+ID_BATCH_SIZE = 200
+PAGE_SIZE = 1000
+
+# Error messages returned by fn_calculate_shipping
+ERROR_POSTAL_CODE = "Código postal inválido. Use o formato português (XXXX-XXX ou XXXX)."
+ERROR_ZONE = "Zona de envio não encontrada para este código postal."
+ERROR_CLASS = "Nenhuma classe de envio disponível."
+ERROR_RATE = "Não foi possível calcular o envio para esta zona."
+
+_NON_DIGITS = re.compile(r"[^0-9]")
+
+
+def postal_prefix(postal_code: str | None) -> int | None:
+    """First four digits of a Portuguese postal code ("1000-001" -> 1000)."""
+    if postal_code is None or len(postal_code.strip()) < 4:
+        return None
+    digits = _NON_DIGITS.sub("", postal_code)
+    return int(digits[:4]) if digits else None
+
+
+class ShippingEngine:
+    """Active shipping rules compiled into interval lookups."""
+
+    def __init__(self, rows: dict):
+        active = {
+            table: [r for r in rows.get(table, []) if r.get("is_active", True) is not False]
+            for table in RULE_TABLES
+        }
+        settings = {r["setting_key"]: r["setting_value"] for r in active["shipping_settings"]}
+        self.volumetric_divisor = int(
+            settings.get("volumetric_divisor") or DEFAULT_VOLUMETRIC_DIVISOR
+        )
+
+        # Zones: first match in id order wins, like the LIMIT 1 in SQL
+        zones = sorted(active["shipping_zones"], key=lambda z: z["id"])
+        self.zones = zones
+
+        self.classes = sorted(active["shipping_classes"], key=lambda c: c["max_weight_grams"])
+        self.class_limits = [c["max_weight_grams"] for c in self.classes]
+
+        # (zone_id, class_id) -> rate bands sorted by min weight
+        self.rates = {}
+        for rate in sorted(active["shipping_rates"], key=lambda r: r["min_weight_grams"]):
+            self.rates.setdefault((rate["zone_id"], rate["class_id"]), []).append(rate)
+        self.rate_starts = {
+            key: [r["min_weight_grams"] for r in bands] for key, bands in self.rates.items()
+        }
+        self._zone_cache = {}  # postal prefix -> zone (at most 10000 entries)
+
+    def zone_for(self, postal_code: str | None) -> dict | None:
+        prefix = postal_prefix(postal_code)
+        if prefix is None:
+            return None
+        if prefix not in self._zone_cache:
+            self._zone_cache[prefix] = next(
+                (
+                    z
+                    for z in self.zones
+                    if z["postal_code_start"] <= prefix <= z["postal_code_end"]
+                ),
+                None,
+            )
+        return self._zone_cache[prefix]
+
+    def class_for(self, weight_grams: int) -> dict | None:
+        """Lightest class that carries the weight, else the heaviest one."""
+        if not self.classes:
+            return None
+        i = bisect_left(self.class_limits, weight_grams)
+        return self.classes[i] if i < len(self.classes) else self.classes[-1]
+
+    def rate_for(self, zone_id: int, class_id: int, weight_grams: int) -> dict | None:
+        """Rate band containing the weight, else the band with the highest max."""
+        bands = self.rates.get((zone_id, class_id))
+        if not bands:
+            return None
+        i = bisect_right(self.rate_starts[(zone_id, class_id)], weight_grams) - 1
+        if i >= 0 and weight_grams <= bands[i]["max_weight_grams"]:
+            return bands[i]
+        return max(bands, key=lambda r: r["max_weight_grams"])
+
+    def volumetric_grams(self, length_mm, width_mm, height_mm) -> int:
+        """ceil(cm³ / divisor) in grams; mm³ / divisor is the same number."""
+        volume = length_mm * width_mm * height_mm
+        return -(-volume // self.volumetric_divisor)
+
+    def item_weights(self, variant: dict) -> tuple:
+        """(actual grams, volumetric grams) of one unit."""
+        dimensions = (variant.get("length_mm"), variant.get("width_mm"), variant.get("height_mm"))
+        volumetric = 0 if None in dimensions else self.volumetric_grams(*dimensions)
+        return variant.get("weight_grams") or 0, volumetric
+
+    def quote(self, items: list, postal_code: str, variants: dict, subtotal_cents: int | None = None) -> dict:
+        """fn_calculate_shipping result for [{variant_id, quantity}].
+
+        variants maps variant_id -> weight/dimension row; unknown variants are
+        ignored like in SQL. With subtotal_cents, shipping_cost_cents is 0
+        when the zone's free shipping threshold is reached (as the checkout
+        applies it).
+        """
+        if postal_prefix(postal_code) is None:
+            return {"success": False, "error": ERROR_POSTAL_CODE}
+        zone = self.zone_for(postal_code)
+        if zone is None:
+            return {"success": False, "error": ERROR_ZONE}
+
+        actual = volumetric = 0
+        for item in items:
+            variant = variants.get(item["variant_id"])
+            if variant is None:
+                continue
+            unit_actual, unit_volumetric = self.item_weights(variant)
+            actual += unit_actual * item["quantity"]
+            volumetric += unit_volumetric * item["quantity"]
+        billable = max(actual, volumetric)
+
+        shipping_class = self.class_for(billable)
+        if shipping_class is None:
+            return {"success": False, "error": ERROR_CLASS}
+        rate = self.rate_for(zone["id"], shipping_class["id"], billable)
+        if rate is None:
+            return {"success": False, "error": ERROR_RATE}
+
+        cost = rate["base_rate_cents"]
+        if billable > rate["max_weight_grams"] and rate["extra_kg_rate_cents"] > 0:
+            extra_kg = -(-(billable - rate["max_weight_grams"]) // 1000)
+            cost += extra_kg * rate["extra_kg_rate_cents"]
+
+        threshold = zone.get("free_shipping_threshold_cents")
+        if subtotal_cents is not None and threshold and subtotal_cents >= threshold:
+            cost = 0
+
+        return {
+            "success": True,
+            "zone_code": zone["code"],
+            "zone_name": zone["name"],
+            "shipping_class_code": shipping_class["code"],
+            "shipping_class_name": shipping_class["name"],
+            "carrier_name": shipping_class["carrier_name"],
+            "actual_weight_grams": actual,
+            "volumetric_weight_grams": volumetric,
+            "billable_weight_grams": billable,
+            "shipping_cost_cents": cost,
+            "free_shipping_threshold_cents": threshold,
+            "is_free_shipping": threshold is not None,
+            "estimated_days_min": rate["estimated_days_min"],
+            "estimated_days_max": rate["estimated_days_max"],
+        }
+
+    def quote_many(self, carts: list, variants: dict) -> list:
+        """Quote [{items, postal_code, subtotal_cents?}, ...] in one call."""
+        return [
+            self.quote(c["items"], c["postal_code"], variants, c.get("subtotal_cents"))
+            for c in carts
+        ]
+
+
+def rules_fingerprint(supabase) -> dict:
+    """{table: [row count, newest updated_at]}; changes on insert/update/delete."""
+    fingerprint = {}
+    for table in RULE_TABLES:
+        result = (
+            supabase.table(table)
+            .select("updated_at", count="exact")
+            .order("updated_at", desc=True)
+            .limit(1)
+            .execute()
+        )
+        newest = result.data[0]["updated_at"] if result.data else None
+        fingerprint[table] = [result.count, newest]
+    return fingerprint
+
+
+def load_rules(supabase) -> dict:
+    """Rule rows from the cache file, re-downloaded when a table changed."""
+    fingerprint = rules_fingerprint(supabase)
+    if os.path.exists(CACHE_FILE):
+        with open(CACHE_FILE, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("fingerprint") == fingerprint:
+            return cached["rows"]
+
+    rows = {table: supabase.table(table).select("*").execute().data for table in RULE_TABLES}
+    os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+    tmp_file = CACHE_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, "rows": rows}, f, ensure_ascii=False)
+    os.replace(tmp_file, CACHE_FILE)
+    return rows
+
+
+_engine = None
+_checked_at = 0.0
+_engine_fingerprint = None
+
+
+def get_engine(supabase=None) -> ShippingEngine:
+    """Process-wide engine, recompiled when the rules changed."""
+    global _engine, _checked_at, _engine_fingerprint
+
+    if _engine is not None and time.monotonic() - _checked_at < CHECK_INTERVAL_SECONDS:
+        return _engine
+    if supabase is None:
+        from catalog_client import get_client
+
+        supabase = get_client()
+    rows = load_rules(supabase)
+    fingerprint = json.dumps(rows, sort_keys=True, default=str)
+    if _engine is None or fingerprint != _engine_fingerprint:
+        _engine = ShippingEngine(rows)
+        _engine_fingerprint = fingerprint
+    _checked_at = time.monotonic()
+    return _engine
+
+
+def fetch_variant_weights(supabase, variant_ids) -> dict:
+    """{variant_id: {weight_grams, length_mm, width_mm, height_mm}}"""
+    variant_ids = sorted(set(variant_ids))
+    variants = {}
+    for i in range(0, len(variant_ids), ID_BATCH_SIZE):
+        for row in (
+            supabase.table("product_variants")
+            .select("id, weight_grams, length_mm, width_mm, height_mm")
+            .in_("id", variant_ids[i : i + ID_BATCH_SIZE])
+            .execute()
+            .data
+        ):
+            variants[row["id"]] = row
+    return variants
+
+
+def fetch_orders(supabase, limit: int) -> list:
+    """Newest orders with their postal code and items."""
+    orders = []
+    last_id = None
+    while len(orders) < limit:
+        query = supabase.table("orders").select(
+            "id, order_number, subtotal_including_vat, shipping_cost_including_vat, "
+            "shipping_addresses(postal_code), order_items(product_variant_id, quantity)"
+        )
+        if last_id is not None:
+            query = query.lt("id", last_id)
+        page = (
+            query.order("id", desc=True)
+            .limit(min(PAGE_SIZE, limit - len(orders)))
+            .execute()
+            .data
+        )
+        orders.extend(page)
+        if len(page) < PAGE_SIZE:
+            break
+        last_id = page[-1]["id"]
+    return orders
+
+
+def requote_orders(supabase, engine: ShippingEngine, limit: int) -> dict:
+    orders = fetch_orders(supabase, limit)
+    carts = [
+        {
+            "items": [
+                {"variant_id": i["product_variant_id"], "quantity": i["quantity"]}
+                for i in o.get("order_items") or []
+            ],
+            "postal_code": (o.get("shipping_addresses") or {}).get("postal_code"),
+            "subtotal_cents": round(float(o.get("subtotal_including_vat") or 0) * 100),
+        }
+        for o in orders
+    ]
+    variants = fetch_variant_weights(
+        supabase, (i["variant_id"] for c in carts for i in c["items"])
+    )
+
+    start = time.perf_counter()
+    quotes = engine.quote_many(carts, variants)
+    elapsed = time.perf_counter() - start
+
+    differences = []
+    for order, quote in zip(orders, quotes):
+        charged = round(float(order.get("shipping_cost_including_vat") or 0) * 100)
+        if quote["success"] and quote["shipping_cost_cents"] != charged:
+            differences.append((order["order_number"], charged, quote["shipping_cost_cents"]))
+    return {
+        "quoted": len(quotes),
+        "failed": sum(1 for q in quotes if not q["success"]),
+        "differences": differences,
+        "seconds": elapsed,
+    }
+
+
+def synthetic_carts(engine: ShippingEngine, variant_ids: list, count: int, seed: int = 7) -> list:
+    import random
+
+    rng = random.Random(seed)
+    postal_codes = [
+        f"{rng.randint(z['postal_code_start'], z['postal_code_end'])}-{rng.randint(0, 999):03d}"
+        for z in engine.zones
+        for _ in range(20)
+    ] or ["1000-001"]
+    return [
+        {
+            "items": [
+                {"variant_id": rng.choice(variant_ids), "quantity": rng.randint(1, 50)}
+                for _ in range(rng.randint(1, 8))
+            ],
+            "postal_code": rng.choice(postal_codes),
+            "subtotal_cents": rng.randint(500, 150_000),
+        }
+        for _ in range(count)
+    ]
+
+
+def main(orders: int | None = None, benchmark: int | None = None):
+    from catalog_client import get_client
+
+    supabase = get_client()
+    engine = get_engine(supabase)
+    print(
+        f"Rules: {len(engine.zones)} zones, {len(engine.classes)} classes, "
+        f"{sum(len(b) for b in engine.rates.values())} rates"
+    )
+
+    print(f"\n=== SUMMARY ===")
+    if orders:
+        result = requote_orders(supabase, engine, orders)
+        print(f"Orders re-quoted: {result['quoted']} in {result['seconds'] * 1000:.1f} ms")
+        print(f"Could not be quoted: {result['failed']}")
+        print(f"Charged differently than current rules: {len(result['differences'])}")
+        for number, charged, quoted in result["differences"][:20]:
+            print(f"  {number}: charged {charged / 100:.2f}€, rules now {quoted / 100:.2f}€")
+
+    if benchmark:
+        rows = (
+            supabase.table("product_variants")
+            .select("id, weight_grams, length_mm, width_mm, height_mm")
+            .limit(PAGE_SIZE)
+            .execute()
+            .data
+        )
+        variants = {r["id"]: r for r in rows}
+        carts = synthetic_carts(engine, list(variants) or [0], benchmark)
+        start = time.perf_counter()
+        quotes = engine.quote_many(carts, variants)
+        elapsed = time.perf_counter() - start
+        print(
+            f"Synthetic carts quoted: {len(quotes)} in {elapsed * 1000:.1f} ms "
+            f"({elapsed / len(quotes) * 1e6:.1f} µs/cart)"
+        )
+
+
+def _count_arg(flag: str, default: int):
+    import sys
+
+    if flag not in sys.argv:
+        return None
+    i = sys.argv.index(flag) + 1
+    return int(sys.argv[i]) if i < len(sys.argv) and sys.argv[i].isdigit() else default
+
+
+if __name__ == "__main__":
+    main(orders=_count_arg("--orders", 1000), benchmark=_count_arg("--benchmark", 10_000))
@@ -0,0 +1,344 @@
+"""
+Fill related_products (relation_type 'similar') by content similarity.
+
+Every active template becomes a TF-IDF vector over its Portuguese text
+(name weighted NAME_WEIGHT times, short/full description, advantages),
+tokenized like the search index (unaccented, stopwords and plurals
+stripped, see build_search_index.tokenize). Similarity is the cosine of
+[text, category, size format] feature vectors weighted TEXT_WEIGHT /
+CATEGORY_WEIGHT / SIZE_WEIGHT. Variants of a template share its text, so
+the text + category part is computed once per template pair, as sparse x
+sparse products in blocks of BLOCK_SIZE templates with the top candidates
+taken by argpartition; the size format is then matched per variant (each
+variant is related to the variant of the neighbouring template with the
+same size format when there is one).
+
+Each active variant gets its TOP_K most similar variants of other
+templates. Pairs that already have a hand-made relation (accessory,
+upgrade, alternative) are left alone. Only pairs that are new or moved in
+the ranking are upserted, and pairs that dropped out are deleted; the
+published pairs are kept in .cache/catalog/similar_products.json (seeded
+from the table on the first run or with --full). An empty result never
+replaces published pairs without --full.
+
+Usage:
+    python scripts/similar_products.py [--full] [--dry-run] [--offline]
+
+Requires numpy and scipy.
+"""
+
+import json
+import os
+
+from build_search_index import tokenize
+from catalog_snapshot import CACHE_DIR, CatalogSnapshot
+
+SNAPSHOT_FILE = os.path.join(CACHE_DIR, "similar_snapshot.sqlite3")
+STATE_FILE = os.path.join(CACHE_DIR, "similar_products.json")
+
+SIMILAR_TABLES = {
+    "product_templates": [
+        "id",
+        "name",
+        "category_id",
+        "short_description",
+        "full_description",
+        "advantages",
+        "is_active",
+        "updated_at",
+    ],
+    "product_variants": [
+        "id",
+        "product_template_id",
+        "size_format_id",
+        "display_order",
+        "is_active",
+        "updated_at",
+    ],
+}
+
+# Term counts per field (the name says most about what a product is)
+NAME_WEIGHT = 3
+TEXT_FIELDS = ("short_description", "full_description", "advantages")
+MIN_DF = 2  # Terms in a single template do not relate anything
+MAX_DF = 0.5  # Terms in more than half of the templates are noise
+
+TEXT_WEIGHT = 0.7
+CATEGORY_WEIGHT = 0.2
+SIZE_WEIGHT = 0.1
+MIN_SIMILARITY = 0.25
+
+TOP_K = 8
+CANDIDATE_TEMPLATES = 3 * TOP_K  # Per template, before size matching
+BLOCK_SIZE = 256  # Templates per block: BLOCK_SIZE x templates float32 scores
+PAGE_SIZE = 1000
+UPSERT_BATCH_SIZE = 500
+
+
+def template_terms(template: dict) -> dict:
+    counts = {}
+    for term in tokenize(template.get("name")):
+        counts[term] = counts.get(term, 0) + NAME_WEIGHT
+    for field in TEXT_FIELDS:
+        for term in tokenize(template.get(field)):
+            counts[term] = counts.get(term, 0) + 1
+    return counts
+
+
+def tfidf_matrix(templates: list):
+    """L2-normalized sublinear TF-IDF rows (CSR, float32), one per template."""
+    import numpy as np
+    from scipy import sparse
+
+    vocabulary = {}
+    rows = []
+    cols = []
+    counts = []
+    for row, template in enumerate(templates):
+        for term, count in template_terms(template).items():
+            rows.append(row)
+            cols.append(vocabulary.setdefault(term, len(vocabulary)))
+            counts.append(count)
+
+    n = len(templates)
+    tf = sparse.csr_matrix(
+        (np.asarray(counts, dtype=np.float32), (rows, cols)),
+        shape=(n, len(vocabulary)),
+    )
+    df = np.bincount(tf.indices, minlength=len(vocabulary))
+    keep = (df >= MIN_DF) & (df <= max(MAX_DF * n, MIN_DF))
+    idf = (np.log((1 + n) / (1 + df)) + 1) * keep
+
+    tf.data = 1 + np.log(tf.data)
+    matrix = (tf @ sparse.diags(idf.astype(np.float32))).tocsr()
+    matrix.eliminate_zeros()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return (sparse.diags((1 / norms).astype(np.float32)) @ matrix).tocsr()
+
+
+def category_codes(templates: list):
+    """Category per template; templates without one match no other."""
+    import numpy as np
+
+    return np.asarray(
+        [
+            t["category_id"] if t.get("category_id") is not None else -1 - i
+            for i, t in enumerate(templates)
+        ],
+        dtype=np.int64,
+    )
+
+
+def nearest_templates(matrix, categories) -> tuple:
+    """(neighbour positions, scores), each templates x k, best first.
+
+    Scores are the text + category part of the weighted cosine; -inf marks
+    padding when there are fewer than k other templates.
+    """
+    import numpy as np
+
+    n = matrix.shape[0]
+    k = min(CANDIDATE_TEMPLATES, n - 1)
+    neighbours = np.zeros((n, max(k, 0)), dtype=np.int32)
+    scores = np.full((n, max(k, 0)), -np.inf, dtype=np.float32)
+    if k <= 0:
+        return neighbours, scores
+
+    transposed = matrix.T.tocsr()
+    for start in range(0, n, BLOCK_SIZE):
+        end = min(start + BLOCK_SIZE, n)
+        block = (matrix[start:end] @ transposed).toarray()
+        block *= TEXT_WEIGHT
+        same_category = categories[start:end, None] == categories[None, :]
+        np.add(block, CATEGORY_WEIGHT, out=block, where=same_category)
+        block[np.arange(end - start), np.arange(start, end)] = -np.inf
+
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        neighbours[start:end] = np.take_along_axis(top, order, axis=1)
+        scores[start:end] = np.take_along_axis(top_scores, order, axis=1)
+    return neighbours, scores
+
+
+def similar_pairs(templates: list, variants: list, excluded: set) -> dict:
+    """{"variant:related": display_order} for every active variant's TOP_K."""
+    import numpy as np
+
+    by_template = {}
+    for v in sorted(variants, key=lambda v: (v.get("display_order") or 0, v["id"])):
+        by_template.setdefault(v["product_template_id"], []).append(v)
+    templates = [t for t in templates if t["id"] in by_template]
+    if not templates:
+        return {}
+
+    # Per template: variant per size format (first by display order)
+    by_size = {}
+    for template_id, template_variants in by_template.items():
+        sizes = by_size[template_id] = {}
+        for v in template_variants:
+            if v.get("size_format_id") is not None:
+                sizes.setdefault(v["size_format_id"], v["id"])
+
+    neighbours, scores = nearest_templates(tfidf_matrix(templates), category_codes(templates))
+    pairs = {}
+    for position, template in enumerate(templates):
+        candidates = [
+            (templates[n]["id"], float(s))
+            for n, s in zip(neighbours[position], scores[position])
+            if np.isfinite(s)
+        ]
+        for variant in by_template[template["id"]]:
+            ranked = []
+            for other_id, score in candidates:
+                match = by_size[other_id].get(variant.get("size_format_id"))
+                if match is None:
+                    match = by_template[other_id][0]["id"]
+                else:
+                    score += SIZE_WEIGHT
+                if score >= MIN_SIMILARITY and (variant["id"], match) not in excluded:
+                    ranked.append((-score, match))
+            ranked.sort()
+            for order, (_, match) in enumerate(ranked[:TOP_K]):
+                pairs[f"{variant['id']}:{match}"] = order
+    return pairs
+
+
+def fetch_relations(supabase, similar: bool) -> list:
+    """related_products rows of type 'similar' (or of every other type)."""
+    rows = []
+    start = 0
+    while True:
+        query = supabase.table("related_products").select(
+            "product_variant_id, related_variant_id, display_order"
+        )
+        if similar:
+            query = query.eq("relation_type", "similar")
+        else:
+            query = query.neq("relation_type", "similar")
+        page = query.order("id").range(start, start + PAGE_SIZE - 1).execute().data
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+
+def load_state(supabase, full: bool = False) -> dict:
+    """Published pairs; read back from the table without a usable local copy."""
+    if not full and os.path.exists(STATE_FILE):
+        with open(STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {
+        f"{r['product_variant_id']}:{r['related_variant_id']}": r.get("display_order") or 0
+        for r in fetch_relations(supabase, similar=True)
+    }
+
+
+def save_state(published: dict):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp_file = STATE_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(published, f, separators=(",", ":"))
+    os.replace(tmp_file, STATE_FILE)
+
+
+def publish(supabase, previous: dict, current: dict) -> tuple:
+    """Upsert changed pairs and delete dropped ones. Returns (upserted, deleted)."""
+    changed = [
+        {
+            "product_variant_id": int(key.split(":")[0]),
+            "related_variant_id": int(key.split(":")[1]),
+            "relation_type": "similar",
+            "display_order": order,
+        }
+        for key, order in current.items()
+        if previous.get(key) != order
+    ]
+    for i in range(0, len(changed), UPSERT_BATCH_SIZE):
+        supabase.table("related_products").upsert(
+            changed[i : i + UPSERT_BATCH_SIZE],
+            on_conflict="product_variant_id,related_variant_id",
+        ).execute()
+
+    dropped = {}
+    for key in previous:
+        if key not in current:
+            variant_id, related = (int(x) for x in key.split(":"))
+            dropped.setdefault(variant_id, []).append(related)
+    for variant_id, related in dropped.items():
+        supabase.table("related_products").delete().eq(
+            "product_variant_id", variant_id
+        ).eq("relation_type", "similar").in_("related_variant_id", related).execute()
+
+    return len(changed), sum(len(r) for r in dropped.values())
+
+
+def main(full: bool = False, dry_run: bool = False, offline: bool = False):
+    import time
+
+    from catalog_client import get_client
+
+    snapshot = CatalogSnapshot(SNAPSHOT_FILE, tables=SIMILAR_TABLES)
+    try:
+        if offline:
+            # An empty snapshot would unpublish every similar pair
+            snapshot.require_tables(SIMILAR_TABLES)
+        else:
+            fetched = snapshot.refresh(full=full)
+            print(
+                "Snapshot refreshed: "
+                + ", ".join(f"{t} +{n}" for t, n in fetched.items())
+            )
+        templates = [
+            t for t in snapshot.rows("product_templates") if t.get("is_active") is not False
+        ]
+        variants = [
+            v for v in snapshot.rows("product_variants") if v.get("is_active") is not False
+        ]
+    finally:
+        snapshot.close()
+
+    supabase = get_client()
+    excluded = {
+        (r["product_variant_id"], r["related_variant_id"])
+        for r in fetch_relations(supabase, similar=False)
+    }
+
+    start = time.perf_counter()
+    templates.sort(key=lambda t: t["id"])
+    active_ids = {t["id"] for t in templates}
+    variants = [v for v in variants if v["product_template_id"] in active_ids]
+    current = similar_pairs(templates, variants, excluded)
+    elapsed = time.perf_counter() - start
+
+    previous = load_state(supabase, full)
+    if not current and previous and not full:
+        raise RuntimeError(
+            f"No similar pairs computed but {len(previous)} are published; "
+            "refusing to delete them all (rerun with --full to do so)"
+        )
+    if dry_run:
+        upserted = sum(1 for k, o in current.items() if previous.get(k) != o)
+        deleted = sum(1 for k in previous if k not in current)
+    else:
+        upserted, deleted = publish(supabase, previous, current)
+        save_state(current)
+
+    print(f"\n=== SUMMARY ===")
+    print(f"Templates: {len(templates)}, variants: {len(variants)}")
+    print(f"Variants with similar products: {len({k.split(':')[0] for k in current})}")
+    print(f"Pairs kept (top {TOP_K}, >= {MIN_SIMILARITY}): {len(current)}")
+    print(f"Similarity computed in {elapsed:.1f}s")
+    print(f"{'Would upsert' if dry_run else 'Upserted'} (new/moved): {upserted}")
+    print(f"{'Would delete' if dry_run else 'Deleted'} (dropped): {deleted}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    main(
+        full="--full" in sys.argv,
+        dry_run="--dry-run" in sys.argv,
+        offline="--offline" in sys.argv,
+    )
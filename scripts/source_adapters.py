@@ -0,0 +1,249 @@
+"""
+Supplier source adapters for import_products.
+
+Every adapter yields products in the shape of the enriched JSON files
+(name, category_id, manufacturer, variations[{name, price, sku}], ...),
+which is what import_products turns into template/image/variant rows.
+
+- JsonSource: enriched JSON exports (jocril_products_enriched.json)
+- CsvSource: one row per variation, read with csv.DictReader
+- XlsxSource: one row per variation on a "Variations" sheet, read with
+  openpyxl in read-only mode (pip install openpyxl)
+
+CSV and XLSX rows are grouped into products as they stream by, so memory
+stays bounded by one product no matter how large the export is. Product
+ids repeated later in the file (the same product listed under a second
+category) are skipped.
+
+Usage:
+    python scripts/source_adapters.py [SOURCE ...]   # count what each source yields
+"""
+
+import csv
+import itertools
+import json
+import time
+
+REFERENCE_LABEL = "Referência:"
+DEFAULT_VARIATION_NAME = "Standard"
+
+# Supplier column -> canonical field, per export layout
+ESTUDIOPLAST_CSV_COLUMNS = {
+    "product_id": "product_id",
+    "name": "product_name",
+    "category_id": "category_id",
+    "description": "description",
+    "variation_name": "variation_name",
+    "price": "price",
+    "sku": "sku",
+    "stock_status": "stock_status",
+}
+
+ESTUDIOPLAST_XLSX_COLUMNS = {
+    "product_id": "Product ID",
+    "name": "Product Name",
+    "variation_name": "Variation Name",
+    "price": "Price",
+    "sku": "SKU",
+    "stock_status": "Stock Status",
+}
+
+ESTUDIOPLAST_XLSX_PRODUCT_COLUMNS = {
+    "product_id": "ID",
+    "category_id": "Category ID",
+    "description": "Description",
+}
+
+# Sources import_products can read, by name
+SOURCES = {
+    "jocril": {
+        "format": "json",
+        "path": "public/TEMP/jocril_products_enriched.json",
+    },
+    "estudioplast": {
+        "format": "csv",
+        "path": "public/TEMP/estudioplast_20251130_093506.csv",
+        "columns": ESTUDIOPLAST_CSV_COLUMNS,
+    },
+    "estudioplast-xlsx": {
+        "format": "xlsx",
+        "path": "public/TEMP/estudioplast_20251130_093506.xlsx",
+        "columns": ESTUDIOPLAST_XLSX_COLUMNS,
+        "product_columns": ESTUDIOPLAST_XLSX_PRODUCT_COLUMNS,
+    },
+}
+DEFAULT_SOURCES = ["jocril"]
+
+
+def clean_reference(value) -> str:
+    """'Referência:\\npf_7' -> 'pf_7'"""
+    value = str(value or "")
+    if REFERENCE_LABEL in value:
+        value = value.split(REFERENCE_LABEL)[-1]
+    return value.strip()
+
+
+def map_columns(row: dict, columns: dict) -> dict:
+    """Rename supplier columns to canonical fields, as stripped strings."""
+    return {
+        field: str(row.get(column) or "").strip() for field, column in columns.items()
+    }
+
+
+def group_variation_rows(rows) -> iter:
+    """Group consecutive canonical variation rows into product dicts."""
+    seen_ids = set()
+    for product_id, group in itertools.groupby(rows, key=lambda r: r["product_id"]):
+        if not product_id or product_id in seen_ids:
+            continue
+        seen_ids.add(product_id)
+
+        group = list(group)
+        first = group[0]
+        reference = None
+        variations = []
+        for row in group:
+            sku = row.get("sku", "")
+            if REFERENCE_LABEL in sku:
+                # Products without options only expose the reference code
+                sku = clean_reference(sku)
+                reference = reference or sku
+            variations.append(
+                {
+                    "name": row.get("variation_name") or DEFAULT_VARIATION_NAME,
+                    "price": row.get("price", ""),
+                    "sku": sku or None,
+                    "stock_status": row.get("stock_status", ""),
+                    "_keep": True,
+                }
+            )
+
+        product = {
+            "id": product_id,
+            "name": first["name"],
+            "category_id": first.get("category_id") or None,
+            "descricao_completa": first.get("description") or None,
+            "variations": variations,
+        }
+        if reference:
+            product["manufacturer"] = f"{REFERENCE_LABEL}\n{reference}"
+        yield product
+
+
+class JsonSource:
+    """Enriched JSON export; only products marked _keep are yielded."""
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+
+    def products(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for product in data["products"]:
+            if product.get("_keep") == True:
+                yield product
+
+
+class CsvSource:
+    """CSV export with one row per variation."""
+
+    def __init__(self, name: str, path: str, columns: dict):
+        self.name = name
+        self.path = path
+        self.columns = columns
+
+    def rows(self):
+        with open(self.path, "r", encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                yield map_columns(row, self.columns)
+
+    def products(self):
+        return group_variation_rows(self.rows())
+
+
+class XlsxSource:
+    """XLSX export with a Variations sheet and a Products sheet.
+
+    Category and description live on the Products sheet, which is read
+    first into a small id -> fields lookup.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path: str,
+        columns: dict,
+        product_columns: dict | None = None,
+        sheet: str = "Variations",
+        products_sheet: str = "Products",
+    ):
+        self.name = name
+        self.path = path
+        self.columns = columns
+        self.product_columns = product_columns or {}
+        self.sheet = sheet
+        self.products_sheet = products_sheet
+
+    @staticmethod
+    def sheet_rows(workbook, sheet: str):
+        """Rows of a sheet as dicts keyed by the header row."""
+        rows = workbook[sheet].iter_rows(values_only=True)
+        header = [str(h or "").strip() for h in next(rows, ())]
+        for values in rows:
+            yield dict(zip(header, values))
+
+    def rows(self):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(self.path, read_only=True, data_only=True)
+        try:
+            product_fields = {}
+            if self.product_columns:
+                for row in self.sheet_rows(workbook, self.products_sheet):
+                    fields = map_columns(row, self.product_columns)
+                    product_fields.setdefault(fields.pop("product_id"), fields)
+
+            for row in self.sheet_rows(workbook, self.sheet):
+                fields = map_columns(row, self.columns)
+                extra = product_fields.get(fields["product_id"], {})
+                yield {**extra, **fields}
+        finally:
+            workbook.close()
+
+    def products(self):
+        return group_variation_rows(self.rows())
+
+
+ADAPTERS = {"json": JsonSource, "csv": CsvSource, "xlsx": XlsxSource}
+
+
+def get_source(name: str):
+    """Adapter instance for a configured source name."""
+    if name not in SOURCES:
+        raise ValueError(f"Unknown source '{name}' (known: {', '.join(SOURCES)})")
+    config = dict(SOURCES[name])
+    adapter = ADAPTERS[config.pop("format")]
+    return adapter(name, **config)
+
+
+def main(names: list | None = None):
+    for name in names or list(SOURCES):
+        source = get_source(name)
+        start = time.perf_counter()
+        products = 0
+        variations = 0
+        for product in source.products():
+            products += 1
+            variations += len(product["variations"])
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name}: {products} products, {variations} variations "
+            f"in {elapsed:.2f}s ({products / elapsed if elapsed else 0:,.0f} products/s)"
+        )
+
+
+if __name__ == "__main__":
+    import sys
+
+    main(sys.argv[1:])
@@ -0,0 +1,416 @@
+"""
+Sync stock and prices of existing variants from supplier feeds.
+
+Importers only set prices once and hard-code stock (100, in_stock). This
+streams a supplier stock/price feed (CSV or JSON in public/TEMP, see
+STOCK_FEEDS), joins each item to product_variants by SKU through an
+in-memory index built from a local snapshot (refreshed incrementally by
+updated_at, like the importer snapshot) and keeps only the variants whose
+price, stock quantity or stock status actually differ. Only the changed
+columns are written, as updates by id grouped by changed columns (one
+UPDATE ... FROM per group with --pg), and the price tiers of the variants
+whose price changed are regenerated, for them alone.
+
+A feed whose content hash matches the last synced one is skipped without
+reading it (--force syncs it anyway), so the command is cheap to run every
+few minutes. Feed SKUs unknown to the catalog are counted, never inserted:
+new products go through import_products.
+
+Writing stock_quantity fires trg_update_stock_status, which derives
+stock_status from the quantity. Where the wanted status differs from the
+derived one (a status given by the feed, or a variant marked discontinued,
+which keeps that status) it is written in a second pass, after the
+quantities.
+
+Usage:
+    python scripts/stock_sync.py [FEED ...] [--dry-run] [--force] [--full] [--pg]
+                                 [--offline] [--effective-prices]
+"""
+
+import csv
+import hashlib
+import json
+import os
+import time
+
+from catalog_snapshot import CACHE_DIR, CatalogSnapshot
+from source_adapters import clean_reference, map_columns
+
+SNAPSHOT_FILE = os.path.join(CACHE_DIR, "stock_snapshot.sqlite3")
+STATE_FILE = os.path.join(CACHE_DIR, "stock_sync.json")
+VAT_RATE = 0.23
+ID_BATCH_SIZE = 200
+
+# Feeds the sync can read, by name. CSV columns map supplier headers to
+# sku / price (including VAT) / stock_quantity / stock_status; JSON feeds
+# are either supplier exports ({"products": [{"variations": [...]}]}) or a
+# list of {sku, price, stock_quantity, stock_status} items.
+STOCK_FEEDS = {
+    "estudioplast": {
+        "format": "csv",
+        "path": "public/TEMP/estudioplast_20251130_093506.csv",
+        "columns": {
+            "sku": "sku",
+            "price": "price",
+            "stock_quantity": "stock_quantity",
+            "stock_status": "stock_status",
+        },
+    },
+    "jocril": {
+        "format": "json",
+        "path": "public/TEMP/jocril_products_enriched.json",
+    },
+}
+DEFAULT_FEEDS = ["estudioplast"]
+
+STOCK_TABLES = {
+    "product_variants": [
+        "id",
+        "product_template_id",
+        "size_format_id",
+        "sku",
+        "url_slug",
+        "base_price_excluding_vat",
+        "base_price_including_vat",
+        "stock_quantity",
+        "stock_status",
+        "low_stock_threshold",
+        "updated_at",
+    ],
+}
+
+# Supplier wording -> product_variants.stock_status
+SUPPLIER_STOCK_STATUS = {
+    "in_stock": "in_stock",
+    "instock": "in_stock",
+    "in stock": "in_stock",
+    "em stock": "in_stock",
+    "disponivel": "in_stock",
+    "disponível": "in_stock",
+    "low_stock": "low_stock",
+    "stock limitado": "low_stock",
+    "ultimas unidades": "low_stock",
+    "últimas unidades": "low_stock",
+    "out_of_stock": "out_of_stock",
+    "outofstock": "out_of_stock",
+    "out of stock": "out_of_stock",
+    "esgotado": "out_of_stock",
+    "sem stock": "out_of_stock",
+    "discontinued": "discontinued",
+    "descontinuado": "discontinued",
+}
+DEFAULT_LOW_STOCK_THRESHOLD = 10
+
+
+def parse_price(value) -> float | None:
+    """'2,50 €' -> 2.5; None when missing or not a positive number."""
+    if value is None or value == "":
+        return None
+    if not isinstance(value, (int, float)):
+        value = str(value).replace("€", "").replace(" ", "").replace(",", ".").strip()
+    try:
+        price = round(float(value), 2)
+    except ValueError:
+        return None
+    return price if price > 0 else None
+
+
+def parse_quantity(value) -> int | None:
+    if value is None or value == "":
+        return None
+    try:
+        return max(int(float(str(value).replace(",", "."))), 0)
+    except ValueError:
+        return None
+
+
+def feed_item(sku, price, stock_quantity, stock_status) -> tuple:
+    """(sku, price incl. VAT, quantity, status), each None when not given."""
+    status = SUPPLIER_STOCK_STATUS.get(str(stock_status or "").strip().lower())
+    return (
+        clean_reference(sku),
+        parse_price(price),
+        parse_quantity(stock_quantity),
+        status,
+    )
+
+
+def read_feed(config: dict):
+    """Yield feed items of one feed, streaming CSV rows."""
+    path = config["path"]
+    if config["format"] == "csv":
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                row = map_columns(row, config["columns"])
+                yield feed_item(
+                    row["sku"], row["price"], row["stock_quantity"], row["stock_status"]
+                )
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        items = (v for p in data.get("products", []) for v in p.get("variations", []))
+    else:
+        items = iter(data)
+    for item in items:
+        yield feed_item(
+            item.get("sku"),
+            item.get("price"),
+            item.get("stock_quantity"),
+            item.get("stock_status"),
+        )
+
+
+def feed_fingerprint(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def status_for_quantity(quantity: int, threshold: int | None) -> str:
+    """The stock_status trg_update_stock_status derives from a quantity."""
+    if quantity <= 0:
+        return "out_of_stock"
+    if quantity <= (threshold if threshold is not None else DEFAULT_LOW_STOCK_THRESHOLD):
+        return "low_stock"
+    return "in_stock"
+
+
+def variant_changes(variant: dict, item: tuple) -> dict:
+    """Columns of variant that differ from the feed item.
+
+    stock_status is only included when it differs from what the row will
+    hold after the write: the trigger-derived status when the quantity
+    changes, the current status otherwise.
+    """
+    _, price, quantity, status = item
+    changes = {}
+    current_price = variant.get("base_price_including_vat")
+    if price is not None and (
+        current_price is None or round(float(current_price), 2) != price
+    ):
+        changes["base_price_including_vat"] = price
+        changes["base_price_excluding_vat"] = round(price / (1 + VAT_RATE), 2)
+
+    threshold = variant.get("low_stock_threshold")
+    current_status = variant.get("stock_status")
+    if quantity is not None and variant.get("stock_quantity") != quantity:
+        changes["stock_quantity"] = quantity
+        written_status = status_for_quantity(quantity, threshold)
+    else:
+        written_status = current_status
+    if current_status == "discontinued":
+        status = "discontinued"
+    elif status is None and quantity is not None:
+        status = status_for_quantity(quantity, threshold)
+    if status is not None and status != written_status:
+        changes["stock_status"] = status
+    return changes
+
+
+def collect_changes(items, by_sku: dict, stats: dict) -> dict:
+    """{variant_id: changed columns} for the feed items, first item per SKU."""
+    seen = set()
+    changes = {}
+    for item in items:
+        sku = item[0]
+        if not sku or sku in seen:
+            continue
+        seen.add(sku)
+        stats["read"] += 1
+        variant = by_sku.get(sku)
+        if variant is None:
+            stats["unknown"] += 1
+            continue
+        changed = variant_changes(variant, item)
+        if changed:
+            changes[variant["id"]] = changed
+    return changes
+
+
+def update_groups(changes: dict) -> list:
+    """[(columns, rows)] of the writes, in order: rows are grouped by their
+    changed columns, and statuses the trigger would overwrite come after the
+    quantities that fire it."""
+    groups = {}
+    deferred = {}
+    for variant_id, changed in changes.items():
+        changed = dict(changed)
+        if "stock_quantity" in changed and "stock_status" in changed:
+            deferred[variant_id] = {"stock_status": changed.pop("stock_status")}
+        groups.setdefault(tuple(sorted(changed)), []).append({"id": variant_id, **changed})
+    passes = list(groups.items())
+    if deferred:
+        passes.append(
+            (("stock_status",), [{"id": k, **v} for k, v in deferred.items()])
+        )
+    return passes
+
+
+def write_changes(changes: dict, supabase=None, loader=None) -> set:
+    """Update the changed columns of the variants. Returns the ids updated
+    (a variant deleted since the snapshot is not brought back)."""
+    updated = set()
+    for columns, rows in update_groups(changes):
+        if loader:
+            from psycopg import sql
+
+            query = sql.SQL(
+                "UPDATE product_variants AS v SET {} "
+                "FROM jsonb_populate_recordset(NULL::product_variants, %s::jsonb) AS d "
+                "WHERE v.id = d.id RETURNING v.id"
+            ).format(
+                sql.SQL(", ").join(
+                    sql.SQL("{} = d.{}").format(sql.Identifier(c), sql.Identifier(c))
+                    for c in columns
+                )
+            )
+            updated |= {r["id"] for r in loader.fetch(query, (json.dumps(rows),))}
+            continue
+        # PostgREST updates one set of values per request: rows sharing
+        # their values (same status, same quantity) go together
+        by_values = {}
+        for row in rows:
+            values = tuple((c, row[c]) for c in columns)
+            by_values.setdefault(values, []).append(row["id"])
+        for values, ids in by_values.items():
+            for i in range(0, len(ids), ID_BATCH_SIZE):
+                updated |= {
+                    r["id"]
+                    for r in supabase.table("product_variants")
+                    .update(dict(values))
+                    .in_("id", ids[i : i + ID_BATCH_SIZE])
+                    .execute()
+                    .data
+                }
+    return updated
+
+
+def load_state() -> dict:
+    if not os.path.exists(STATE_FILE):
+        return {"fingerprints": {}}
+    with open(STATE_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state: dict):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp_file = STATE_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_file, STATE_FILE)
+
+
+def main(
+    feeds: list | None = None,
+    dry_run: bool = False,
+    force: bool = False,
+    use_pg: bool = False,
+    offline: bool = False,
+    effective_prices: bool = False,
+    full_snapshot: bool = False,
+):
+    from generate_price_tiers import retier_variants
+    from pg_bulk import get_bulk_loader
+
+    start = time.perf_counter()
+    state = load_state()
+    pending = {}
+    for name in feeds or DEFAULT_FEEDS:
+        if name not in STOCK_FEEDS:
+            raise ValueError(f"Unknown feed '{name}' (known: {', '.join(STOCK_FEEDS)})")
+        fingerprint = feed_fingerprint(STOCK_FEEDS[name]["path"])
+        if not force and state["fingerprints"].get(name) == fingerprint:
+            print(f"{name}: unchanged since the last sync, skipped")
+            continue
+        pending[name] = fingerprint
+    if not pending:
+        print("Nothing to sync")
+        return
+
+    snapshot = CatalogSnapshot(SNAPSHOT_FILE, tables=STOCK_TABLES)
+    try:
+        if not offline:
+            fetched = snapshot.refresh(full=full_snapshot)
+            print(
+                "Snapshot refreshed: "
+                + ", ".join(f"{t} +{n}" for t, n in fetched.items())
+            )
+        variants = {v["id"]: v for v in snapshot.rows("product_variants")}
+    finally:
+        snapshot.close()
+    by_sku = {v["sku"]: v for v in variants.values() if v.get("sku")}
+
+    stats = {"read": 0, "unknown": 0}
+    changes = {}
+    for name in pending:
+        feed_changes = collect_changes(read_feed(STOCK_FEEDS[name]), by_sku, stats)
+        print(f"{name}: {len(feed_changes)} variants changed")
+        for variant_id, changed in feed_changes.items():
+            # An earlier feed wins for the columns it set
+            changes[variant_id] = {**changed, **changes.get(variant_id, {})}
+
+    repriced = {
+        variant_id: changed["base_price_including_vat"]
+        for variant_id, changed in changes.items()
+        if "base_price_including_vat" in changed
+    }
+    restocked = sum(
+        1 for c in changes.values() if "stock_quantity" in c or "stock_status" in c
+    )
+
+    tiers = 0
+    if not dry_run and changes:
+        loader = get_bulk_loader(use_pg)
+        supabase = None
+        if not loader:
+            from catalog_client import get_client
+
+            supabase = get_client()
+        try:
+            # Variants deleted since the snapshot are not updated, nor retiered
+            found = write_changes(changes, supabase=supabase, loader=loader)
+            changes = {k: v for k, v in changes.items() if k in found}
+            repriced = {k: v for k, v in repriced.items() if k in found}
+            if repriced:
+                tiers = retier_variants(repriced, supabase=supabase, loader=loader)
+            if loader:
+                loader.commit()
+        finally:
+            if loader:
+                loader.close()
+    if not dry_run:
+        state["fingerprints"].update(pending)
+        save_state(state)
+
+    if effective_prices and repriced and not dry_run:
+        import effective_prices as prices
+
+        print("\nRefreshing effective prices...")
+        prices.main()
+
+    print(f"\n=== SUMMARY ===")
+    print(f"Feeds synced: {', '.join(pending)}")
+    print(f"Feed SKUs read: {stats['read']} ({stats['unknown']} not in the catalog)")
+    print(f"{'Would update' if dry_run else 'Updated'} variants: {len(changes)}")
+    print(f"  price changes: {len(repriced)}, stock changes: {restocked}")
+    if not dry_run:
+        print(f"Price tiers regenerated: {tiers} for {len(repriced)} variants")
+    print(f"Time: {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    import sys
+
+    main(
+        feeds=[a for a in sys.argv[1:] if not a.startswith("--")],
+        dry_run="--dry-run" in sys.argv,
+        force="--force" in sys.argv,
+        use_pg="--pg" in sys.argv,
+        offline="--offline" in sys.argv,
+        effective_prices="--effective-prices" in sys.argv,
+        full_snapshot="--full" in sys.argv,
+    )
@@ -0,0 +1,287 @@
+"""
+Keep technical_specs in sync with product_templates.specifications_json.
+
+The specs blob (as written by extract_specifications in enrich_products and
+by the admin form) is flattened into one technical_specs row per
+(template, spec_group, spec_name): dimensions and counts get value_numeric
+(+ unit) so range filters are index lookups, formato / impressao stay text
+for equality filters and facets, and admin "extras" become rows of the
+"extras" group.
+
+import_products writes the rows of the templates it imports. This script
+backfills and follows later edits: templates updated since the stored
+watermark are re-read, and per template only rows whose value changed are
+upserted and rows no longer in the blob are deleted.
+
+Usage:
+    python scripts/technical_specs.py [--full] [--dry-run]
+"""
+
+import json
+import os
+
+from catalog_snapshot import CACHE_DIR
+
+STATE_FILE = os.path.join(CACHE_DIR, "technical_specs.json")
+PAGE_SIZE = 1000
+ID_BATCH_SIZE = 200
+UPSERT_BATCH_SIZE = 500
+
+# (spec_group, spec_name, unit) in display order; unit None = text value.
+# impressao / num_cores are top-level in extract_specifications output and
+# inside area_grafica in the admin form's ProductSpecifications.
+SPEC_FIELDS = [
+    ("produto", "largura_mm", "mm"),
+    ("produto", "altura_mm", "mm"),
+    ("produto", "profundidade_mm", "mm"),
+    ("area_grafica", "largura_mm", "mm"),
+    ("area_grafica", "altura_mm", "mm"),
+    ("area_grafica", "formato", None),
+    ("area_grafica", "impressao", None),
+    ("area_grafica", "num_cores", "cores"),
+]
+EXTRAS_GROUP = "extras"
+NOT_APPLICABLE = ("NÃO APLICÁVEL", "NAO APLICAVEL")
+
+# Columns compared when diffing against the stored rows
+VALUE_COLUMNS = ("spec_value", "value_numeric", "unit", "display_order")
+
+
+def spec_value(specs: dict, group: str, name: str):
+    value = (specs.get(group) or {}).get(name)
+    if value is None and group == "area_grafica":
+        value = specs.get(name)
+    return value
+
+
+def spec_rows(template_id: int, specs: dict | None) -> list:
+    """technical_specs rows of one template's specifications_json."""
+    if not specs:
+        return []
+    if isinstance(specs, str):
+        specs = json.loads(specs)
+
+    rows = []
+    for order, (group, name, unit) in enumerate(SPEC_FIELDS):
+        value = spec_value(specs, group, name)
+        if value is None or value == "" or value in NOT_APPLICABLE:
+            continue
+        numeric = None
+        if unit:
+            try:
+                numeric = round(float(value), 2)
+            except (TypeError, ValueError):
+                continue
+            if numeric <= 0:
+                # 0 mm / 0 colours is "not extracted", not a real spec
+                continue
+            value = f"{numeric:g}"
+        rows.append(
+            {
+                "product_template_id": template_id,
+                "spec_group": group,
+                "spec_name": name,
+                "spec_value": str(value),
+                "value_numeric": numeric,
+                "unit": unit,
+                "display_order": order,
+            }
+        )
+
+    seen = set()
+    for i, extra in enumerate(specs.get("extras") or []):
+        label = (extra.get("label") or "").strip()[:200]
+        value = (extra.get("value") or "").strip()
+        if not label or not value or label in seen:
+            continue
+        seen.add(label)
+        rows.append(
+            {
+                "product_template_id": template_id,
+                "spec_group": EXTRAS_GROUP,
+                "spec_name": label,
+                "spec_value": value,
+                "value_numeric": None,
+                "unit": None,
+                "display_order": len(SPEC_FIELDS) + i,
+            }
+        )
+    return rows
+
+
+def spec_key(row: dict) -> tuple:
+    return row["product_template_id"], row["spec_group"], row["spec_name"]
+
+
+def same_value(stored: dict, row: dict) -> bool:
+    for column in VALUE_COLUMNS:
+        a, b = stored.get(column), row.get(column)
+        if column == "value_numeric" and a is not None and b is not None:
+            if float(a) != float(b):
+                return False
+        elif a != b:
+            return False
+    return True
+
+
+def fetch_in(supabase, table: str, columns: str, key: str, values) -> list:
+    """Rows whose `key` is in values, ID_BATCH_SIZE values per request."""
+    values = sorted(set(values))
+    rows = []
+    for i in range(0, len(values), ID_BATCH_SIZE):
+        batch = values[i : i + ID_BATCH_SIZE]
+        start = 0
+        while True:
+            page = (
+                supabase.table(table)
+                .select(columns)
+                .in_(key, batch)
+                .order("id")
+                .range(start, start + PAGE_SIZE - 1)
+                .execute()
+                .data
+            )
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+    return rows
+
+
+def diff_specs(stored: list, rows: list) -> tuple:
+    """(rows to upsert, ids of stored rows to delete)"""
+    stored_by_key = {spec_key(r): r for r in stored}
+    wanted = {spec_key(r) for r in rows}
+    upserts = [
+        r
+        for r in rows
+        if spec_key(r) not in stored_by_key or not same_value(stored_by_key[spec_key(r)], r)
+    ]
+    deletes = [r["id"] for key, r in stored_by_key.items() if key not in wanted]
+    return upserts, deletes
+
+
+def sync_specs(supabase, specs_by_template: dict, dry_run: bool = False) -> tuple:
+    """Bring the technical_specs of the given templates in line with their specs.
+
+    specs_by_template maps template id -> specifications_json (None clears
+    the template's rows). Returns (rows upserted, rows deleted).
+    """
+    if not specs_by_template:
+        return 0, 0
+    rows = [
+        row
+        for template_id, specs in specs_by_template.items()
+        for row in spec_rows(template_id, specs)
+    ]
+    stored = fetch_in(
+        supabase,
+        "technical_specs",
+        "id, product_template_id, spec_group, spec_name, " + ", ".join(VALUE_COLUMNS),
+        "product_template_id",
+        specs_by_template,
+    )
+    upserts, deletes = diff_specs(stored, rows)
+    if dry_run:
+        return len(upserts), len(deletes)
+
+    for i in range(0, len(upserts), UPSERT_BATCH_SIZE):
+        supabase.table("technical_specs").upsert(
+            upserts[i : i + UPSERT_BATCH_SIZE],
+            on_conflict="product_template_id,spec_group,spec_name",
+        ).execute()
+    for i in range(0, len(deletes), ID_BATCH_SIZE):
+        supabase.table("technical_specs").delete().in_(
+            "id", deletes[i : i + ID_BATCH_SIZE]
+        ).execute()
+    return len(upserts), len(deletes)
+
+
+def merge_specs(loader, specs_by_template: dict) -> int:
+    """Bulk-write the spec rows of freshly loaded templates with one COPY."""
+    return loader.merge(
+        "technical_specs",
+        (
+            row
+            for template_id, specs in specs_by_template.items()
+            for row in spec_rows(template_id, specs)
+        ),
+        conflict_columns=["product_template_id", "spec_group", "spec_name"],
+        update_columns=list(VALUE_COLUMNS),
+        columns=["product_template_id", "spec_group", "spec_name", *VALUE_COLUMNS],
+    )
+
+
+def load_state(full: bool = False) -> dict:
+    if full or not os.path.exists(STATE_FILE):
+        return {"watermark": None}
+    with open(STATE_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state: dict):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp_file = STATE_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_file, STATE_FILE)
+
+
+def changed_templates(supabase, since: str | None):
+    """Yield pages of (id, specifications_json, updated_at) updated at/after since."""
+    last_id = 0
+    while True:
+        query = supabase.table("product_templates").select(
+            "id, specifications_json, updated_at"
+        )
+        if since:
+            query = query.gte("updated_at", since)
+        page = query.gt("id", last_id).order("id").limit(PAGE_SIZE).execute().data
+        if not page:
+            return
+        last_id = page[-1]["id"]
+        yield page
+        if len(page) < PAGE_SIZE:
+            return
+
+
+def main(full: bool = False, dry_run: bool = False):
+    from catalog_client import get_client
+
+    supabase = get_client()
+    state = load_state(full)
+    watermark = state["watermark"]
+    print(f"Syncing specs of templates updated since {watermark or 'the beginning'}")
+
+    templates = 0
+    upserted = 0
+    deleted = 0
+    newest = watermark
+    for page in changed_templates(supabase, watermark):
+        for i in range(0, len(page), ID_BATCH_SIZE):
+            batch = page[i : i + ID_BATCH_SIZE]
+            up, down = sync_specs(
+                supabase, {t["id"]: t.get("specifications_json") for t in batch}, dry_run
+            )
+            upserted += up
+            deleted += down
+        templates += len(page)
+        for t in page:
+            if t.get("updated_at") and (newest is None or t["updated_at"] > newest):
+                newest = t["updated_at"]
+        print(f"  ► {templates} templates")
+
+    if not dry_run:
+        state["watermark"] = newest
+        save_state(state)
+
+    print(f"\n=== SUMMARY ===")
+    print(f"Templates checked: {templates}")
+    print(f"{'Would upsert' if dry_run else 'Upserted'} spec rows: {upserted}")
+    print(f"{'Would delete' if dry_run else 'Deleted'} spec rows: {deleted}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    main(full="--full" in sys.argv, dry_run="--dry-run" in sys.argv)
@@ -0,0 +1,148 @@
+"""
+In-memory uniqueness index for template slugs and variant SKUs/URL slugs.
+
+Built once per run from the local catalog snapshot, so the importers can
+tell before sending a row whether it would hit the UNIQUE constraints on
+product_templates.slug, product_variants.sku or product_variants.url_slug:
+
+- a variant whose SKU is taken is a duplicate and is not sent
+- a variant whose url_slug is taken gets a deterministic new slug
+  (slug-sku, then slug-sku-2, -3, ...), the same rule fix_missing_variants
+  has always used
+
+Up to BLOOM_MIN_KEYS keys are kept in a set. Larger catalogs use a Bloom
+filter: no false negatives, so a row that would fail is never sent. A
+false positive on a url_slug only costs a needless rename, but one on a SKU
+or template slug would drop a new row, so those hits are confirmed with a
+query (see key_exists) before the key counts as taken. Keys claimed during
+the run are also kept exactly: they may not be in the database yet.
+"""
+
+import hashlib
+import math
+import threading
+
+BLOOM_MIN_KEYS = 2_000_000
+BLOOM_ERROR_RATE = 0.001
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on BLAKE2b)."""
+
+    def __init__(self, capacity: int, error_rate: float = BLOOM_ERROR_RATE):
+        capacity = max(1, capacity)
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class KeyIndex:
+    """Set of taken keys; exact below BLOOM_MIN_KEYS, probabilistic above."""
+
+    def __init__(self, expected: int = 0):
+        self.probabilistic = expected >= BLOOM_MIN_KEYS
+        # Headroom for the keys claimed during the run
+        self.keys = BloomFilter(expected * 2) if self.probabilistic else set()
+        self.claimed = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_values(cls, values: list) -> "KeyIndex":
+        index = cls(len(values))
+        for value in values:
+            if value:
+                index.keys.add(value)
+        return index
+
+    def __contains__(self, key: str) -> bool:
+        """True if the key is (or, without confirmation, may be) taken."""
+        return key in self.keys
+
+    def taken(self, key: str, confirm=None) -> bool:
+        """True if the key is taken. confirm(key) settles filter hits; without
+        it a hit counts as taken."""
+        if not self.probabilistic or key in self.claimed:
+            return key in self.keys
+        if key not in self.keys:
+            return False
+        return confirm(key) if confirm else True
+
+    def claim(self, key: str, confirm=None) -> bool:
+        """Take a key. False if it was taken already (see taken)."""
+        with self._lock:
+            if self.taken(key, confirm):
+                return False
+            self.keys.add(key)
+            if self.probabilistic:
+                self.claimed.add(key)
+            return True
+
+
+def key_exists(table: str, column: str, supabase=None, loader=None):
+    """confirm callback for KeyIndex: does a row with column = key exist?
+
+    None when there is nothing to query (dry runs): filter hits then count
+    as taken.
+    """
+    if loader:
+        query = f"SELECT 1 FROM {table} WHERE {column} = %s LIMIT 1"
+        return lambda key: bool(loader.fetch(query, (key,)))
+    if supabase:
+        return lambda key: bool(
+            supabase.table(table).select(column).eq(column, key).limit(1).execute().data
+        )
+    return None
+
+
+class VariantKeyIndex:
+    """SKU and url_slug indexes for product_variants."""
+
+    def __init__(self, skus: KeyIndex, url_slugs: KeyIndex):
+        self.skus = skus
+        self.url_slugs = url_slugs
+        self.renamed = 0
+        self.duplicates = 0
+
+    @classmethod
+    def from_rows(cls, variants: list) -> "VariantKeyIndex":
+        return cls(
+            KeyIndex.from_values([v["sku"] for v in variants]),
+            KeyIndex.from_values([v["url_slug"] for v in variants]),
+        )
+
+    def resolve(self, variant, confirm_sku=None):
+        """Claim a VariantRecord's keys, renaming its url_slug if taken.
+
+        confirm_sku checks SKU filter hits against the database (see
+        key_exists). Returns the variant, or None if its SKU already exists.
+        """
+        sku = variant.sku
+        if not self.skus.claim(sku, confirm_sku):
+            self.duplicates += 1
+            return None
+
+        base_slug = variant.url_slug
+        url_slug = base_slug
+        if not self.url_slugs.claim(url_slug):
+            url_slug = f"{base_slug}-{sku.lower()}"
+            n = 2
+            while not self.url_slugs.claim(url_slug):
+                url_slug = f"{base_slug}-{sku.lower()}-{n}"
+                n += 1
+            self.renamed += 1
+        variant.url_slug = url_slug
+        return variant
@@ -0,0 +1,42 @@
+-- ================================================
+-- PRODUCT TEMPLATE IMAGE VARIANTS
+-- Resized WebP/AVIF derivatives of product_template_images, generated
+-- offline by scripts/build_image_derivatives.py
+-- ================================================
+
+CREATE TABLE IF NOT EXISTS public.product_template_image_variants (
+    id SERIAL PRIMARY KEY,
+    product_template_image_id INT NOT NULL REFERENCES public.product_template_images(id) ON DELETE CASCADE,
+    format VARCHAR(10) NOT NULL CHECK (format IN ('webp', 'avif')),
+    width INT NOT NULL CHECK (width > 0),
+    height INT NOT NULL CHECK (height > 0),
+    image_url VARCHAR(500) NOT NULL,
+    content_hash VARCHAR(64) NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    UNIQUE (product_template_image_id, format, width)
+);
+
+CREATE INDEX IF NOT EXISTS idx_template_image_variants_image_id
+    ON public.product_template_image_variants(product_template_image_id);
+
+ALTER TABLE public.product_template_image_variants ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Enable read access for all users" ON public.product_template_image_variants;
+CREATE POLICY "Enable read access for all users"
+    ON public.product_template_image_variants FOR SELECT
+    USING (true);
+
+DROP POLICY IF EXISTS "Enable write access for admins" ON public.product_template_image_variants;
+CREATE POLICY "Enable write access for admins"
+    ON public.product_template_image_variants FOR ALL
+    USING (public.current_user_is_admin())
+    WITH CHECK (public.current_user_is_admin());
+
+DROP TRIGGER IF EXISTS update_template_image_variants_updated_at ON public.product_template_image_variants;
+CREATE TRIGGER update_template_image_variants_updated_at
+    BEFORE UPDATE ON public.product_template_image_variants
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+COMMENT ON TABLE public.product_template_image_variants IS 'Responsive derivatives (format x width) of each template image, for srcset/picture markup.';
@@ -0,0 +1,209 @@
+-- ================================================
+-- PRODUCT FULL-TEXT SEARCH INDEX
+-- Weighted Portuguese tsvector on product_templates (kept up to date by a
+-- trigger, so every import/admin write fills it), a GIN index over it and
+-- trigram indexes on name and SKU for typo-tolerant / partial matches.
+-- search_products is rewritten to use them instead of scanning with LIKE.
+-- ================================================
+
+CREATE EXTENSION IF NOT EXISTS unaccent WITH SCHEMA public;
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA public;
+
+-- unaccent() is only STABLE; index expressions need an IMMUTABLE wrapper
+CREATE OR REPLACE FUNCTION public.immutable_unaccent(value text)
+RETURNS text
+LANGUAGE sql
+IMMUTABLE PARALLEL SAFE STRICT
+SET search_path = ''
+AS $$
+    SELECT public.unaccent('public.unaccent'::regdictionary, value)
+$$;
+
+-- Portuguese stemming on unaccented words ("acrílico" == "acrilico")
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_ts_config
+        WHERE cfgname = 'portuguese_unaccent'
+          AND cfgnamespace = 'public'::regnamespace
+    ) THEN
+        CREATE TEXT SEARCH CONFIGURATION public.portuguese_unaccent (COPY = pg_catalog.portuguese);
+        ALTER TEXT SEARCH CONFIGURATION public.portuguese_unaccent
+            ALTER MAPPING FOR hword, hword_part, word
+            WITH public.unaccent, pg_catalog.portuguese_stem;
+    END IF;
+END
+$$;
+
+ALTER TABLE public.product_templates
+    ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION public.product_template_search_vector(
+    name text,
+    short_description text,
+    full_description text,
+    advantages text
+)
+RETURNS tsvector
+LANGUAGE sql
+IMMUTABLE PARALLEL SAFE
+SET search_path = ''
+AS $$
+    SELECT
+        setweight(to_tsvector('public.portuguese_unaccent', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('public.portuguese_unaccent', coalesce(short_description, '')), 'B') ||
+        setweight(to_tsvector('public.portuguese_unaccent', coalesce(advantages, '')), 'C') ||
+        setweight(to_tsvector('public.portuguese_unaccent', coalesce(full_description, '')), 'D')
+$$;
+
+CREATE OR REPLACE FUNCTION public.update_product_template_search_vector()
+RETURNS trigger
+LANGUAGE plpgsql
+SET search_path = ''
+AS $$
+BEGIN
+    NEW.search_vector := public.product_template_search_vector(
+        NEW.name, NEW.short_description, NEW.full_description, NEW.advantages
+    );
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS update_product_templates_search_vector ON public.product_templates;
+CREATE TRIGGER update_product_templates_search_vector
+    BEFORE INSERT OR UPDATE OF name, short_description, full_description, advantages
+    ON public.product_templates
+    FOR EACH ROW
+    EXECUTE FUNCTION public.update_product_template_search_vector();
+
+-- Backfill rows written before the trigger existed
+UPDATE public.product_templates
+SET search_vector = public.product_template_search_vector(
+    name, short_description, full_description, advantages
+)
+WHERE search_vector IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_product_templates_search_vector
+    ON public.product_templates USING GIN (search_vector);
+
+CREATE INDEX IF NOT EXISTS idx_product_templates_name_trgm
+    ON public.product_templates USING GIN (public.immutable_unaccent(lower(name)) public.gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_product_variants_sku_trgm
+    ON public.product_variants USING GIN (lower(sku) public.gin_trgm_ops);
+
+COMMENT ON COLUMN public.product_templates.search_vector IS 'Weighted portuguese_unaccent tsvector of name (A), short_description (B), advantages (C) and full_description (D); maintained by trigger.';
+
+-- ================================================
+-- search_products: same signature and result, index-backed matching
+-- (plus category-name matches, as before)
+-- ================================================
+
+CREATE OR REPLACE FUNCTION public.search_products(
+    search_term text DEFAULT NULL,
+    min_price numeric DEFAULT NULL,
+    max_price numeric DEFAULT NULL,
+    category_ids text[] DEFAULT NULL,
+    sort_by text DEFAULT 'relevance',
+    result_limit integer DEFAULT 50
+)
+RETURNS TABLE(
+    variant_id integer,
+    template_name varchar,
+    size_name varchar,
+    orientation orientation_type,
+    category_name varchar,
+    base_price_including_vat numeric,
+    main_image_url varchar,
+    url_slug varchar,
+    stock_status stock_status_type,
+    relevance_score numeric
+)
+LANGUAGE plpgsql
+SET search_path = ''
+AS $$
+DECLARE
+    normalized_search_term text;
+    search_words text[];
+    search_query tsquery;
+    matching_category_ids integer[];
+BEGIN
+    IF search_term IS NOT NULL AND TRIM(search_term) <> '' THEN
+        normalized_search_term := lower(public.immutable_unaccent(TRIM(search_term)));
+        search_words := ARRAY(
+            SELECT word
+            FROM regexp_split_to_table(normalized_search_term, '[^a-z0-9]+') AS word
+            WHERE word <> ''
+        );
+        -- Any word, each as a prefix: "porta folh" -> 'port':* | 'folh':*
+        SELECT to_tsquery(
+                   'public.portuguese_unaccent',
+                   string_agg(quote_literal(word) || ':*', ' | ')
+               )
+        INTO search_query
+        FROM unnest(search_words) AS word;
+        -- Category names are not in search_vector: "expositores" finds the
+        -- products of matching categories (a handful of rows, checked once)
+        matching_category_ids := ARRAY(
+            SELECT c.id
+            FROM public.categories c
+            WHERE EXISTS (
+                SELECT 1
+                FROM unnest(search_words) AS word
+                WHERE lower(public.immutable_unaccent(c.name)) LIKE '%' || word || '%'
+            )
+        );
+    ELSE
+        search_term := NULL;
+    END IF;
+
+    RETURN QUERY
+    SELECT
+        pv.id AS variant_id,
+        pt.name AS template_name,
+        sf.name AS size_name,
+        pv.orientation,
+        c.name AS category_name,
+        pv.base_price_including_vat,
+        pv.main_image_url,
+        pv.url_slug,
+        pv.stock_status,
+        CASE
+            WHEN search_term IS NULL THEN 1.0::numeric
+            ELSE (
+                -- SKU hit (highest priority)
+                CASE WHEN lower(pv.sku) LIKE '%' || normalized_search_term || '%' THEN 30 ELSE 0 END +
+                -- Weighted full-text rank (name > summary > advantages > description)
+                COALESCE(ts_rank_cd(pt.search_vector, search_query), 0) * 50 +
+                -- Name closeness, tolerant to typos
+                public.similarity(public.immutable_unaccent(lower(pt.name)), normalized_search_term) * 20 +
+                -- Category name match
+                CASE WHEN pt.category_id = ANY(matching_category_ids) THEN 3 ELSE 0 END
+            )::numeric
+        END AS relevance_score
+    FROM public.product_variants pv
+    JOIN public.product_templates pt ON pv.product_template_id = pt.id
+    JOIN public.size_formats sf ON pv.size_format_id = sf.id
+    JOIN public.categories c ON pt.category_id = c.id
+    WHERE pv.is_active = true
+      AND pt.is_active = true
+      AND (min_price IS NULL OR pv.base_price_including_vat >= min_price)
+      AND (max_price IS NULL OR pv.base_price_including_vat <= max_price)
+      AND (category_ids IS NULL OR c.id::text = ANY(category_ids))
+      AND (search_term IS NULL OR
+           pt.search_vector @@ search_query OR
+           public.immutable_unaccent(lower(pt.name)) OPERATOR(public.%) normalized_search_term OR
+           lower(pv.sku) LIKE '%' || normalized_search_term || '%' OR
+           pt.category_id = ANY(matching_category_ids)
+      )
+    ORDER BY
+        CASE sort_by
+            WHEN 'price_asc' THEN pv.base_price_including_vat
+            WHEN 'price_desc' THEN -pv.base_price_including_vat
+            WHEN 'newest' THEN -EXTRACT(EPOCH FROM pv.created_at)::numeric
+            ELSE -relevance_score -- Sort by relevance desc
+        END,
+        pt.name ASC
+    LIMIT result_limit;
+END;
+$$;
@@ -0,0 +1,32 @@
+-- ================================================
+-- ORDER ACCESS PATH INDEXES
+-- order_items only had an index on order_id, so anything keyed by variant
+-- (sales per variant, co-purchase analysis, frequently_bought_together)
+-- scanned the table. Customer order history also sorted every order of the
+-- customer by created_at.
+-- Measure with scripts/order_workload_benchmark.py.
+-- ================================================
+
+-- Variant -> orders (variant sales, co-purchase self-join); covering, so the
+-- lookup never visits the heap
+CREATE INDEX IF NOT EXISTS idx_order_items_variant_order
+    ON public.order_items (product_variant_id)
+    INCLUDE (order_id, quantity);
+
+-- Order -> items in insertion order (order detail, keyset scans by
+-- scripts/frequently_bought_together.py); supersedes idx_order_items_order_id
+CREATE INDEX IF NOT EXISTS idx_order_items_order_id_id
+    ON public.order_items (order_id, id)
+    INCLUDE (product_variant_id, quantity);
+
+DROP INDEX IF EXISTS public.idx_order_items_order_id;
+
+-- Customer order history: newest first, no sort step; supersedes
+-- idx_orders_customer_id
+CREATE INDEX IF NOT EXISTS idx_orders_customer_created
+    ON public.orders (customer_id, created_at DESC);
+
+DROP INDEX IF EXISTS public.idx_orders_customer_id;
+
+ANALYZE public.order_items;
+ANALYZE public.orders;
@@ -0,0 +1,52 @@
+-- ================================================
+-- PRODUCT ANALYTICS ROLLUPS
+-- Weekly and monthly totals of product_analytics per variant, template and
+-- category, so dashboards read a few pre-aggregated rows instead of summing
+-- daily rows on every request. Filled incrementally by
+-- scripts/analytics_rollups.py (watermark + late-data window).
+-- unique_visitors is the sum of daily uniques (an upper bound for the period).
+-- ================================================
+
+CREATE TABLE IF NOT EXISTS public.product_analytics_rollups (
+    id SERIAL PRIMARY KEY,
+    period_type VARCHAR(10) NOT NULL CHECK (period_type IN ('week', 'month')),
+    period_start DATE NOT NULL,
+    scope VARCHAR(10) NOT NULL CHECK (scope IN ('variant', 'template', 'category')),
+    scope_id INT NOT NULL,
+    page_views BIGINT NOT NULL DEFAULT 0,
+    unique_visitors BIGINT NOT NULL DEFAULT 0,
+    add_to_cart_count BIGINT NOT NULL DEFAULT 0,
+    purchases_count BIGINT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    conversion_rate DECIMAL(7,2) GENERATED ALWAYS AS (
+        CASE
+            WHEN page_views > 0 THEN (purchases_count::DECIMAL / page_views * 100)
+            ELSE 0
+        END
+    ) STORED,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    UNIQUE(period_type, scope, scope_id, period_start)
+);
+
+-- "Top templates this month", "category trend over the last 12 weeks"
+CREATE INDEX IF NOT EXISTS idx_analytics_rollups_period
+    ON public.product_analytics_rollups (period_type, scope, period_start DESC);
+
+-- Rollup reads by date range (the daily table was only indexed by variant)
+CREATE INDEX IF NOT EXISTS idx_analytics_date
+    ON public.product_analytics (date);
+
+DROP TRIGGER IF EXISTS update_product_analytics_rollups_updated_at ON public.product_analytics_rollups;
+CREATE TRIGGER update_product_analytics_rollups_updated_at
+    BEFORE UPDATE ON public.product_analytics_rollups
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+ALTER TABLE public.product_analytics_rollups ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Enable read access for all users" ON public.product_analytics_rollups;
+CREATE POLICY "Enable read access for all users" ON public.product_analytics_rollups FOR SELECT USING (true);
+
+DROP POLICY IF EXISTS "Enable management access for admins" ON public.product_analytics_rollups;
+CREATE POLICY "Enable management access for admins" ON public.product_analytics_rollups FOR ALL USING (public.current_user_is_admin());
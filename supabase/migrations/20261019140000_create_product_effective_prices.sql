@@ -0,0 +1,52 @@
+-- ================================================
+-- PRODUCT EFFECTIVE PRICES
+-- Denormalized unit price per variant and quantity band for one date: base
+-- price, price tier and the best active promotion already applied. Filled by
+-- scripts/effective_prices.py, which only recomputes variants whose price,
+-- tiers or promotions changed (and promotions starting/ending on the date).
+--
+-- Product and cart pages read one row:
+--   SELECT * FROM product_effective_prices
+--   WHERE product_variant_id = $1 AND min_quantity <= $2
+--   ORDER BY min_quantity DESC LIMIT 1;
+-- ================================================
+
+CREATE TABLE IF NOT EXISTS public.product_effective_prices (
+    id SERIAL PRIMARY KEY,
+    product_variant_id INT NOT NULL REFERENCES public.product_variants(id) ON DELETE CASCADE,
+    min_quantity INT NOT NULL,
+    max_quantity INT,
+    list_price DECIMAL(10,2) NOT NULL,
+    tier_price DECIMAL(10,2) NOT NULL,
+    price_per_unit DECIMAL(10,2) NOT NULL,
+    discount_percentage DECIMAL(5,2) NOT NULL DEFAULT 0,
+    promotion_id INT REFERENCES public.promotions(id) ON DELETE SET NULL,
+    price_date DATE NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    CONSTRAINT chk_effective_quantity_range CHECK (max_quantity IS NULL OR max_quantity >= min_quantity),
+    UNIQUE(product_variant_id, min_quantity)
+);
+
+-- "Products on promotion" listings
+CREATE INDEX IF NOT EXISTS idx_effective_prices_promotion
+    ON public.product_effective_prices (promotion_id)
+    WHERE promotion_id IS NOT NULL;
+
+-- Change detection reads of the source tables
+CREATE INDEX IF NOT EXISTS idx_price_tiers_updated_at ON public.price_tiers (updated_at);
+CREATE INDEX IF NOT EXISTS idx_variants_updated_at ON public.product_variants (updated_at);
+
+DROP TRIGGER IF EXISTS update_product_effective_prices_updated_at ON public.product_effective_prices;
+CREATE TRIGGER update_product_effective_prices_updated_at
+    BEFORE UPDATE ON public.product_effective_prices
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+ALTER TABLE public.product_effective_prices ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Enable read access for all users" ON public.product_effective_prices;
+CREATE POLICY "Enable read access for all users" ON public.product_effective_prices FOR SELECT USING (true);
+
+DROP POLICY IF EXISTS "Enable management access for admins" ON public.product_effective_prices;
+CREATE POLICY "Enable management access for admins" ON public.product_effective_prices FOR ALL USING (public.current_user_is_admin());
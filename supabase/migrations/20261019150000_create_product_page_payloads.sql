@@ -0,0 +1,53 @@
+-- ================================================
+-- PRODUCT PAGE PAYLOADS
+-- Prerendered props of app/(site)/produtos/[slug] (variant with template,
+-- category and size, sibling variants, price tiers, images, template
+-- images), one row per url_slug, so a product page is a single read:
+--   SELECT payload FROM product_page_payloads WHERE url_slug = $1;
+-- Filled by scripts/product_page_payloads.py, which rewrites only the
+-- payloads whose source rows changed.
+-- ================================================
+
+CREATE TABLE IF NOT EXISTS public.product_page_payloads (
+    url_slug VARCHAR(400) PRIMARY KEY,
+    product_template_id INT NOT NULL REFERENCES public.product_templates(id) ON DELETE CASCADE,
+    payload JSONB NOT NULL,
+    payload_hash VARCHAR(32) NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_page_payloads_template
+    ON public.product_page_payloads (product_template_id);
+
+-- Change detection reads of the source tables
+CREATE INDEX IF NOT EXISTS idx_templates_updated_at ON public.product_templates (updated_at);
+CREATE INDEX IF NOT EXISTS idx_images_created_at ON public.product_images (created_at);
+
+-- The script detects changed size formats and price tiers by updated_at,
+-- which the base schema only maintains for categories, templates and variants
+DROP TRIGGER IF EXISTS trg_update_size_formats ON public.size_formats;
+CREATE TRIGGER trg_update_size_formats
+    BEFORE UPDATE ON public.size_formats
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+DROP TRIGGER IF EXISTS trg_update_price_tiers ON public.price_tiers;
+CREATE TRIGGER trg_update_price_tiers
+    BEFORE UPDATE ON public.price_tiers
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+DROP TRIGGER IF EXISTS update_product_page_payloads_updated_at ON public.product_page_payloads;
+CREATE TRIGGER update_product_page_payloads_updated_at
+    BEFORE UPDATE ON public.product_page_payloads
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+ALTER TABLE public.product_page_payloads ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Enable read access for all users" ON public.product_page_payloads;
+CREATE POLICY "Enable read access for all users" ON public.product_page_payloads FOR SELECT USING (true);
+
+DROP POLICY IF EXISTS "Enable management access for admins" ON public.product_page_payloads;
+CREATE POLICY "Enable management access for admins" ON public.product_page_payloads FOR ALL USING (public.current_user_is_admin());
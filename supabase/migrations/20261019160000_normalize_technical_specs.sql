@@ -0,0 +1,65 @@
+-- ================================================
+-- TYPED TECHNICAL SPECS
+-- product_templates.specifications_json flattened into technical_specs, one
+-- row per (template, spec_group, spec_name), with dimensions and counts also
+-- stored as numbers. Written by import_products and kept in sync by
+-- scripts/technical_specs.py, so facet and filter queries are index lookups
+-- instead of JSON scans:
+--   -- products with an A4 graphic area
+--   SELECT product_template_id FROM technical_specs
+--   WHERE spec_group = 'area_grafica' AND spec_name = 'formato' AND spec_value = 'A4';
+--   -- products narrower than 200 mm
+--   SELECT product_template_id FROM technical_specs
+--   WHERE spec_group = 'produto' AND spec_name = 'largura_mm' AND value_numeric < 200;
+-- ================================================
+
+ALTER TABLE public.technical_specs
+    ADD COLUMN IF NOT EXISTS value_numeric NUMERIC(10,2),
+    ADD COLUMN IF NOT EXISTS unit VARCHAR(20),
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+
+-- One row per spec of a template (the sync upserts on it)
+UPDATE public.technical_specs SET spec_group = '' WHERE spec_group IS NULL;
+ALTER TABLE public.technical_specs ALTER COLUMN spec_group SET DEFAULT '';
+ALTER TABLE public.technical_specs ALTER COLUMN spec_group SET NOT NULL;
+DELETE FROM public.technical_specs a
+    USING public.technical_specs b
+    WHERE a.product_template_id = b.product_template_id
+      AND a.spec_group = b.spec_group
+      AND a.spec_name = b.spec_name
+      AND a.id < b.id;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'uq_technical_specs_template_spec'
+    ) THEN
+        ALTER TABLE public.technical_specs
+            ADD CONSTRAINT uq_technical_specs_template_spec
+            UNIQUE (product_template_id, spec_group, spec_name);
+    END IF;
+END
+$$;
+
+-- Range filters on dimensions / counts
+CREATE INDEX IF NOT EXISTS idx_technical_specs_numeric
+    ON public.technical_specs (spec_group, spec_name, value_numeric, product_template_id)
+    WHERE value_numeric IS NOT NULL;
+
+-- Equality filters and facet counts on text values (formato, impressao)
+CREATE INDEX IF NOT EXISTS idx_technical_specs_value
+    ON public.technical_specs (spec_group, spec_name, spec_value, product_template_id);
+
+DROP TRIGGER IF EXISTS update_technical_specs_updated_at ON public.technical_specs;
+CREATE TRIGGER update_technical_specs_updated_at
+    BEFORE UPDATE ON public.technical_specs
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+ALTER TABLE public.technical_specs ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Enable read access for all users" ON public.technical_specs;
+CREATE POLICY "Enable read access for all users" ON public.technical_specs FOR SELECT USING (true);
+
+DROP POLICY IF EXISTS "Enable management access for admins" ON public.technical_specs;
+CREATE POLICY "Enable management access for admins" ON public.technical_specs FOR ALL USING (public.current_user_is_admin());